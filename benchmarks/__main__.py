@@ -0,0 +1,110 @@
+"""Throughput benchmarks on a synthetic corpus
+
+    python -m benchmarks --count 500
+    python -m benchmarks --save-baseline
+    python -m benchmarks --check
+"""
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+
+from benchmarks.corpus import CorpusSpec, generate_corpus
+from benchmarks.harness import BENCHMARKS, BenchmarkResult, run_benchmark
+
+BASELINE_FILE = Path(__file__).parent / 'baseline.json'
+
+cli = typer.Typer(add_completion=False)
+
+
+@cli.command()
+def main(
+        benchmark: Optional[List[str]] = typer.Option(None, help='Benchmarks to run (default: all)'),
+        count: int = typer.Option(200, min=1, help='Number of files in the corpus'),
+        width: int = typer.Option(1280, min=32),
+        height: int = typer.Option(960, min=32),
+        seed: int = typer.Option(0),
+        hash_workers: int = typer.Option(1, min=1),
+        baseline: Path = typer.Option(BASELINE_FILE, help='Baseline to compare with or to save'),
+        save_baseline: bool = typer.Option(False, help='Store the results as new baseline'),
+        check: bool = typer.Option(False, help='Exit with an error if throughput regressed'),
+        tolerance: float = typer.Option(0.2, help='Accepted relative throughput loss'),
+):
+    spec = CorpusSpec(count=count, resolution=(width, height), seed=seed)
+    names = benchmark or list(BENCHMARKS)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='exify-benchmark-') as tmp:
+        corpus = Path(tmp) / 'corpus'
+        generate_corpus(corpus, spec)
+        for name in names:
+            # every benchmark gets a fresh copy as run() modifies the files
+            corpus_dir = Path(tmp) / name
+            shutil.copytree(corpus, corpus_dir)
+            results.append(run_benchmark(name, corpus_dir, {'hash_workers': hash_workers}))
+
+    for result in results:
+        _print_result(result)
+
+    if save_baseline:
+        baseline.write_text(json.dumps(
+            {'corpus': spec.dict(), 'results': {result.name: result.dict() for result in results}},
+            indent=2,
+        ))
+        typer.echo(f'Baseline saved to {baseline}')
+    elif baseline.exists():
+        previous = json.loads(baseline.read_text())
+        if previous['corpus'] != json.loads(spec.json()):
+            typer.echo(f'Warning: baseline was recorded with a different corpus: {previous["corpus"]}')
+        regressions = _compare(results, previous, tolerance)
+        if check and regressions:
+            sys.exit(1)
+
+
+def _print_result(result: BenchmarkResult) -> None:
+    typer.echo(
+        f'{result.name}: {result.files} files in {result.seconds:.2f}s '
+        f'({result.files_per_second:.1f} files/s), '
+        f'read {_megabytes(result.bytes_read)}, peak RSS {result.peak_rss_kb / 1024:.1f} MB'
+    )
+    for stage, latency in result.stages.items():
+        typer.echo(
+            f'  {stage}: n={latency.count} '
+            f'p50={latency.p50 * 1e3:.2f}ms p90={latency.p90 * 1e3:.2f}ms p99={latency.p99 * 1e3:.2f}ms'
+        )
+
+
+def _compare(results: List[BenchmarkResult], baseline: dict, tolerance: float) -> List[str]:
+    """Names of the benchmarks that regressed or cannot be compared with the baseline"""
+    regressions = []
+    for result in results:
+        if not (previous := baseline['results'].get(result.name)):
+            typer.echo(f'{result.name}: not in the baseline [UNKNOWN]')
+            regressions.append(result.name)
+            continue
+        # a renamed or removed stage would otherwise go unnoticed, the baseline has to be saved again
+        if missing := sorted(set(previous['stages']) - set(result.stages)):
+            typer.echo(f'{result.name}: stages missing from the results: {", ".join(missing)} [STAGES]')
+        if unknown := sorted(set(result.stages) - set(previous['stages'])):
+            typer.echo(f'{result.name}: stages missing from the baseline: {", ".join(unknown)} [STAGES]')
+        if missing or unknown:
+            regressions.append(result.name)
+            continue
+        ratio = result.files_per_second / previous['files_per_second']
+        status = 'REGRESSION' if ratio < 1 - tolerance else 'ok'
+        typer.echo(f'{result.name}: {ratio:.2f}x baseline throughput [{status}]')
+        if status != 'ok':
+            regressions.append(result.name)
+    return regressions
+
+
+def _megabytes(value: Optional[int]) -> str:
+    return f'{value / 2 ** 20:.1f} MB' if value is not None else 'n/a'
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,95 @@
+"""Reproducible synthetic image corpus"""
+import io
+import os
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import piexif
+from PIL import Image
+from pydantic import BaseModel, Field
+
+from exify.constants import EXIF_TIMESTAMP_FORMAT
+
+START_DATE = datetime(2014, 1, 1)
+DATE_RANGE_DAYS = 6 * 365
+
+
+class CorpusSpec(BaseModel):
+    count: int = Field(100, ge=1)
+    resolution: Tuple[int, int] = (1280, 960)
+    exif_ratio: float = Field(0.5, ge=0, le=1)
+    screenshot_ratio: float = Field(0.1, ge=0, le=1)
+    duplicate_ratio: float = Field(0.1, ge=0, le=1)
+    deviation_ratio: float = Field(0.3, ge=0, le=1)
+    seed: int = 0
+
+
+def generate_corpus(target: Path, spec: CorpusSpec = CorpusSpec()) -> List[Path]:
+    """Write count images to target and return their paths
+
+    Most files are WhatsApp images (IMG-YYYYMMDD-WAxxxx.jpg), a part of them with
+    an EXIF timestamp and a part with a modification time far from the date in
+    the file name. Screenshots are PNGs named like macOS screenshots and
+    near-duplicates are scaled and re-compressed copies of earlier images.
+    The same spec always produces the same files.
+    """
+    rnd = random.Random(spec.seed)
+    rng = np.random.default_rng(spec.seed)
+    target.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    originals = []
+    sequence = 0
+    for _ in range(spec.count):
+        taken = START_DATE + timedelta(seconds=rnd.randrange(DATE_RANGE_DAYS * 24 * 3600))
+
+        if originals and rnd.random() < spec.duplicate_ratio:
+            source, taken = rnd.choice(originals)
+            sequence += 1
+            file = target / f'IMG-{taken:%Y%m%d}-WA{sequence:04d}.jpg'
+            _write_near_duplicate(source, file, quality=rnd.randrange(40, 80))
+        elif rnd.random() < spec.screenshot_ratio:
+            file = target / f'Screenshot {taken:%Y-%m-%d %H.%M.%S}.png'
+            _pattern(rng, spec.resolution).save(file)
+        else:
+            sequence += 1
+            file = target / f'IMG-{taken:%Y%m%d}-WA{sequence:04d}.jpg'
+            exif = _exif_bytes(taken) if rnd.random() < spec.exif_ratio else b''
+            _pattern(rng, spec.resolution).save(file, quality=85, exif=exif)
+            originals.append((file, taken))
+
+        modified = taken
+        if rnd.random() < spec.deviation_ratio:
+            modified += timedelta(days=rnd.randrange(60, 2000))
+        os.utime(file, (modified.timestamp(),) * 2)
+        files.append(file)
+
+    return files
+
+
+def _pattern(rng: np.random.Generator, resolution: Tuple[int, int]) -> Image.Image:
+    """Smooth random color field with some noise, distinct enough for perceptual hashes"""
+    width, height = resolution
+    coarse = Image.fromarray(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8))
+    image = np.asarray(coarse.resize((width, height), Image.BICUBIC), dtype=np.int16)
+    noise = rng.integers(-12, 12, (height, width, 1), dtype=np.int16)
+    return Image.fromarray(np.clip(image + noise, 0, 255).astype(np.uint8))
+
+
+def _exif_bytes(taken: datetime) -> bytes:
+    timestamp = taken.strftime(EXIF_TIMESTAMP_FORMAT).encode('ascii')
+    return piexif.dump({
+        '0th': {piexif.ImageIFD.DateTime: timestamp},
+        'Exif': {piexif.ExifIFD.DateTimeOriginal: timestamp},
+    })
+
+
+def _write_near_duplicate(source: Path, target: Path, *, quality: int) -> None:
+    with Image.open(source) as image:
+        resized = image.resize((image.width * 3 // 4, image.height * 3 // 4), Image.LANCZOS)
+        buffer = io.BytesIO()
+        resized.save(buffer, format='JPEG', quality=quality)
+    target.write_bytes(buffer.getvalue())
@@ -0,0 +1,71 @@
+"""Filename timestamp parsing compared with the previous strptime based strategies
+
+    python -m benchmarks.filename_timestamps --count 100000
+"""
+import random
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+import typer
+
+from exify.analyzer.filename_timestamp import get_filename_timestamp_parser
+
+START_DATE = datetime(2014, 1, 1)
+NAME_FORMATS = (
+    'IMG-{:%Y%m%d}-WA{index:04d}',
+    'IMG_{:%Y%m%d_%H%M%S}',
+    'signal-{:%Y-%m-%d-%H%M%S}',
+    'photo_{:%Y-%m-%d_%H-%M-%S}',
+    'Screenshot {:%Y-%m-%d %H.%M.%S}',
+    'DSC{index:05d}',
+)
+
+cli = typer.Typer(add_completion=False)
+
+
+def generate_names(count: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    return [
+        rnd.choice(NAME_FORMATS).format(START_DATE + timedelta(seconds=rnd.randrange(6 * 365 * 24 * 3600)), index=index)
+        for index in range(count)
+    ]
+
+
+def legacy_timestamp(name: str) -> Optional[datetime]:
+    """The strategies as they were: a date with eight digits or a screenshot date and time"""
+    if match := _legacy_find(name, r'\d{8}', '%Y%m%d'):
+        return match
+    if date := _legacy_find(name, r'\d{4}-\d{2}-\d{2}', '%Y-%m-%d'):
+        if time_ := _legacy_find(name, r'\d{2}\.\d{2}\.\d{2}', '%H.%M.%S'):
+            return datetime.combine(date, time_.time())
+        return date
+
+
+def _legacy_find(name: str, pattern: str, parse_as: str) -> Optional[datetime]:
+    if matcher := re.compile(pattern).search(name):
+        return datetime.strptime(matcher.group(0), parse_as)
+
+
+def _measure(func: Callable[[List[str]], List], names: List[str]) -> float:
+    start = time.perf_counter()
+    func(names)
+    return time.perf_counter() - start
+
+
+@cli.command()
+def main(count: int = typer.Option(100_000, min=1), seed: int = typer.Option(0)):
+    names = generate_names(count, seed)
+    parser = get_filename_timestamp_parser()
+    results = {
+        'legacy': _measure(lambda values: [legacy_timestamp(name) for name in values], names),
+        'parse': _measure(lambda values: [parser.parse(name) for name in values], names),
+        'parse_many': _measure(parser.parse_many, names),
+    }
+    for name, seconds in results.items():
+        typer.echo(f'{name}: {count / seconds:,.0f} names/s ({results["legacy"] / seconds:.1f}x legacy)')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,175 @@
+"""Run benchmarks in isolated processes and collect their measurements"""
+import asyncio
+import importlib
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Callable, Any
+
+import numpy as np
+from loguru import logger
+from pydantic import BaseModel
+
+PERCENTILES = (50, 90, 99)
+
+
+class StageLatency(BaseModel):
+    count: int
+    p50: float
+    p90: float
+    p99: float
+
+
+class BenchmarkResult(BaseModel):
+    name: str
+    files: int
+    seconds: float
+    files_per_second: float
+    bytes_read: Optional[int]
+    peak_rss_kb: int
+    stages: Dict[str, StageLatency] = {}
+
+
+async def _bench_run(base_dir: Path, settings) -> int:
+    from exify.__main__ import run
+    summary = await run(settings)
+    return len(summary.ok) + len(summary.updated) + len(summary.errors)
+
+
+async def _bench_data_collector(base_dir: Path, settings) -> int:
+    from exify.analyzer.data_collector import DataCollector
+    collector = DataCollector(settings=settings)
+    await collector.run()
+    return len(collector.items)
+
+
+async def _bench_duplicate_finder(base_dir: Path, settings) -> int:
+    from exify.analyzer.duplicate_finder import DuplicateFinder
+    from exify.analyzer.file_finder import find_files
+    from exify.models import FileItem
+    items = [FileItem(file=file) for file in await find_files(base_dir)]
+    await DuplicateFinder(items, settings=settings).run()
+    return len(items)
+
+
+BENCHMARKS: Dict[str, Tuple[Callable, List[str]]] = {
+    'run': (_bench_run, [
+        'exify.__main__:_analyze_file',
+        'exify.__main__:_write_updates',
+    ]),
+    'data_collector': (_bench_data_collector, [
+        'exify.analyzer.data_collector:timestamp_from_filename',
+        'exify.analyzer.data_collector:generate_hash',
+        'exify.analyzer.data_collector:dimensions',
+    ]),
+    'duplicate_finder': (_bench_duplicate_finder, [
+        'exify.analyzer.duplicate_finder:DuplicateFinder._calculate_hashes',
+    ]),
+}
+
+
+def run_benchmark(name: str, base_dir: Path, overrides: Dict[str, Any] = None) -> BenchmarkResult:
+    """Run a benchmark in a fresh process, so peak RSS and bytes read only cover this benchmark"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_in_child, args=(name, str(base_dir), overrides or {}, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        raise RuntimeError(f'Benchmark {name} exited with {process.exitcode}') from None
+    finally:
+        process.join()
+    if isinstance(result, BaseException):
+        raise result
+    return BenchmarkResult.parse_obj(result)
+
+
+def _run_in_child(name: str, base_dir: str, overrides: Dict[str, Any], connection) -> None:
+    try:
+        connection.send(_measure(name, Path(base_dir), overrides).dict())
+    except Exception as err:
+        connection.send(err)
+    finally:
+        connection.close()
+
+
+def _measure(name: str, base_dir: Path, overrides: Dict[str, Any]) -> BenchmarkResult:
+    os.environ['BASE_DIR'] = str(base_dir)
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+
+    from exify.settings import ExifySettings
+    from exify.utils import configure_executors
+    settings = ExifySettings(base_dir=base_dir, **{'cache_enabled': False, **overrides})
+
+    benchmark, stages = BENCHMARKS[name]
+    latencies = _instrument(stages)
+
+    bytes_before = _bytes_read()
+    start = time.perf_counter()
+    with configure_executors(settings):
+        files = asyncio.run(benchmark(base_dir, settings))
+    seconds = time.perf_counter() - start
+    bytes_after = _bytes_read()
+
+    return BenchmarkResult(
+        name=name,
+        files=files,
+        seconds=seconds,
+        files_per_second=files / seconds if seconds else 0,
+        bytes_read=bytes_after - bytes_before if bytes_before is not None else None,
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        stages={
+            stage: StageLatency(
+                count=len(values),
+                **dict(zip(('p50', 'p90', 'p99'), np.percentile(values, PERCENTILES).tolist()))
+            )
+            for stage, values in latencies.items() if values
+        },
+    )
+
+
+def _instrument(stages: List[str]) -> Dict[str, List[float]]:
+    """Wrap the given coroutine functions to record their latencies in seconds"""
+    latencies = defaultdict(list)
+    for stage in stages:
+        module_name, attribute = stage.split(':')
+        owner = importlib.import_module(module_name)
+        *parents, name = attribute.split('.')
+        for parent in parents:
+            owner = getattr(owner, parent)
+        setattr(owner, name, _timed(getattr(owner, name), latencies[attribute]))
+    return latencies
+
+
+def _timed(func: Callable, latencies: List[float]) -> Callable:
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def _bytes_read() -> Optional[int]:
+    """Bytes read by this process through read system calls (Linux only)
+
+    Memory mapped files and reads of hash worker processes are not included.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
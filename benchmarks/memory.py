@@ -0,0 +1,96 @@
+"""Memory retained per file by the result representations
+
+    python -m benchmarks.memory --count 50000
+
+Compares the pydantic models with the compact records that run() and
+DataCollector keep for every file.
+"""
+import gc
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Any, Dict
+
+import typer
+
+from exify.models import FileItem, FileMetadata, Dimensions
+from exify.records import FileRecord, MetadataRecord
+
+START_DATE = datetime(2014, 1, 1)
+
+cli = typer.Typer(add_completion=False)
+
+
+def _file(index: int) -> Path:
+    return Path(f'/data/pictures/WhatsApp/Media/IMG-{START_DATE + timedelta(days=index % 2000):%Y%m%d}-WA{index:06d}.jpg')
+
+
+def _file_item(index: int) -> FileItem:
+    return FileItem(file=_file(index))
+
+
+def _file_record(index: int) -> FileRecord:
+    return FileRecord.from_item(FileItem(file=_file(index)))
+
+
+def _file_metadata(index: int) -> FileMetadata:
+    timestamp = START_DATE + timedelta(days=index % 2000)
+    return FileMetadata(
+        image=_file(index),
+        timestamp_name=timestamp,
+        timestamp_created=timestamp + timedelta(seconds=index),
+        timestamp_modified=timestamp + timedelta(seconds=index),
+        image_hash=f'{index * 2654435761 % 2 ** 64:016x}',
+        size=100_000 + index,
+        dimensions=Dimensions(width=1280, height=960),
+    )
+
+
+def _metadata_record(index: int) -> MetadataRecord:
+    timestamp = START_DATE + timedelta(days=index % 2000)
+    return MetadataRecord(
+        str(_file(index)),
+        timestamp,
+        timestamp + timedelta(seconds=index),
+        timestamp + timedelta(seconds=index),
+        f'{index * 2654435761 % 2 ** 64:016x}',
+        100_000 + index,
+        1280,
+        960,
+    )
+
+
+REPRESENTATIONS: Dict[str, Dict[str, Callable[[int], Any]]] = {
+    'run summary': {'before': _file_item, 'after': _file_record},
+    'data collector': {'before': _file_metadata, 'after': _metadata_record},
+}
+
+
+def bytes_per_item(factory: Callable[[int], Any], count: int) -> float:
+    """Memory still allocated after creating count items, divided by count"""
+    # warm up, so caches filled by the first call are not attributed to the items
+    factory(0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = [factory(index) for index in range(count)]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        # the items have to stay alive until they are measured
+        del items
+    finally:
+        tracemalloc.stop()
+    return retained / count
+
+
+@cli.command()
+def main(count: int = typer.Option(20_000, min=1, help='Number of items to create')):
+    for name, factories in REPRESENTATIONS.items():
+        before = bytes_per_item(factories['before'], count)
+        after = bytes_per_item(factories['after'], count)
+        typer.echo(f'{name}: {before:.0f} -> {after:.0f} bytes per file ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    cli()
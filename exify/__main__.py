@@ -1,13 +1,34 @@
 import asyncio
+import functools
+import os
+import socket
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Optional, TYPE_CHECKING
 
+import typer
 from loguru import logger
 
+from exify.analyzer.file_finder import iter_files
 from exify.analyzer.image_analyzer import WhatsappImageAnalyzer
-from exify.errors import ExifyError
+from exify.cache import AnalysisCache, open_cache
+from exify.errors import ExifyError, FileChangedError
+from exify.events import event, get_events
+from exify.journal import Journal, open_journal
+from exify.metrics import get_metrics, reset_metrics
 from exify.models import FileItem
+from exify.records import FileRecord, RunSummary, OUTCOMES
+from exify.result_stream import ResultStream
 from exify.settings import get_settings, ExifySettings, configure_logging
-from exify.writer.file_metadata_writer import FileTimestampWriter
-from exify.writer.exif_timestamp_writer import ExifTimestampWriter
+from exify.utils import configure_executors, call_blocking
+
+if TYPE_CHECKING:
+    # the writers and the plan are imported on first use, runs that only check files never load them
+    from exify.plan import PlanWriter
+    from exify.work_queue import WorkQueue
+
+# label of files_processed_total by RunSummary attribute
+_METRIC_OUTCOMES = {'ok': 'ok', 'updated': 'updated', 'planned': 'planned', 'errors': 'error'}
 
 
 def expand_to_absolute_path(file):
@@ -18,78 +39,327 @@ def expand_to_absolute_path(file):
 
 
 def is_whatsapp_file(filename):
-    return 'WA' in filename.name
+    return is_whatsapp_file_name(filename.name)
 
 
 def is_image(filename):
-    return filename.suffix.lower() in ('.jpg', '.jpeg')
+    return is_image_file_name(filename.name)
+
+
+def is_whatsapp_file_name(name: str) -> bool:
+    return 'WA' in name
+
+
+def is_image_file_name(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in ('.jpg', '.jpeg')
+
 
+def is_candidate(name: str) -> bool:
+    return is_whatsapp_file_name(name) and is_image_file_name(name)
 
-async def run(settings: ExifySettings):
+
+async def run(settings: ExifySettings, *, plan: Optional['PlanWriter'] = None, resume: bool = False) -> RunSummary:
+    """Analyze all files and update them, or only record the updates in a plan if one is given
+
+    Completed files are recorded in the journal, with resume files completed by
+    an earlier run are skipped and their outcome is taken from the journal. If
+    settings.results_file is set, the results are written to it as they are
+    completed and the returned summary only holds their counts.
+    """
     logger.info(f'Settings: {settings}')
 
-    ok = []
-    updated = []
-    errors = []
+    summary = ResultStream(settings.results_file) if settings.results_file else RunSummary()
+    metrics = reset_metrics()
+    queue = asyncio.Queue(maxsize=settings.concurrency * 2)
+    # a plan can be created again quickly, only updates of files are journaled
+    journal_context = open_journal(settings, resume=resume) if settings.journal_enabled and not plan else nullcontext()
 
-    for file in await _find_files(settings.base_dir):
-        filename = expand_to_absolute_path(file)
+    with configure_executors(settings), open_cache(settings) as cache, journal_context as journal, summary:
+        tasks = [
+            asyncio.ensure_future(_enqueue_files(queue, settings, summary, journal)),
+            *[
+                asyncio.ensure_future(_process_queue(queue, summary, settings, cache, plan, journal))
+                for _ in range(settings.concurrency)
+            ]
+        ]
+        if settings.metrics_textfile:
+            reporter = asyncio.ensure_future(
+                metrics.write_textfile_periodically(settings.metrics_textfile, settings.metrics_interval)
+            )
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if settings.metrics_textfile:
+                reporter.cancel()
+        if journal:
+            await journal.sync()
+        if settings.cache_evict_missing:
+            await call_blocking(cache.evict_missing)
+    get_events().flush()
+
+    _log_summary(summary)
+
+    if settings.metrics_textfile:
+        metrics.write_textfile(settings.metrics_textfile)
+    if settings.metrics_file:
+        metrics.write_json(settings.metrics_file)
+
+    return summary
+
+
+async def enqueue(settings: ExifySettings, queue: 'WorkQueue') -> int:
+    """Add all candidates below settings.base_dir to a work queue, return the number of new files"""
+    added = 0
+    batch = []
+    async for filename in iter_files(settings.base_dir, predicate=is_candidate):
+        batch.append(filename.relative_to(settings.base_dir).as_posix())
+        if len(batch) >= settings.queue_batch_size:
+            added += await call_blocking(functools.partial(queue.add, batch))
+            batch = []
+    added += await call_blocking(functools.partial(queue.add, batch))
+    logger.info(f'Enqueued {added} files, {await call_blocking(queue.outstanding)} outstanding')
+    return added
+
+
+async def work(settings: ExifySettings, queue: 'WorkQueue', *, worker: Optional[str] = None) -> RunSummary:
+    """Process batches claimed from a work queue until no file is pending or leased anymore"""
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    logger.info(f'Worker {worker}: Settings: {settings}')
+
+    summary = RunSummary()
+    # workers on other hosts see the cache directory on a shared mount, each host keeps its own cache
+    with configure_executors(settings), open_cache(settings, per_host=True) as cache:
+        while True:
+            # the queue waits for the lock of the database, which may be held by other workers
+            paths = await call_blocking(functools.partial(queue.claim, worker, settings.queue_batch_size))
+            if not paths:
+                if not await call_blocking(queue.outstanding):
+                    break
+                # files leased by other workers are claimed again if their lease expires
+                await asyncio.sleep(settings.queue_poll_interval)
+                continue
+
+            renewer = asyncio.ensure_future(_renew_lease_periodically(queue, worker, paths))
+            try:
+                batch = await _process_batch(paths, settings, cache)
+            finally:
+                renewer.cancel()
+            await call_blocking(functools.partial(queue.complete, worker, batch, settings.base_dir))
+            for outcome in OUTCOMES:
+                getattr(summary, outcome).extend(getattr(batch, outcome))
+
+    logger.info(f'Worker {worker}: Done')
+    _log_summary(summary)
+    return summary
+
+
+async def _process_batch(paths, settings: ExifySettings, cache: AnalysisCache) -> RunSummary:
+    batch = RunSummary()
+    queue = asyncio.Queue()
+    for path in paths:
+        item = FileItem(file=settings.base_dir / path)
+        if item.file.exists():
+            queue.put_nowait(item)
+        else:
+            item.errors.append(FileChangedError(f'{item.file} has been removed since it was enqueued'))
+            batch.errors.append(FileRecord.from_item(item))
+    for _ in range(settings.concurrency):
+        queue.put_nowait(None)
+    await asyncio.gather(*[_process_queue(queue, batch, settings, cache) for _ in range(settings.concurrency)])
+    return batch
+
+
+async def _renew_lease_periodically(queue: 'WorkQueue', worker: str, paths):
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 2)
+        await call_blocking(functools.partial(queue.renew, worker, paths))
 
-        if not is_whatsapp_file(filename) or not is_image(filename):
-            continue
 
-        item = FileItem(
-            file=filename
+def _log_summary(summary: RunSummary):
+    counts = summary.counts
+    logger.info(
+        f'OK: {counts["ok"]}, UPDATED: {counts["updated"]}, PLANNED: {counts["planned"]}, ERRORS: {counts["errors"]}'
+    )
+    for failed in summary.errors:
+        logger.warning(f'Process failed for {failed.file}: {failed.errors}')
+
+
+async def _enqueue_files(
+        queue: asyncio.Queue,
+        settings: ExifySettings,
+        summary: Optional[RunSummary] = None,
+        journal: Optional[Journal] = None,
+):
+    async for filename in iter_files(settings.base_dir, predicate=is_candidate):
+        if journal and (entry := await journal.completed(filename)):
+            summary.add(entry.to_record(), entry.outcome)
+            get_metrics().inc('files_resumed_total', outcome=entry.outcome)
+            continue
+        await queue.put(
+            FileItem(
+                file=filename
+            )
         )
+        get_metrics().set_gauge('queue_depth', queue.qsize())
 
-        try:
-            item = await _analyze_file(item, settings)
-        except ExifyError as err:
-            item.errors.append(err)
-            errors.append(item)
+    for _ in range(settings.concurrency):
+        await queue.put(None)
+
+
+async def _process_queue(
+        queue: asyncio.Queue,
+        summary: RunSummary,
+        settings: ExifySettings,
+        cache: AnalysisCache,
+        plan: Optional['PlanWriter'] = None,
+        journal: Optional[Journal] = None,
+):
+    while (item := await queue.get()) is not None:
+        get_metrics().set_gauge('queue_depth', queue.qsize())
+        await _process_file(item, summary, settings, cache, plan, journal)
+
+
+async def _process_file(
+        item: FileItem,
+        summary: RunSummary,
+        settings: ExifySettings,
+        cache: AnalysisCache,
+        plan: Optional['PlanWriter'] = None,
+        journal: Optional[Journal] = None,
+):
+    try:
+        with get_metrics().timer('analyze'):
+            analyzer = await _analyze_file(item, settings, cache)
         if await _all_ok(item.results):
-            ok.append(item)
+            outcome = 'ok'
         else:
-            try:
-                if not item.results.exif_timestamp_exists:
-                    await _write_exif_data(item)
-                if not item.results.deviation_ok:
-                    await _write_file_time_stamp(item)
-                updated.append(item)
-            except ExifyError as err:
-                item.errors.append(err)
-                errors.append(item)
-
-    logger.info(f'OK: {len(ok)}, UPDATED: {len(updated)}, ERRORS: {len(errors)}')
-
-    for failed in errors:
-        logger.warning(f'Process failed for {failed.file}: {failed.errors}')
+            if plan:
+                from exify.plan import plan_changes
+                plan.add(await plan_changes(item, settings))
+                outcome = 'planned'
+            else:
+                await _write_updates(item, settings, analyzer)
+                outcome = 'updated'
+    except ExifyError as err:
+        item.errors.append(err)
+        outcome = 'errors'
+    except Exception as err:
+        # a bug triggered by one file must not stop the workers processing the others
+        logger.opt(exception=err).error(f'{item.file}: Unexpected error')
+        item.errors.append(ExifyError(f'Unexpected error: {err!r}'))
+        outcome = 'errors'
+    await _complete(item, outcome, summary, journal)
+
+
+async def _complete(item: FileItem, outcome: str, summary: RunSummary, journal: Optional[Journal] = None):
+    record = FileRecord.from_item(item)
+    summary.add(record, outcome, item)
+    get_metrics().inc('files_processed_total', outcome=_METRIC_OUTCOMES[outcome])
+    if journal:
+        await journal.add(record, outcome)
 
 
 async def _all_ok(item_results):
     return item_results.exif_timestamp_exists and item_results.deviation_ok
 
 
-async def _find_files(src):
-    files = [x for x in src.rglob('*') if x.is_file()]
-    return files
+async def _write_updates(item: FileItem, settings: ExifySettings, analyzer: Optional[WhatsappImageAnalyzer] = None):
+    from exify.writer.combined_writer import CombinedTimestampWriter
+    adapter = analyzer.adapter if analyzer else None
+    await CombinedTimestampWriter(item, settings=settings, adapter=adapter).write()
 
 
-async def _write_exif_data(item):
-    await ExifTimestampWriter(item).write()
+async def _analyze_file(item: FileItem, settings: ExifySettings, cache: AnalysisCache = None):
+    analyzer = await WhatsappImageAnalyzer.create(item, settings=settings, cache=cache)
+    await analyzer.run()
+    event('analyzed', '{file}: {results}', file=item.file, results=item.results)
+    return analyzer
 
 
-async def _write_file_time_stamp(item):
-    await FileTimestampWriter(item).write()
+cli = typer.Typer(add_completion=False)
 
 
-async def _analyze_file(item: FileItem, settings: ExifySettings):
-    await WhatsappImageAnalyzer(item, settings=settings).run()
-    logger.debug(f'{item.file}: {item.results}')
-    return item
+@cli.callback(invoke_without_command=True)
+def main(
+        ctx: typer.Context,
+        concurrency: Optional[int] = typer.Option(
+            None, min=1, help='Number of files analyzed and written concurrently'
+        ),
+        no_cache: bool = typer.Option(False, '--no-cache', help='Bypass the analysis cache'),
+        resume: bool = typer.Option(False, '--resume', help='Skip files completed by an interrupted run'),
+        metrics_file: Optional[Path] = typer.Option(None, help='Write metrics as JSON to this file at the end'),
+        metrics_textfile: Optional[Path] = typer.Option(
+            None, help='Write metrics periodically to this file in the Prometheus text format'
+        ),
+        results_file: Optional[Path] = typer.Option(
+            None, help='Write the result of every file to this file as it is completed, one JSON object per line'
+        ),
+):
+    configure_logging()
+    settings = get_settings()
+    if concurrency:
+        settings = settings.copy(update={'concurrency': concurrency})
+    if no_cache:
+        settings = settings.copy(update={'cache_enabled': False})
+    if metrics_file:
+        settings = settings.copy(update={'metrics_file': metrics_file})
+    if metrics_textfile:
+        settings = settings.copy(update={'metrics_textfile': metrics_textfile})
+    if results_file:
+        settings = settings.copy(update={'results_file': results_file})
+    ctx.obj = settings
+    if ctx.invoked_subcommand is None:
+        asyncio.run(run(settings=settings, resume=resume))
+
+
+@cli.command()
+def plan(ctx: typer.Context, plan_file: Path = typer.Argument(..., help='File to write the plan to')):
+    """Analyze all files and write the updates to a plan instead of applying them"""
+    from exify.plan import PlanWriter
+    with PlanWriter(plan_file) as writer:
+        asyncio.run(run(settings=ctx.obj, plan=writer))
+
+
+@cli.command()
+def apply(ctx: typer.Context, plan_file: Path = typer.Argument(..., exists=True, help='Plan created by plan')):
+    """Apply a plan to files that have not changed since they were analyzed"""
+    from exify.plan import apply_plan
+    asyncio.run(apply_plan(plan_file, ctx.obj))
+
+
+@cli.command('enqueue')
+def enqueue_command(ctx: typer.Context, queue_file: Path = typer.Argument(..., help='Work queue database')):
+    """Add all files below BASE_DIR to a work queue shared by workers"""
+    from exify.work_queue import open_work_queue
+    with open_work_queue(queue_file, ctx.obj) as queue:
+        asyncio.run(enqueue(ctx.obj, queue))
+
+
+@cli.command()
+def worker(
+        ctx: typer.Context,
+        queue_file: Path = typer.Argument(..., exists=True, help='Work queue created by enqueue'),
+        name: Optional[str] = typer.Option(None, help='Name of the worker, defaults to host name and process id'),
+):
+    """Process files of a work queue until it is empty"""
+    from exify.work_queue import open_work_queue
+    with open_work_queue(queue_file, ctx.obj) as queue:
+        asyncio.run(work(ctx.obj, queue, worker=name))
+
+
+@cli.command()
+def report(
+        ctx: typer.Context,
+        queue_file: Path = typer.Argument(..., exists=True, help='Work queue created by enqueue'),
+):
+    """Merged results of all workers"""
+    from exify.work_queue import open_work_queue
+    with open_work_queue(queue_file, ctx.obj) as queue:
+        logger.info(f'Files by state: {queue.counts()}')
+        _log_summary(queue.summary(ctx.obj.base_dir))
 
 
 if __name__ == '__main__':
-    configure_logging()
-    settings = get_settings()
-    asyncio.run(run(settings=settings))
+    cli()
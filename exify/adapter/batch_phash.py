@@ -0,0 +1,55 @@
+"""Perceptual hashing of many images at once
+
+The kernel produces the same bits as imagehash.phash, packed into one uint64
+per image with the first hash bit as the most significant bit.
+"""
+from typing import Iterable
+
+import imagehash
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+HIGHFREQ_FACTOR = 4
+THUMBNAIL_SIZE = HASH_SIZE * HIGHFREQ_FACTOR
+
+
+def _dct_matrix(size: int, rows: int) -> np.ndarray:
+    """First rows of the unnormalized DCT-II matrix as used by scipy.fftpack.dct"""
+    k = np.arange(rows)[:, np.newaxis]
+    n = np.arange(size)[np.newaxis, :]
+    return 2 * np.cos(np.pi * k * (2 * n + 1) / (2 * size))
+
+
+_DCT = _dct_matrix(THUMBNAIL_SIZE, HASH_SIZE)
+
+
+def thumbnail(image: Image.Image) -> np.ndarray:
+    """Reduce an image to the grayscale thumbnail phash is computed on"""
+    resized = image.convert('L').resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    return np.asarray(resized)
+
+
+def batch_phash(thumbnails: np.ndarray) -> np.ndarray:
+    """Calculate the phash of a stack of thumbnails with shape (N, 32, 32)"""
+    thumbnails = np.asarray(thumbnails, dtype=np.float64)
+    if thumbnails.ndim != 3 or thumbnails.shape[1:] != (THUMBNAIL_SIZE, THUMBNAIL_SIZE):
+        raise ValueError(f'Expected thumbnails of shape (N, {THUMBNAIL_SIZE}, {THUMBNAIL_SIZE})')
+
+    low_frequencies = (_DCT @ thumbnails @ _DCT.T).reshape(len(thumbnails), HASH_SIZE * HASH_SIZE)
+    medians = np.median(low_frequencies, axis=1)
+    bits = low_frequencies > medians[:, np.newaxis]
+    return np.packbits(bits, axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def phash_images(images: Iterable[Image.Image]) -> np.ndarray:
+    thumbnails = [thumbnail(image) for image in images]
+    if not thumbnails:
+        return np.empty(0, dtype=np.uint64)
+    return batch_phash(np.stack(thumbnails))
+
+
+def to_image_hash(value: int) -> imagehash.ImageHash:
+    """Convert a packed hash back to the representation used by imagehash"""
+    bits = np.unpackbits(np.array([value], dtype='>u8').view(np.uint8)).astype(bool)
+    return imagehash.ImageHash(bits.reshape(HASH_SIZE, HASH_SIZE))
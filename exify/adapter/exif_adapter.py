@@ -5,6 +5,7 @@ import aiofiles
 from exif import Image
 
 from exify.adapter._base import BaseAdapter
+from exify.utils import get_executors, IO, WRITER
 
 
 class ExifAdapter(BaseAdapter):
@@ -25,7 +26,7 @@ class ExifAdapter(BaseAdapter):
             raise ValueError('filename needs to be set first')
 
         if not self._image:
-            async with aiofiles.open(self.file_name, mode='rb') as f:
+            async with aiofiles.open(self.file_name, mode='rb', executor=get_executors().get(IO)) as f:
                 self._image = Image(await f.read())
         return self._image
 
@@ -40,7 +41,7 @@ class ExifAdapter(BaseAdapter):
 
     async def write_file(self) -> None:
         if self.image:
-            async with aiofiles.open(self.file_name, mode='wb') as f:
+            async with aiofiles.open(self.file_name, mode='wb', executor=get_executors().get(WRITER)) as f:
                 await f.write(self.image)
 
         raise ValueError('No image available for writing')
@@ -1,19 +1,187 @@
+import asyncio
 import functools
+import io
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Dict, List, Optional, Tuple
 
 import imagehash
+import numpy as np
 from PIL import Image
 
 from exify.adapter._base import BaseAdapter
-from exify.utils import call_blocking
+from exify.adapter.batch_phash import batch_phash, thumbnail, to_image_hash, THUMBNAIL_SIZE
+from exify.adapter.jpeg import read_exif_thumbnail
+from exify.errors import InvalidImageError
+from exify.metrics import get_metrics
+from exify.utils import call_blocking, CPU
+
+# Sources of a hash
+THUMBNAIL = 'thumbnail'
+IMAGE = 'image'
+
+
+def prepare_image(image: Image.Image, *, fast_decode: bool = False) -> Image.Image:
+    """Configure how an image is decoded before hashing
+
+    With fast_decode, JPEGs are decoded as grayscale and scaled down by the DCT
+    (up to 1/8) while decoding, as long as the result stays larger than the image
+    the hash is computed on. Other formats are not affected.
+    """
+    if fast_decode:
+        image.draft('L', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return image
 
 
 class ImageHashAdapter(BaseAdapter):
-    def __init__(self, file_name: Path, hash_func: Callable = imagehash.phash):
+    def __init__(self, file_name: Path, hash_func: Callable = imagehash.phash, *, fast_decode: bool = False):
         super().__init__(file_name)
         self._algorithm: Callable = hash_func
+        self._fast_decode = fast_decode
+
+    async def calculate_hash(self, image: Optional[Image.Image] = None):
+        """Hash the given image, or the file if no image is given, in a thread of the CPU executor"""
+        with get_metrics().timer('hash'):
+            if image is None:
+                return await call_blocking(
+                    functools.partial(_hash_file, str(self._file_name), self._algorithm, self._fast_decode),
+                    executor=CPU,
+                )
+            prepare_image(image, fast_decode=self._fast_decode)
+            return await call_blocking(functools.partial(self._algorithm, image), executor=CPU)
+
+    async def calculate_thumbnail_hash(self) -> Tuple[imagehash.ImageHash, str]:
+        """Hash the thumbnail embedded in the EXIF data, or the file if it has none
+
+        Returns the hash and its source, THUMBNAIL or IMAGE.
+        """
+        with get_metrics().timer('hash_thumbnail'):
+            return await call_blocking(
+                functools.partial(_hash_thumbnail_or_file, str(self._file_name), self._algorithm, self._fast_decode),
+                executor=CPU,
+            )
+
+
+class ProcessPoolHashEngine:
+    """Calculate image hashes in a pool of worker processes
+
+    File paths are submitted in chunks so that each worker opens and decodes the
+    images itself and only the resulting hashes travel back to the caller. Perceptual
+    hashes of a chunk are calculated in one call of the batch kernel. Files that
+    cannot be decoded are missing from the results, they do not fail their chunk.
+    """
+
+    def __init__(
+            self,
+            workers: Optional[int] = None,
+            *,
+            chunk_size: int = 16,
+            hash_func: Callable = imagehash.phash,
+            fast_decode: bool = False,
+    ):
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+        self._chunk_size = chunk_size
+        self._algorithm = hash_func
+        self._fast_decode = fast_decode
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def hash_file(self, file_name: Path) -> imagehash.ImageHash:
+        if (img_hash := (await self.hash_files([file_name])).get(file_name)) is None:
+            raise InvalidImageError(f'{file_name}: Cannot decode image')
+        return img_hash
+
+    async def hash_files(self, files: List[Path]) -> Dict[Path, imagehash.ImageHash]:
+        return await self._map_chunks(_hash_chunk, files)
+
+    async def hash_thumbnails(self, files: List[Path]) -> Dict[Path, Tuple[imagehash.ImageHash, str]]:
+        """Hash the embedded thumbnails of the files, or the files without one, see calculate_thumbnail_hash"""
+        return await self._map_chunks(_hash_thumbnail_chunk, files)
+
+    async def _map_chunks(self, hash_chunk: Callable, files: List[Path]) -> dict:
+        loop = asyncio.get_event_loop()
+        chunks = [files[idx:idx + self._chunk_size] for idx in range(0, len(files), self._chunk_size)]
+        metrics = get_metrics()
+        metrics.set_gauge('hash_chunks_pending', len(chunks))
+        with metrics.timer('hash_batch'):
+            results = await asyncio.gather(*[
+                loop.run_in_executor(
+                    self._executor, hash_chunk, [str(file) for file in chunk], self._algorithm, self._fast_decode
+                )
+                for chunk in chunks
+            ])
+        metrics.set_gauge('hash_chunks_pending', 0)
+        return {file: result for file, result in zip(files, chain.from_iterable(results)) if result is not None}
+
+
+def create_hash_engine(settings) -> Optional[ProcessPoolHashEngine]:
+    """Create a process pool engine if the settings ask for more than one hash worker"""
+    if settings.hash_workers > 1:
+        return ProcessPoolHashEngine(
+            settings.hash_workers, chunk_size=settings.hash_chunk_size, fast_decode=settings.fast_decode
+        )
+
+
+def _hash_file(file: str, hash_func: Callable, fast_decode: bool) -> imagehash.ImageHash:
+    with Image.open(file) as image:
+        return hash_func(prepare_image(image, fast_decode=fast_decode))
+
+
+def _hash_thumbnail_or_file(file: str, hash_func: Callable, fast_decode: bool) -> Tuple[imagehash.ImageHash, str]:
+    try:
+        thumbnail = read_exif_thumbnail(Path(file))
+    except InvalidImageError:
+        # not a JPEG
+        thumbnail = None
+    if thumbnail is not None:
+        try:
+            with Image.open(io.BytesIO(thumbnail)) as image:
+                return hash_func(image), THUMBNAIL
+        except OSError:
+            pass
+    return _hash_file(file, hash_func, fast_decode), IMAGE
+
+
+def _hash_chunk(files: List[str], hash_func: Callable, fast_decode: bool) -> List[Optional[imagehash.ImageHash]]:
+    """Hash a chunk of files, None takes the place of files that cannot be decoded
+
+    Each image is decoded and closed on its own. Perceptual hashes are calculated
+    from the thumbnails of all decoded images at once.
+    """
+    batched = hash_func is imagehash.phash
+    results = []
+    for file in files:
+        try:
+            with Image.open(file) as image:
+                prepare_image(image, fast_decode=fast_decode)
+                results.append(thumbnail(image) if batched else hash_func(image))
+        except OSError:
+            results.append(None)
+
+    if batched:
+        decoded = [result for result in results if result is not None]
+        hashes = iter(batch_phash(np.stack(decoded)) if decoded else [])
+        results = [None if result is None else to_image_hash(next(hashes)) for result in results]
+    return results
+
 
-    async def calculate_hash(self):
-        image = Image.open(self._file_name)
-        return await call_blocking(functools.partial(self._algorithm, image))
+def _hash_thumbnail_chunk(
+        files: List[str], hash_func: Callable, fast_decode: bool
+) -> List[Optional[Tuple[imagehash.ImageHash, str]]]:
+    results = []
+    for file in files:
+        try:
+            results.append(_hash_thumbnail_or_file(file, hash_func, fast_decode))
+        except OSError:
+            results.append(None)
+    return results
@@ -0,0 +1,325 @@
+"""Low level access to JPEG files and the EXIF data embedded in them"""
+import struct
+from pathlib import Path
+from typing import Optional, NamedTuple, Mapping, Tuple, Dict, List
+
+from exify.errors import InvalidImageError
+from exify.metrics import get_metrics
+
+JPEG_SOI = b'\xff\xd8'
+EXIF_HEADER = b'Exif\x00\x00'
+
+APP1 = 0xE1
+SOS = 0xDA
+EOI = 0xD9
+STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+# Start of frame markers, excluding DHT (C4), JPG (C8) and DAC (CC)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+TIFF_BYTE_ORDER = {b'II': '<', b'MM': '>'}
+TIFF_ASCII = 2
+TIFF_SHORT = 3
+TIFF_LONG = 4
+# bytes per value of the TIFF field types
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+INTEROP_IFD_POINTER = 0xA005
+# IFDs referenced by pointer tags, by the IFD holding the pointer
+SUB_IFDS = {'0th': {EXIF_IFD_POINTER: 'Exif', GPS_IFD_POINTER: 'GPS'}, 'Exif': {INTEROP_IFD_POINTER: 'Interop'}}
+# IFDs whose ASCII tags can be patched
+PATCHABLE_IFDS = ('0th', 'Exif')
+# Offset and length of the JPEG thumbnail in IFD1
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+TagKey = Tuple[str, int]
+
+
+class Ifd(NamedTuple):
+    offset: int
+    # tag, type, count and the raw value or offset field of each entry
+    entries: List[Tuple[int, int, int, bytes]]
+    next_offset: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + 2 + 12 * len(self.entries) + 4
+
+
+class JpegHeader(NamedTuple):
+    exif: Optional[bytes] = None
+    exif_offset: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+def is_jpeg(file_name: Path) -> bool:
+    with open(file_name, 'rb') as f:
+        return f.read(2) == JPEG_SOI
+
+
+def read_jpeg_header(file_name: Path) -> JpegHeader:
+    """Scan the JPEG markers up to the frame header
+
+    Only the APP1 segment holding the EXIF data and the first bytes of the SOF
+    segment are read, the remaining segments are skipped without reading them.
+    """
+    with open(file_name, 'rb') as f:
+        try:
+            return _scan_markers(f, file_name)
+        finally:
+            get_metrics().inc('bytes_read_total', f.tell(), stage='exif_read')
+
+
+def _scan_markers(f, file_name: Path) -> JpegHeader:
+    exif = exif_offset = None
+
+    if f.read(2) != JPEG_SOI:
+        raise InvalidImageError(f'{file_name} is not a JPEG file')
+
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise InvalidImageError(f'{file_name}: Invalid JPEG marker at offset {f.tell() - len(marker)}')
+
+        code = marker[1]
+        while code == 0xFF:
+            if not (fill := f.read(1)):
+                raise InvalidImageError(f'{file_name}: Truncated marker')
+            code = fill[0]
+        if code in STANDALONE_MARKERS:
+            continue
+        if code in (SOS, EOI):
+            return JpegHeader(exif, exif_offset)
+
+        length = _read_length(f, file_name)
+        if code == APP1 and exif is None:
+            offset = f.tell()
+            segment = f.read(length)
+            if segment.startswith(EXIF_HEADER):
+                exif, exif_offset = segment, offset
+            continue
+        if code in SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                raise InvalidImageError(f'{file_name}: Truncated frame header')
+            _, height, width = struct.unpack('>BHH', frame)
+            return JpegHeader(exif, exif_offset, width, height)
+
+        f.seek(length, 1)
+
+
+def read_exif_thumbnail(file_name: Path) -> Optional[bytes]:
+    """The JPEG thumbnail embedded in IFD1 of the EXIF data, or None if there is none
+
+    Only the header is read, like read_jpeg_header. A thumbnail that cannot be
+    located or is not a JPEG is ignored.
+    """
+    header = read_jpeg_header(file_name)
+    if not header.exif:
+        return None
+    try:
+        return _find_thumbnail(header.exif[len(EXIF_HEADER):])
+    except (struct.error, IndexError):
+        return None
+
+
+def _read_length(f, file_name: Path) -> int:
+    raw = f.read(2)
+    if len(raw) < 2:
+        raise InvalidImageError(f'{file_name}: Truncated segment')
+    return struct.unpack('>H', raw)[0] - 2
+
+
+def patch_ascii_tags(file_name: Path, values: Mapping[TagKey, bytes]) -> bool:
+    """Write ASCII tags of IFD0 and the Exif IFD in place
+
+    values maps (IFD, tag) pairs, e.g. ('Exif', 0x9003), to the new values. A tag
+    with a slot large enough for its new value is overwritten. Missing tags and
+    values that have to grow are added to a copy of their IFD, which is written
+    to the zero padding at the end of the APP1 segment, if it has enough. If not,
+    nothing is written and False is returned. The file size stays unchanged.
+    """
+    with open(file_name, 'r+b') as f:
+        return patch_ascii_tags_in(f, file_name, values)
+
+
+def patch_ascii_tags_in(f, file_name: Path, values: Mapping[TagKey, bytes]) -> bool:
+    """Like patch_ascii_tags, for a file already opened for reading and writing"""
+    f.seek(0)
+    header = _scan_markers(f, file_name)
+    if not header.exif:
+        return False
+
+    tiff_offset = header.exif_offset + len(EXIF_HEADER)
+    try:
+        writes = _plan_ascii_writes(header.exif[len(EXIF_HEADER):], values)
+    except (struct.error, IndexError):
+        return False
+    if writes is None:
+        return False
+
+    for offset, value in writes:
+        f.seek(tiff_offset + offset)
+        f.write(value)
+    get_metrics().inc('bytes_written_total', sum(len(value) for _, value in writes), stage='exif_write')
+    return True
+
+
+def _plan_ascii_writes(tiff: bytes, values: Mapping[TagKey, bytes]) -> Optional[List[Tuple[int, bytes]]]:
+    """Offsets (relative to the TIFF header) and bytes to write the values, None if they do not fit"""
+    if (byte_order := TIFF_BYTE_ORDER.get(tiff[:2])) is None:
+        return None
+    if any(ifd not in PATCHABLE_IFDS for ifd, _ in values):
+        return None
+
+    ifds = _read_ifds(tiff, byte_order)
+    slots = _ascii_slots(tiff, ifds, byte_order)
+    moved = {ifd for (ifd, tag), value in values.items() if len(value) + 1 > slots.get((ifd, tag), (0, 0))[1]}
+    if 'Exif' in moved:
+        # IFD0 holds the pointer to the Exif IFD
+        moved.add('0th')
+    if not moved:
+        return [(slots[key][0], value.ljust(slots[key][1], b'\x00')) for key, value in values.items()]
+
+    # values of an IFD that is moved are written to the copy, its old entries are not referenced anymore
+    writes = [
+        (slots[(ifd, tag)][0], value.ljust(slots[(ifd, tag)][1], b'\x00'))
+        for (ifd, tag), value in values.items() if ifd not in moved
+    ]
+    free = _used_end(tiff, ifds, byte_order)
+    free += free % 2
+    if tiff[free:].strip(b'\x00'):
+        # the end of the segment is used by data this parser does not know
+        return None
+
+    positions = {}
+    position = free
+    # the Exif IFD goes first, so the copy of IFD0 can point to it
+    for ifd in ('Exif', '0th'):
+        if ifd not in moved:
+            continue
+        updates = {tag: value for (block, tag), value in values.items() if block == ifd}
+        pointers = {EXIF_IFD_POINTER: positions['Exif']} if ifd == '0th' and 'Exif' in positions else {}
+        data = _build_ifd(ifds.get(ifd, Ifd(0, [], 0)), updates, pointers, position, byte_order)
+        if position + len(data) > len(tiff):
+            return None
+        writes.append((position, data))
+        positions[ifd] = position
+        position += len(data) + len(data) % 2
+    # the TIFF header points to IFD0
+    writes.append((4, struct.pack(f'{byte_order}L', positions['0th'])))
+    return writes
+
+
+def _read_ifds(tiff: bytes, byte_order: str) -> Dict[str, Ifd]:
+    ifds = {}
+    pending = [('0th', struct.unpack(f'{byte_order}L', tiff[4:8])[0])]
+    while pending:
+        name, offset = pending.pop()
+        if name in ifds:
+            continue
+        count = struct.unpack(f'{byte_order}H', tiff[offset:offset + 2])[0]
+        entries = []
+        for position in range(offset + 2, offset + 2 + 12 * count, 12):
+            tag, type_, value_count = struct.unpack(f'{byte_order}HHL', tiff[position:position + 8])
+            entries.append((tag, type_, value_count, tiff[position + 8:position + 12]))
+            if sub_ifd := SUB_IFDS.get(name, {}).get(tag):
+                pending.append((sub_ifd, struct.unpack(f'{byte_order}L', tiff[position + 8:position + 12])[0]))
+        end = offset + 2 + 12 * count
+        next_offset = struct.unpack(f'{byte_order}L', tiff[end:end + 4])[0]
+        if name == '0th' and next_offset:
+            pending.append(('1st', next_offset))
+        ifds[name] = Ifd(offset, entries, next_offset)
+    return ifds
+
+
+def _ascii_slots(tiff: bytes, ifds: Dict[str, Ifd], byte_order: str) -> Dict[TagKey, Tuple[int, int]]:
+    """Offsets and sizes of the ASCII values in the IFDs that can be patched"""
+    slots = {}
+    for name in PATCHABLE_IFDS:
+        if (ifd := ifds.get(name)) is None:
+            continue
+        for index, (tag, type_, count, field) in enumerate(ifd.entries):
+            if type_ == TIFF_ASCII:
+                value_offset = ifd.offset + 2 + 12 * index + 8
+                if count > 4:
+                    value_offset = struct.unpack(f'{byte_order}L', field)[0]
+                if value_offset + count > len(tiff):
+                    raise IndexError('ASCII value exceeds the EXIF segment')
+                slots[(name, tag)] = (value_offset, count)
+    return slots
+
+
+def _used_end(tiff: bytes, ifds: Dict[str, Ifd], byte_order: str) -> int:
+    """End of the last IFD, value or thumbnail in the TIFF data"""
+    end = 8
+    for ifd in ifds.values():
+        end = max(end, ifd.end)
+        values = {}
+        for tag, type_, count, field in ifd.entries:
+            if (size := TIFF_TYPE_SIZES.get(type_)) is None:
+                raise IndexError(f'Unknown TIFF type {type_}')
+            if size * count > 4:
+                end = max(end, struct.unpack(f'{byte_order}L', field)[0] + size * count)
+            elif type_ in (TIFF_SHORT, TIFF_LONG):
+                value_format = f'{byte_order}H' if type_ == TIFF_SHORT else f'{byte_order}L'
+                values[tag] = struct.unpack_from(value_format, field)[0]
+        if JPEG_INTERCHANGE_FORMAT in values:
+            end = max(end, values[JPEG_INTERCHANGE_FORMAT] + values.get(JPEG_INTERCHANGE_FORMAT_LENGTH, 0))
+    if end > len(tiff):
+        raise IndexError('EXIF data exceeds the segment')
+    return end
+
+
+def _build_ifd(
+        ifd: Ifd, values: Mapping[int, bytes], pointers: Mapping[int, int], position: int, byte_order: str
+) -> bytes:
+    """Copy of the IFD at position with the ASCII values and the pointers added, followed by the values"""
+    entries = {tag: (type_, count, field) for tag, type_, count, field in ifd.entries}
+    tags = set(entries) | set(values) | set(pointers)
+    data = b''
+    data_offset = position + 2 + 12 * len(tags) + 4
+    for tag, value in values.items():
+        value += b'\x00'
+        if len(value) <= 4:
+            entries[tag] = (TIFF_ASCII, len(value), value.ljust(4, b'\x00'))
+        else:
+            entries[tag] = (TIFF_ASCII, len(value), struct.pack(f'{byte_order}L', data_offset + len(data)))
+            data += value + b'\x00' * (len(value) % 2)
+    for tag, offset in pointers.items():
+        entries[tag] = (TIFF_LONG, 1, struct.pack(f'{byte_order}L', offset))
+
+    return b''.join([
+        struct.pack(f'{byte_order}H', len(entries)),
+        *[struct.pack(f'{byte_order}HHL', tag, *entries[tag][:2]) + entries[tag][2] for tag in sorted(entries)],
+        struct.pack(f'{byte_order}L', ifd.next_offset),
+        data,
+    ])
+
+
+def _find_thumbnail(tiff: bytes) -> Optional[bytes]:
+    if (byte_order := TIFF_BYTE_ORDER.get(tiff[:2])) is None:
+        return None
+
+    ifd0 = struct.unpack(f'{byte_order}L', tiff[4:8])[0]
+    entries = struct.unpack(f'{byte_order}H', tiff[ifd0:ifd0 + 2])[0]
+    next_ifd = ifd0 + 2 + 12 * entries
+    if not (ifd1 := struct.unpack(f'{byte_order}L', tiff[next_ifd:next_ifd + 4])[0]):
+        return None
+
+    values = {}
+    entries = struct.unpack(f'{byte_order}H', tiff[ifd1:ifd1 + 2])[0]
+    for position in range(ifd1 + 2, ifd1 + 2 + 12 * entries, 12):
+        tag, type_ = struct.unpack(f'{byte_order}HH', tiff[position:position + 4])
+        if tag in (JPEG_INTERCHANGE_FORMAT, JPEG_INTERCHANGE_FORMAT_LENGTH):
+            value_format = f'{byte_order}H' if type_ == TIFF_SHORT else f'{byte_order}L'
+            values[tag] = struct.unpack_from(value_format, tiff, position + 8)[0]
+
+    offset = values.get(JPEG_INTERCHANGE_FORMAT)
+    length = values.get(JPEG_INTERCHANGE_FORMAT_LENGTH)
+    if not offset or not length or offset + length > len(tiff):
+        return None
+    thumbnail = tiff[offset:offset + length]
+    return thumbnail if thumbnail.startswith(JPEG_SOI) else None
@@ -0,0 +1,39 @@
+from pathlib import Path
+from typing import Optional, Dict
+
+import piexif
+
+from exify.adapter.jpeg import JpegHeader, read_jpeg_header, is_jpeg
+from exify.adapter.piexif_adapter import PiexifAdapter
+from exify.cache import AnalysisCache
+from exify.errors import InvalidImageError
+
+
+class JpegHeaderAdapter(PiexifAdapter):
+    """Read EXIF data and pixel dimensions from the JPEG header without loading the image data
+
+    Files that are not JPEGs are handled like in PiexifAdapter.
+    """
+
+    def __init__(self, file_name: Path = None, *, cache: Optional[AnalysisCache] = None):
+        super().__init__(file_name, cache=cache)
+        self._header: Optional[JpegHeader] = None
+
+    def _load_image(self):
+        try:
+            self._header = read_jpeg_header(self._file_name)
+        except InvalidImageError:
+            if is_jpeg(self._file_name):
+                raise
+            return super()._load_image()
+
+        if self._header.exif:
+            return piexif.load(self._header.exif)
+        return {'0th': {}, 'Exif': {}, 'GPS': {}, 'Interop': {}, '1st': {}, 'thumbnail': None}
+
+    def _extract_tags(self, raw: Dict) -> Dict:
+        data = super()._extract_tags(raw)
+        if self._header and self._header.width:
+            data.setdefault('ImageWidth', self._header.width)
+            data.setdefault('ImageLength', self._header.height)
+        return data
@@ -1,12 +1,17 @@
+import io
 from collections import defaultdict
 from functools import partial
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Mapping
 
 import piexif
 
 from exify.adapter._base import BaseAdapter
-from exify.utils import call_blocking
+from exify.adapter.jpeg import patch_ascii_tags_in, TagKey
+from exify.cache import AnalysisCache
+from exify.errors import InvalidImageError
+from exify.metrics import get_metrics
+from exify.utils import call_blocking, WRITER
 
 ATTRIBUTE_TO_TAG_MAP = {
     'DateTime': {'block': '0th', 'attribute': piexif.ImageIFD.DateTime},
@@ -22,10 +27,13 @@ ATTRIBUTE_TO_TAG_MAP = {
 
 
 class PiexifAdapter(BaseAdapter):
-    def __init__(self, file_name: Path = None):
+    CACHE_KEY = 'exif'
+
+    def __init__(self, file_name: Path = None, *, cache: Optional[AnalysisCache] = None):
         super().__init__(file_name)
         self._raw: Optional[Dict] = defaultdict(None)
         self._data = defaultdict(str)
+        self._cache = cache or AnalysisCache()
 
     @property
     def file_name(self):
@@ -38,40 +46,98 @@ class PiexifAdapter(BaseAdapter):
     def _load_image(self):
         return piexif.load(str(self._file_name))
 
-    def _write_image(self, exif_bytes):
-        piexif.insert(exif_bytes, str(self.file_name))
-
     async def get_exif_data(self):
         if self._data:
             return self._data
 
-        look_for = ATTRIBUTE_TO_TAG_MAP.keys()
         if filename := self.file_name:
-            self._raw = await call_blocking(partial(self._load_image))
-
-            for ifd in ("0th", "Exif", "GPS", "1st"):
-                for tag in self._raw[ifd]:
-                    tag_name = piexif.TAGS[ifd][tag]["name"]
-                    if tag_name in look_for:
-                        raw = self._raw[ifd][tag]
-                        if isinstance(raw, bytes):
-                            raw = raw.decode('ascii')
-                        self._data[tag_name] = raw
+            if self._cache.enabled:
+                if (cached := await call_blocking(partial(self._cache.get, filename, self.CACHE_KEY))) is not None:
+                    self._data.update(cached)
+                    return self._data
+
+            with get_metrics().timer('exif_read'):
+                self._raw = await call_blocking(partial(self._load_image))
+            self._data.update(self._extract_tags(self._raw))
+            if self._cache.enabled:
+                await call_blocking(partial(self._cache.set, filename, self.CACHE_KEY, dict(self._data)))
             return self._data
         raise ValueError('file_name has not been set')
 
+    def _extract_tags(self, raw: Dict) -> Dict:
+        look_for = ATTRIBUTE_TO_TAG_MAP.keys()
+        data = {}
+        for ifd in ("0th", "Exif", "GPS", "1st"):
+            for tag in raw[ifd]:
+                tag_name = piexif.TAGS[ifd][tag]["name"]
+                if tag_name in look_for:
+                    value = raw[ifd][tag]
+                    if isinstance(value, bytes):
+                        value = value.decode('ascii')
+                    data[tag_name] = value
+        return data
+
     async def update_exif_data(self, data):
+        """Write the given attributes
+
+        Values that fit into existing slots of the same tags are overwritten in
+        place, missing tags are added in place if the APP1 segment ends with
+        enough zero padding. Only if there is no room, the EXIF data is
+        serialized again and the whole file is rewritten.
+        """
         if filename := self._file_name:
-            for attr, val in data.items():
-                config = ATTRIBUTE_TO_TAG_MAP.get(attr)
-                raw_block = config['block']
-                raw_attr = config['attribute']
+            await call_blocking(partial(self._update_file, data), executor=WRITER)
+            await self.invalidate_cache()
+        else:
+            raise ValueError('file_name has not been set')
+
+    def write_exif_data(self, f, data: Mapping[str, str]) -> None:
+        """Write the given attributes to the file f, opened with 'r+b'
 
-                if not self._raw.get(raw_block):
-                    self._raw[raw_block] = defaultdict(None)
-                self._raw[raw_block][raw_attr] = str(val).encode('ascii')
+        This is the blocking part of update_exif_data, for writers that modify
+        the file further while it is open.
+        """
+        updates = {
+            (ATTRIBUTE_TO_TAG_MAP[attr]['block'], ATTRIBUTE_TO_TAG_MAP[attr]['attribute']): str(val).encode('ascii')
+            for attr, val in data.items()
+        }
+        try:
+            patched = patch_ascii_tags_in(f, self._file_name, updates)
+        except InvalidImageError:
+            patched = False
 
-            exif_bytes = piexif.dump(self._raw)
-            await call_blocking(partial(self._write_image, exif_bytes))
+        if patched:
+            if self._raw:
+                self._apply_to_raw(updates)
         else:
-            raise ValueError('file_name has not been set')
+            self._rewrite(f, updates)
+
+    async def invalidate_cache(self) -> None:
+        if self._cache.enabled:
+            await call_blocking(partial(self._cache.invalidate, self._file_name))
+
+    def _update_file(self, data) -> None:
+        with open(self._file_name, 'r+b') as f:
+            self.write_exif_data(f, data)
+
+    def _rewrite(self, f, updates: Mapping[TagKey, bytes]) -> None:
+        """Serialize the EXIF data and write the whole file, reading it only once"""
+        f.seek(0)
+        content = f.read()
+        get_metrics().inc('bytes_read_total', len(content), stage='exif_write')
+        if not self._raw:
+            self._raw = piexif.load(content)
+        self._apply_to_raw(updates)
+
+        output = io.BytesIO()
+        piexif.insert(piexif.dump(self._raw), content, output)
+        f.seek(0)
+        written = f.write(output.getbuffer())
+        f.truncate()
+        get_metrics().inc('bytes_written_total', written, stage='exif_write')
+
+    def _apply_to_raw(self, updates: Mapping[TagKey, bytes]) -> None:
+        for (raw_block, raw_attr), value in updates.items():
+            if not self._raw.get(raw_block):
+                self._raw[raw_block] = defaultdict(None)
+            self._raw[raw_block][raw_attr] = value
@@ -1,4 +1,3 @@
-import asyncio
 from abc import ABCMeta
 from typing import Optional, List, Type
 
@@ -31,7 +30,8 @@ class SingleFileAnalyzer(metaclass=ABCMeta):
         return self._item
 
     async def run(self) -> None:
-        await asyncio.gather(*[await t() for t in self._tasks])
+        for task in self._tasks:
+            await task()
 
 
 class MultipleFilesAnalyzer(metaclass=ABCMeta):
@@ -1,128 +1,179 @@
 import functools
-import re
-from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
-from typing import List, MutableMapping
+from typing import List, Mapping, Optional, Dict, Iterator
 
-from PIL import Image
-from loguru import logger
-
-from exify.adapter.exif_adapter import ExifAdapter
-from exify.adapter.image_hash_adapter import ImageHashAdapter
+from exify.adapter.image_hash_adapter import ImageHashAdapter, ProcessPoolHashEngine, create_hash_engine
+from exify.analyzer.file_context import FileContext
 from exify.analyzer.file_finder import find_files
+from exify.analyzer.filename_timestamp import get_filename_timestamp_parser
+from exify.analyzer.metadata_store import MetadataStore
+from exify.cache import AnalysisCache, open_cache
+from exify.events import event, events_enabled
 from exify.models import FileMetadata, Dimensions
+from exify.records import MetadataRecord
 from exify.settings import ExifySettings, get_settings
 from exify.utils import call_blocking
 
 
 class DataCollector:
-    def __init__(self, *, settings: ExifySettings = None):
+    CACHE_KEY = 'metadata'
+
+    def __init__(self, *, settings: ExifySettings = None, cache: Optional[AnalysisCache] = None):
         self._settings = settings or get_settings()
-        self._items: MutableMapping[Path, FileMetadata] = defaultdict(FileMetadata)
+        self._cache = cache
+        self._store = MetadataStore()
 
     @property
     def files(self) -> List[Path]:
-        return list(self._items.keys())
+        return [Path(path) for path in self._store]
+
+    @property
+    def items(self) -> Mapping[Path, FileMetadata]:
+        """The collected metadata, converted to FileMetadata on access"""
+        return _MetadataView(self._store)
 
     @property
-    def items(self) -> MutableMapping[Path, FileMetadata]:
-        return self._items
+    def store(self) -> MetadataStore:
+        """The collected metadata in columns, for vectorized analyses"""
+        return self._store
 
     async def run(self, files: List[Path] = None):
-        files = files or await find_files(self._settings.base_dir)
-        for file in files:
-            metadata = FileMetadata(image=file)
-            metadata.timestamp_name = await timestamp_from_filename(file)
-            metadata.timestamp_created = await timestamp_from_file_system(file, self._settings.file_attribute.created)
-            metadata.timestamp_modified = await timestamp_from_file_system(file, self._settings.file_attribute.modified)
-            metadata.size = await file_size(file)
-            metadata.image_hash = await generate_hash(file)
-            metadata.dimensions = await dimensions(file)
+        if self._cache:
+            return await self._collect(files, self._cache)
 
-            self._items.update(
-                {item: metadata for item in files}
-            )
+        with open_cache(self._settings) as cache:
+            await self._collect(files, cache)
+            if not files and self._settings.cache_evict_missing:
+                await call_blocking(cache.evict_missing)
 
+    async def _collect(self, files: Optional[List[Path]], cache: AnalysisCache):
+        files = files or await find_files(self._settings.base_dir)
+        cached = await call_blocking(functools.partial(cache.get_many, files, self._cache_key))
+        pending = [file for file in files if file not in cached]
 
-def log_timestamp(image: Path, *, loc: str, what: datetime = 'timestamp', ):
-    logger.debug(f'{image}: Found timestamp in {loc}: {what}')
+        hashes = {}
+        if engine := create_hash_engine(self._settings):
+            async with engine:
+                hashes = await generate_hashes(pending, engine=engine, fast_decode=self._settings.fast_decode)
 
+        for file in files:
+            if (value := cached.get(file)) is not None:
+                self._store.add(MetadataRecord.from_dict(value))
+                continue
+
+            with FileContext(file) as context:
+                record = await self._collect_file(context, hashes.get(file))
+            self._store.add(record)
+            if cache.enabled:
+                await call_blocking(
+                    functools.partial(cache.set, file, self._cache_key, record.to_dict(), stat=context.stat)
+                )
+
+    @property
+    def _cache_key(self) -> str:
+        # hashes of scaled down images may differ from full decode hashes, entries
+        # of the plain fast key may hold the dimensions of the scaled down image
+        return f'{self.CACHE_KEY}:fast:v2' if self._settings.fast_decode else self.CACHE_KEY
 
-async def timestamp_from_filename(image: Path) -> datetime:
-    strategies = (whatsapp_timestamp, screenshot_timestamp)
+    async def _collect_file(self, context: FileContext, image_hash: Optional[str]) -> MetadataRecord:
+        record = MetadataRecord(str(context.file))
+        record.timestamp_name = await timestamp_from_filename(context.file)
+        record.timestamp_created = await timestamp_from_file_system(context, self._settings.file_attribute.created)
+        record.timestamp_modified = await timestamp_from_file_system(context, self._settings.file_attribute.modified)
+        record.size = await file_size(context)
+        record.image_hash = str(image_hash or await generate_hash(context, fast_decode=self._settings.fast_decode))
+        if size := await dimensions(context):
+            record.width, record.height = size.width, size.height
+        return record
 
-    for strategy in strategies:
-        if match := strategy(image):
-            log_timestamp(image, loc=f'file name ({strategy})', what=match)
-            return match
 
+class _MetadataView(Mapping):
+    def __init__(self, records: Mapping[str, MetadataRecord]):
+        self._records = records
 
-def whatsapp_timestamp(image: Path) -> datetime:
-    pattern = r'\d{8}'
-    date_format = '%Y%m%d'
+    def __getitem__(self, file: Path) -> FileMetadata:
+        return self._records[str(file)].to_model()
 
-    return _find_timestamp(image, pattern, date_format)
+    def __iter__(self) -> Iterator[Path]:
+        return (Path(path) for path in self._records)
 
+    def __len__(self) -> int:
+        return len(self._records)
 
-def screenshot_timestamp(image: Path) -> datetime:
-    date_pattern = r'\d{4}-\d{2}-\d{2}'
-    date_format = '%Y-%m-%d'
-    time_pattern = r'\d{2}\.\d{2}\.\d{2}'
-    time_format = '%H.%M.%S'
 
-    if date := _find_timestamp(image, date_pattern, date_format):
-        if time := _find_timestamp(image, time_pattern, time_format):
-            return datetime.combine(date, time.time())
-        else:
-            return date
+def log_timestamp(image: Path, *, loc: str, what: datetime = 'timestamp', ):
+    event('timestamp', '{file}: Found timestamp in {source}: {timestamp}', file=image, source=loc, timestamp=what)
 
 
-def _find_timestamp(image: Path, pattern: str, parse_as: str) -> datetime:
-    pattern = re.compile(pattern)
-    if matcher := pattern.search(image.stem):
-        if result := matcher.group(0):
-            parsed = datetime.strptime(result, parse_as)
-            return parsed
+async def timestamp_from_filename(image: Path) -> Optional[datetime]:
+    if match := get_filename_timestamp_parser().match(image.stem):
+        if events_enabled():
+            log_timestamp(image, loc=f'file name ({match.strategy})', what=match.timestamp)
+        return match.timestamp
 
 
-async def timestamp_from_file_system(image: Path, attr) -> datetime:
-    result = getattr(image.lstat(), attr)
+async def timestamp_from_file_system(context: FileContext, attr) -> datetime:
+    result = getattr(context.stat, attr)
     parsed = datetime.fromtimestamp(result)
 
-    log_timestamp(image, loc=attr, what=parsed)
+    log_timestamp(context.file, loc=attr, what=parsed)
     return parsed
 
 
-async def file_size(image: Path) -> int:
-    return image.stat().st_size
+async def file_size(context: FileContext) -> int:
+    return context.stat.st_size
 
 
-async def generate_hash(image: Path) -> str:
-    adapter = ImageHashAdapter(image)
-    hash_val = await adapter.calculate_hash()
-    logger.debug(f'{image}: Created hash: {hash_val}')
+async def generate_hash(
+        context: FileContext,
+        *,
+        engine: Optional[ProcessPoolHashEngine] = None,
+        fast_decode: bool = False,
+) -> str:
+    if engine:
+        hash_val = await engine.hash_file(context.file)
+    else:
+        hash_val = await ImageHashAdapter(context.file, fast_decode=fast_decode).calculate_hash(context.image)
+    event('hash', '{file}: Created hash: {hash}', file=context.file, hash=hash_val)
     return hash_val
 
 
-async def dimensions(image: Path) -> Dimensions:
-    adapter = ExifAdapter(image)
-    data = await adapter.get_exif_data()
-    try:
-        result = Dimensions(
-            width=data['ImageWidth'],
-            height=data['ImageLength']
-        )
-    except (AttributeError, TypeError):
-        img = Image.open(image)
-        result = await call_blocking(functools.partial(_dimensions_from_pillow, img))
+async def generate_hashes(
+        images: List[Path],
+        *,
+        engine: Optional[ProcessPoolHashEngine] = None,
+        fast_decode: bool = False,
+) -> Dict[Path, str]:
+    """Hash all images, in one batch if an engine is given
+
+    fast_decode only applies without an engine, an engine decodes as it has
+    been created.
+    """
+    if not engine:
+        hashes = {}
+        for image in images:
+            with FileContext(image) as context:
+                hashes[image] = await generate_hash(context, fast_decode=fast_decode)
+        return hashes
+
+    hashes = await engine.hash_files(images)
+    if events_enabled():
+        for image, hash_val in hashes.items():
+            event('hash', '{file}: Created hash: {hash}', file=image, hash=hash_val)
+    return hashes
+
+
+async def dimensions(context: FileContext) -> Dimensions:
+    result = await call_blocking(functools.partial(_dimensions_from_pillow, context))
 
-    logger.debug(f'{image}: Dimensions: {result}')
+    event('dimensions', '{file}: Dimensions: {dimensions}', file=context.file, dimensions=result)
     return result
 
 
-def _dimensions_from_pillow(image):
-    width, height = image.size
+def _dimensions_from_pillow(context: FileContext):
+    # the size as stored, the image may have been drafted for hashing already
+    width, height = context.size
     return Dimensions(
         width=width,
         height=height
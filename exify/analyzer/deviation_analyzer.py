@@ -0,0 +1,102 @@
+"""Timestamp deviation of many files at once"""
+from datetime import timedelta, datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from exify.analyzer._base import MultipleFilesAnalyzer
+from exify.analyzer.metadata_store import MetadataStore
+from exify.constants import ACCEPTABLE_TIME_DELTA
+from exify.models import FileItem
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+_NAT = np.iinfo(np.int64).min
+
+
+def deviation_ok(timestamps: np.ndarray, max_deviation: timedelta = ACCEPTABLE_TIME_DELTA) -> np.ndarray:
+    """Whether the spread of the timestamps in each row is below max_deviation
+
+    timestamps is a datetime64 array of shape (files, timestamps), e.g. stacked
+    columns of a MetadataStore. NaT marks a missing timestamp, rows without any
+    timestamp are not ok.
+    """
+    values = timestamps.astype('datetime64[us]').view(np.int64)
+    valid = values != _NAT
+    newest = np.where(valid, values, _NAT).max(axis=1, initial=_NAT)
+    oldest = np.where(valid, values, np.iinfo(np.int64).max).min(axis=1, initial=np.iinfo(np.int64).max)
+    return valid.any(axis=1) & (newest - oldest < max_deviation // MICROSECOND)
+
+
+def store_deviation_ok(store: MetadataStore, max_deviation: timedelta = ACCEPTABLE_TIME_DELTA) -> np.ndarray:
+    """deviation_ok for the file name and file system timestamps of all files in a MetadataStore"""
+    columns = store.columns
+    return deviation_ok(
+        np.stack([columns['timestamp_name'], columns['timestamp_created'], columns['timestamp_modified']], axis=1),
+        max_deviation,
+    )
+
+
+def segment_deviation_ok(
+        values: np.ndarray,
+        starts: np.ndarray,
+        max_deviation: timedelta = ACCEPTABLE_TIME_DELTA,
+) -> np.ndarray:
+    """Like deviation_ok, for the microsecond timestamps of all files in one flat array
+
+    The timestamps of file i are values[starts[i]:starts[i + 1]].
+    """
+    counts = np.diff(starts, append=len(values))
+    present = counts > 0
+    spread = np.zeros(len(starts), dtype=np.int64)
+    if len(values):
+        segments = starts[present]
+        spread[present] = np.maximum.reduceat(values, segments) - np.minimum.reduceat(values, segments)
+    return present & (spread < max_deviation // MICROSECOND)
+
+
+class BatchDeviationAnalyzer(MultipleFilesAnalyzer):
+    """Same results as WhatsappImageAnalyzer.get_timestamp, for items with timestamps gathered already"""
+
+    def __init__(self, items: List[FileItem], *, settings=None, max_deviation: timedelta = ACCEPTABLE_TIME_DELTA):
+        super().__init__(items, settings=settings)
+        self._max_deviation = max_deviation
+        self._deviation_ok: Optional[np.ndarray] = None
+        self._exif_timestamp_exists: Optional[np.ndarray] = None
+
+    @property
+    def deviation_ok(self) -> np.ndarray:
+        return self._deviation_ok
+
+    @property
+    def exif_timestamp_exists(self) -> np.ndarray:
+        return self._exif_timestamp_exists
+
+    async def run(self, *, update_items: bool = True) -> None:
+        values, starts = self.timestamps()
+        self._deviation_ok = segment_deviation_ok(values, starts, self._max_deviation)
+        self._exif_timestamp_exists = np.fromiter(
+            (bool(item.timestamps.exif) for item in self._items), dtype=bool, count=len(self._items)
+        )
+
+        if update_items:
+            for item, ok, exif_exists in zip(self._items, self._deviation_ok, self._exif_timestamp_exists):
+                item.results.deviation_ok = bool(ok)
+                item.results.exif_timestamp_exists = bool(exif_exists)
+
+    def timestamps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Timestamps of all items in microseconds since the epoch and the offset of every item"""
+        values = []
+        append = values.append
+        starts = np.empty(len(self._items), dtype=np.int64)
+        for index, item in enumerate(self._items):
+            starts[index] = len(values)
+            timestamps = item.timestamps
+            for timestamp in (
+                    timestamps.file_name, timestamps.file_created, timestamps.file_modified, *timestamps.exif.values()
+            ):
+                if timestamp is not None:
+                    # converting in Python is faster than NumPy's conversion of datetime objects
+                    append((timestamp - EPOCH) // MICROSECOND)
+        return np.array(values, dtype=np.int64), starts
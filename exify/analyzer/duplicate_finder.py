@@ -1,26 +1,186 @@
+import asyncio
+import functools
 from collections import defaultdict
-from typing import Type
+from pathlib import Path
+from typing import Type, Optional, List, Dict, Tuple
 
-from loguru import logger
+import imagehash
 
-from exify.adapter.image_hash_adapter import ImageHashAdapter
+from exify.adapter.image_hash_adapter import (
+    ImageHashAdapter, ProcessPoolHashEngine, create_hash_engine, THUMBNAIL, IMAGE
+)
 from exify.analyzer._base import MultipleFilesAnalyzer
+from exify.analyzer.hash_index import BKTree
+from exify.cache import AnalysisCache
+from exify.events import event
+from exify.metrics import get_metrics
+from exify.utils import call_blocking
 
 
 class DuplicateFinder(MultipleFilesAnalyzer):
-    def __init__(self, items, *, settings=None, adapter: Type[ImageHashAdapter] = ImageHashAdapter):
+    def __init__(
+            self,
+            items,
+            *,
+            settings=None,
+            adapter: Type[ImageHashAdapter] = ImageHashAdapter,
+            engine: Optional[ProcessPoolHashEngine] = None,
+            cache: Optional[AnalysisCache] = None,
+    ):
         super().__init__(items, settings=settings, adapter=adapter)
         self._adapter = adapter
+        self._engine = engine
+        self._cache = cache or AnalysisCache()
 
         self._duplicates = {}
         self._images_by_hash = defaultdict(list)
+        self._hash_sources = {}
+        self._index = BKTree()
+
+    @property
+    def duplicates(self) -> List[List[Path]]:
+        """Groups of images that are considered duplicates of each other"""
+        return [images for images in self._images_by_hash.values() if len(images) > 1]
+
+    @property
+    def hash_sources(self) -> Dict[Path, str]:
+        """Source of the hash each image has been grouped by, THUMBNAIL or IMAGE"""
+        return dict(self._hash_sources)
 
     async def run(self):
         """Run the search for duplicates"""
+        images = sorted([item.file for item in self.items])
+        if self._settings.thumbnail_hashing:
+            hashes = await self._calculate_verified_hashes(images)
+        else:
+            hashes = await self._calculate_hashes(images)
+            self._hash_sources = dict.fromkeys(images, IMAGE)
+
+        for img in images:
+            if (img_hash := hashes.get(img)) is None:
+                # only its thumbnail has been hashed, which matched no other image, or it cannot be decoded
+                self._images_by_hash[(THUMBNAIL, img)].append(img)
+                continue
+            group = self._find_group(img_hash, self._index)
+
+            if group in self._images_by_hash:
+                event('duplicate', '{file} already exists as {duplicates}', 'INFO',
+                      file=img, duplicates=self._images_by_hash[group])
+            self._images_by_hash[group].append(img)
+
+    def _find_group(self, img_hash: imagehash.ImageHash, index: BKTree) -> imagehash.ImageHash:
+        """Return the hash of the group an image belongs to
+
+        Without a distance threshold only identical hashes form a group. Otherwise
+        the image joins the group of the closest hash seen so far within the threshold.
+        """
+        max_distance = self._settings.duplicate_distance
+        if not max_distance:
+            return img_hash
+
+        value = int(str(img_hash), 16)
+        matches = index.search(value, max_distance)
+        group = matches[0][1] if matches else img_hash
+        index.add(value, group)
+        return group
+
+    @property
+    def _cache_key(self) -> str:
+        cache_key = f'hash:{self._adapter.__name__}'
+        if self._settings.fast_decode:
+            cache_key += ':fast'
+        return cache_key
+
+    async def _calculate_verified_hashes(self, images: List[Path]) -> Dict[Path, imagehash.ImageHash]:
+        """Hash the embedded thumbnails and verify candidate duplicates with the full images
+
+        Images without a thumbnail are hashed from the full image right away. An
+        image whose thumbnail hash falls into the group of another image is a
+        candidate, only the candidates are hashed again from the full image.
+        Returns the full image hashes, images that are no candidates are missing.
+        """
+        hashes, sources = await self._calculate_thumbnail_hashes(images)
+
+        groups = defaultdict(list)
+        index = BKTree()
+        for img in images:
+            if img in hashes:
+                groups[self._find_group(hashes[img], index)].append(img)
+        candidates = [
+            img for group in groups.values() if len(group) > 1 for img in group if sources[img] == THUMBNAIL
+        ]
+
+        verified = await self._calculate_hashes(candidates)
+        get_metrics().inc('hashes_verified_total', len(verified))
+        self._hash_sources = {**sources, **dict.fromkeys(verified, IMAGE)}
+        return {**{img: hashes[img] for img in images if sources.get(img) == IMAGE}, **verified}
+
+    async def _calculate_thumbnail_hashes(
+            self, images: List[Path]
+    ) -> Tuple[Dict[Path, imagehash.ImageHash], Dict[Path, str]]:
+        cache_key = f'{self._cache_key}:thumbnail'
+        hashes, sources = {}, {}
+        for img, cached in (await self._get_cached(images, cache_key)).items():
+            hashes[img], sources[img] = imagehash.hex_to_hash(cached[0]), cached[1]
+
+        pending = [img for img in images if img not in hashes]
+        calculated = await self._hash_pending(pending, 'hash_thumbnails', 'calculate_thumbnail_hash')
+        metrics = get_metrics()
+        thumbnail_values, image_values = {}, {}
+        for img, (img_hash, source) in calculated.items():
+            hashes[img], sources[img] = img_hash, source
+            metrics.inc('hashes_total', source=source)
+            thumbnail_values[img] = [str(img_hash), source]
+            if source == IMAGE:
+                # the full image hash is reused when the image is verified or hashed without thumbnails
+                image_values[img] = str(img_hash)
+        await self._set_cached(cache_key, thumbnail_values)
+        await self._set_cached(self._cache_key, image_values)
+
+        return hashes, sources
+
+    async def _calculate_hashes(self, images: List[Path]) -> Dict[Path, imagehash.ImageHash]:
+        cache_key = self._cache_key
+        cached = await self._get_cached(images, cache_key)
+        hashes = {img: imagehash.hex_to_hash(value) for img, value in cached.items()}
+
+        pending = [img for img in images if img not in hashes]
+        calculated = await self._calculate_pending_hashes(pending)
+        await self._set_cached(cache_key, {img: str(img_hash) for img, img_hash in calculated.items()})
+
+        return {**hashes, **calculated}
+
+    async def _get_cached(self, images: List[Path], cache_key: str) -> dict:
+        if not self._cache.enabled or not images:
+            return {}
+        return await call_blocking(functools.partial(self._cache.get_many, images, cache_key))
+
+    async def _set_cached(self, cache_key: str, values: dict) -> None:
+        if self._cache.enabled and values:
+            await call_blocking(functools.partial(self._cache.set_many, cache_key, values))
+
+    async def _calculate_pending_hashes(self, images: List[Path]) -> Dict[Path, imagehash.ImageHash]:
+        return await self._hash_pending(images, 'hash_files', 'calculate_hash')
+
+    async def _hash_pending(self, images: List[Path], engine_method: str, adapter_method: str) -> dict:
+        """Hash the images with a method of the engine, or one of the adapter if there is no engine"""
+        if not images:
+            return {}
+
+        if self._engine:
+            return await getattr(self._engine, engine_method)(images)
 
-        for img in sorted([item.file for item in self.items]):
-            img_hash = await self._adapter(file_name=img).calculate_hash()
+        if engine := create_hash_engine(self._settings):
+            async with engine:
+                return await getattr(engine, engine_method)(images)
 
-            if img_hash in self._images_by_hash:
-                logger.info(f'{img} already exists as {self._images_by_hash[img_hash]}')
-            self._images_by_hash[img_hash].append(img)
+        # a chunk of files at a time is hashed concurrently in the threads of the CPU executor
+        hashes = {}
+        chunk_size = self._settings.hash_chunk_size
+        for idx in range(0, len(images), chunk_size):
+            chunk = images[idx:idx + chunk_size]
+            hashes.update(zip(chunk, await asyncio.gather(*[
+                getattr(self._adapter(file_name=img, fast_decode=self._settings.fast_decode), adapter_method)()
+                for img in chunk
+            ])))
+        return hashes
@@ -0,0 +1,76 @@
+"""Per-file state shared by the data collection steps"""
+import mmap
+import os
+from pathlib import Path
+from typing import Optional, IO, Tuple
+
+from PIL import Image
+
+
+class FileContext:
+    """Give collector steps access to a file that is stat'ed and mapped at most once
+
+    The file contents are memory mapped on first use, so Pillow only touches the
+    pages it needs: the header for the dimensions, the image data when hashing.
+    """
+
+    def __init__(self, file: Path):
+        self._file = file
+        self._stat: Optional[os.stat_result] = None
+        self._handle: Optional[IO[bytes]] = None
+        self._buffer: Optional[mmap.mmap] = None
+        self._image: Optional[Image.Image] = None
+        self._size: Optional[Tuple[int, int]] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def file(self) -> Path:
+        return self._file
+
+    @property
+    def stat(self) -> os.stat_result:
+        if self._stat is None:
+            self._stat = self._file.lstat()
+        return self._stat
+
+    @property
+    def buffer(self) -> mmap.mmap:
+        if self._buffer is None:
+            self._handle = open(self._file, 'rb')
+            self._buffer = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._buffer
+
+    @property
+    def image(self) -> Image.Image:
+        if self._image is None:
+            self.buffer.seek(0)
+            self._image = Image.open(self.buffer)
+            self._size = self._image.size
+        return self._image
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Width and height as stored in the file
+
+        Unlike image.size, the size is not reduced by a draft mode set for a
+        fast decode of the image.
+        """
+        if self._size is None:
+            self._size = self.image.size
+        return self._size
+
+    def close(self) -> None:
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
@@ -1,18 +1,56 @@
+import os
 import re
 from functools import partial
 from pathlib import Path
-from typing import List
+from typing import List, Callable, Optional, AsyncIterator, Tuple
 
+from loguru import logger
+
+from exify.metrics import get_metrics
 from exify.utils import call_blocking
 
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png')
+
 
 async def find_files(start_dir: Path, *, pattern: re.Pattern = None) -> List[Path]:
     """Find files"""
     if pattern:
-        is_match = lambda x: re.compile(r'(.*?)').search(x.name)
+        is_match = lambda name: bool(pattern.search(name))
     else:
-        is_match = lambda x: x.suffix.lower() in ('.jpg', '.jpeg', '.png')
+        is_match = lambda name: os.path.splitext(name)[1].lower() in IMAGE_SUFFIXES
+
+    return [file async for file in iter_files(start_dir, predicate=is_match)]
+
+
+async def iter_files(start_dir: Path, *, predicate: Optional[Callable[[str], bool]] = None) -> AsyncIterator[Path]:
+    """Yield the files below start_dir while the tree is being walked
+
+    Each directory is scanned with os.scandir in the executor. File names are
+    checked with the predicate before anything else and the cached entry type
+    saves a stat call per file, so symbolic links are the only entries stat'ed.
+    """
+    metrics = get_metrics()
+    pending = [str(start_dir.expanduser().absolute())]
+    while pending:
+        with metrics.timer('scan'):
+            files, directories = await call_blocking(partial(_scan_directory, pending.pop(), predicate))
+        pending.extend(reversed(directories))
+        metrics.inc('directories_scanned_total')
+        metrics.inc('files_found_total', len(files))
+        for file in files:
+            yield Path(file)
+
 
-    generator = await call_blocking(partial(start_dir.rglob, '*'))
-    files = [x.expanduser().absolute() for x in generator if x.is_file() and is_match(x)]
-    return files
+def _scan_directory(directory: str, predicate: Optional[Callable[[str], bool]]) -> Tuple[List[str], List[str]]:
+    files = []
+    directories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif (predicate is None or predicate(entry.name)) and entry.is_file():
+                    files.append(entry.path)
+    except OSError as err:
+        logger.warning(f'Skipping {directory}: {err}')
+    return sorted(files), sorted(directories)
@@ -0,0 +1,140 @@
+"""Timestamps encoded in file names
+
+The strategies are compiled into one regular expression. The leftmost match
+in a name wins, if several strategies match at the same position the one
+registered first. Timestamps are built from the matched integers instead of
+parsing the text again with strptime.
+"""
+import re
+from datetime import datetime
+from typing import NamedTuple, List, Optional, Iterable, Pattern, Dict, Tuple
+
+from exify.events import event
+
+TIMESTAMP_FIELDS = ('year', 'month', 'day', 'hour', 'minute', 'second')
+
+_GROUP = re.compile(r'\(\?P<(' + '|'.join(TIMESTAMP_FIELDS) + r')>')
+
+
+class FilenameTimestampStrategy(NamedTuple):
+    """Pattern with named groups for the parts of a timestamp, year, month and day are required"""
+    name: str
+    pattern: str
+
+
+class FilenameTimestamp(NamedTuple):
+    timestamp: datetime
+    strategy: str
+
+
+DEFAULT_STRATEGIES = (
+    # IMG-20140430-WA0004.jpg
+    FilenameTimestampStrategy('whatsapp', r'(?:IMG|VID)-(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})-WA'),
+    # IMG_20200716_192540.jpg, PXL_20200716_192540123.jpg
+    FilenameTimestampStrategy(
+        'camera',
+        r'(?:IMG|VID|PXL|PANO)_(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})_'
+        r'(?P<hour>\d{2})(?P<minute>\d{2})(?P<second>\d{2})',
+    ),
+    # signal-2020-07-16-192540.jpg, signal-2020-07-16-19-25-40-123.jpg
+    FilenameTimestampStrategy(
+        'signal',
+        r'signal-(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})-'
+        r'(?P<hour>\d{2})-?(?P<minute>\d{2})-?(?P<second>\d{2})',
+    ),
+    # photo_2020-07-16_19-25-40.jpg
+    FilenameTimestampStrategy(
+        'telegram',
+        r'photo_(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})_(?P<hour>\d{2})-(?P<minute>\d{2})-(?P<second>\d{2})',
+    ),
+    # Screenshot 2020-07-16 19.25.40.png, Bildschirmfoto 2020-07-16 um 19.25.40.png
+    FilenameTimestampStrategy(
+        'screenshot',
+        r'(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})(?:.*?(?P<hour>\d{2})\.(?P<minute>\d{2})\.(?P<second>\d{2}))?',
+    ),
+    # any other name with eight digits
+    FilenameTimestampStrategy('date', r'(?P<year>\d{4})(?P<month>\d{2})(?P<day>\d{2})'),
+)
+
+
+class FilenameTimestampParser:
+    def __init__(self, strategies: Iterable[FilenameTimestampStrategy] = DEFAULT_STRATEGIES):
+        self._strategies: List[FilenameTimestampStrategy] = []
+        for strategy in strategies:
+            self.register(strategy)
+
+    @property
+    def strategies(self) -> List[FilenameTimestampStrategy]:
+        return list(self._strategies)
+
+    def register(self, strategy: FilenameTimestampStrategy, *, before: Optional[str] = None) -> None:
+        """Add a strategy, with the lowest priority or right before the strategy with the given name"""
+        if not strategy.name.isidentifier() or strategy.name in (s.name for s in self._strategies):
+            raise ValueError(f'Invalid or duplicate strategy name: {strategy.name}')
+        position = len(self._strategies)
+        if before is not None:
+            position = [s.name for s in self._strategies].index(before)
+        self._strategies.insert(position, strategy)
+        self._compile()
+
+    def match(self, name: str) -> Optional[FilenameTimestamp]:
+        if matcher := self._pattern.search(name):
+            return self._to_timestamp(matcher, name)
+
+    def parse(self, name: str) -> Optional[datetime]:
+        if result := self.match(name):
+            return result.timestamp
+
+    def parse_many(self, names: Iterable[str]) -> List[Optional[datetime]]:
+        """Parse many names, building each distinct timestamp only once"""
+        search = self._pattern.search
+        timestamps: Dict[Tuple[int, str], Optional[datetime]] = {}
+        results = []
+        for name in names:
+            if (matcher := search(name)) is None:
+                results.append(None)
+                continue
+            if (key := (matcher.lastindex, matcher.group())) not in timestamps:
+                result = self._to_timestamp(matcher, name)
+                timestamps[key] = result.timestamp if result else None
+            results.append(timestamps[key])
+        return results
+
+    def _compile(self):
+        self._pattern: Pattern = re.compile('|'.join(
+            f'(?P<{strategy.name}>{_prefix_groups(strategy)})' for strategy in self._strategies
+        ))
+        # strategy name and indices of the timestamp groups by index of the strategy group
+        groups = self._pattern.groupindex
+        self._groups: Dict[int, Tuple[str, Tuple[int, ...]]] = {
+            groups[strategy.name]: (
+                strategy.name,
+                tuple(groups[key] for field in TIMESTAMP_FIELDS if (key := f'{strategy.name}__{field}') in groups),
+            )
+            for strategy in self._strategies
+        }
+
+    def _to_timestamp(self, matcher: re.Match, name: str) -> Optional[FilenameTimestamp]:
+        # the strategy group encloses the timestamp groups, so it is closed last
+        strategy, indices = self._groups[matcher.lastindex]
+        try:
+            timestamp = datetime(*[int(value) for value in matcher.group(*indices) if value is not None])
+        except (TypeError, ValueError):
+            event(
+                'invalid_filename_timestamp', '{file_name}: Invalid timestamp for strategy {strategy}: {value}',
+                file_name=name, strategy=strategy, value=matcher.group(strategy),
+            )
+            return None
+        return FilenameTimestamp(timestamp, strategy)
+
+
+def _prefix_groups(strategy: FilenameTimestampStrategy) -> str:
+    """Group names must be unique in the combined pattern"""
+    return _GROUP.sub(lambda group: f'(?P<{strategy.name}__{group.group(1)}>', strategy.pattern)
+
+
+_default_parser = FilenameTimestampParser()
+
+
+def get_filename_timestamp_parser() -> FilenameTimestampParser:
+    return _default_parser
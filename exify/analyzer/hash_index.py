@@ -0,0 +1,64 @@
+"""Index for searching similar image hashes"""
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count('1')
+
+
+class _Node:
+    __slots__ = ('value', 'items', 'children')
+
+    def __init__(self, value: int, item: Any):
+        self.value = value
+        self.items: List[Any] = [item]
+        self.children: Dict[int, _Node] = {}
+
+
+class BKTree:
+    """BK-tree over integer hashes using the Hamming distance as metric
+
+    Inserts and radius queries only visit the subtrees that can contain
+    matches, which keeps lookups sub-linear for small radii.
+    """
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value: int, item: Any) -> None:
+        """Add an item with the given hash value"""
+        self._size += 1
+        if self._root is None:
+            self._root = _Node(value, item)
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node.value)
+            if distance == 0:
+                node.items.append(item)
+                return
+            if (child := node.children.get(distance)) is None:
+                node.children[distance] = _Node(value, item)
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """Return (distance, item) for all items within radius, closest first"""
+        found = []
+        candidates = [self._root] if self._root else []
+        while candidates:
+            node = candidates.pop()
+            distance = hamming_distance(value, node.value)
+            if distance <= radius:
+                found.extend((distance, item) for item in node.items)
+            candidates.extend(
+                child
+                for child_distance, child in node.children.items()
+                if distance - radius <= child_distance <= distance + radius
+            )
+        return sorted(found, key=lambda match: match[0])
@@ -1,24 +1,21 @@
 """WhatsApp image analyzer"""
-import re
-from collections import OrderedDict, defaultdict
+from collections import defaultdict
 from datetime import timedelta, datetime
 from enum import Enum
-from operator import itemgetter
 from typing import Optional, MutableMapping, List
 
-from loguru import logger
-
 from exify.analyzer._base import SingleFileAnalyzer
-from exify.errors import NoExifDataFoundError
+from exify.cache import AnalysisCache
+from exify.analyzer.filename_timestamp import get_filename_timestamp_parser
+from exify.events import event, events_enabled
+from exify.errors import NoExifDataFoundError, NoTimestampFoundError
 from exify.constants import EXIF_TIMESTAMP_FORMAT, ACCEPTABLE_TIME_DELTA
+from exify.adapter.jpeg_header_adapter import JpegHeaderAdapter
 from exify.adapter.piexif_adapter import PiexifAdapter
 from exify.models import FileItem, Timestamps, ExifTimestampAttribute
 
 
 class WhatsappImageAnalyzer(SingleFileAnalyzer):
-    FILENAME_PATTERN = r'\d{8}'
-    FILENAME_DATE_FORMAT = '%Y%m%d'
-
     @classmethod
     async def create(
             cls,
@@ -26,17 +23,23 @@ class WhatsappImageAnalyzer(SingleFileAnalyzer):
             *,
             settings=None,
             tasks: List = None,
-            adapter: Optional[PiexifAdapter] = None
+            adapter: Optional[PiexifAdapter] = None,
+            cache: Optional[AnalysisCache] = None,
     ):
         instance = await super().create(item, tasks=tasks, settings=settings)
-        instance._adapter = adapter or PiexifAdapter(file_name=instance.item.file)
+        adapter_class = JpegHeaderAdapter if instance._settings.header_only_reads else PiexifAdapter
+        instance._adapter = adapter or adapter_class(file_name=instance.item.file, cache=cache)
         instance._tasks = tasks or [
-            await instance.get_dimensions(),
-            await instance.get_dimensions(),
-            await instance.get_timestamp(),
+            instance.get_size,
+            instance.get_dimensions,
+            instance.get_timestamp,
         ]
         return instance
 
+    @property
+    def adapter(self) -> PiexifAdapter:
+        return self._adapter
+
     @property
     def authoritative_timestamp_attribute(self):
         return self.item.timestamps.file_name
@@ -45,7 +48,7 @@ class WhatsappImageAnalyzer(SingleFileAnalyzer):
         self.item.size = self.item.file.stat().st_size
 
     async def get_timestamp(self) -> None:
-        logger.debug(f'[ ] Analyzing {self._item.file}')
+        event('analyze', '[ ] Analyzing {file}', file=self._item.file)
 
         await self.gather_timestamp_data()
         if self.deviation_is_ok():
@@ -71,28 +74,30 @@ class WhatsappImageAnalyzer(SingleFileAnalyzer):
         )
 
     def deviation_is_ok(self, max_deviation: timedelta = ACCEPTABLE_TIME_DELTA):
-        flattened = {
-            **self.item.timestamps.dict(exclude={'exif'}),
-            **self.item.timestamps.exif
-        }
-        ordered = OrderedDict(sorted(flattened.items(), key=itemgetter(1)))
-        timestamps = list(ordered.values())
-        oldest = timestamps[-1]
-        youngest = timestamps[0]
-
-        return oldest - youngest < max_deviation
+        item_timestamps = self.item.timestamps
+        timestamps = [
+            timestamp
+            for timestamp in (
+                item_timestamps.file_name,
+                item_timestamps.file_created,
+                item_timestamps.file_modified,
+                *item_timestamps.exif.values(),
+            )
+            if timestamp is not None
+        ]
+        return bool(timestamps) and max(timestamps) - min(timestamps) < max_deviation
 
     async def _get_timestamp_from_filename(self) -> datetime:
-        pattern = re.compile(self.FILENAME_PATTERN)
-        matcher = pattern.search(self._item.file.stem)
-        result = matcher.group(0)
-        parsed = datetime.strptime(result, self.FILENAME_DATE_FORMAT)
+        parsed = get_filename_timestamp_parser().parse(self._item.file.stem)
+        if parsed is None:
+            raise NoTimestampFoundError(f'No timestamp found in file name of {self._item.file}')
 
         self._log_timestamp_results(timestamp=parsed, src='name')
         return parsed
 
     def _log_timestamp_results(self, timestamp, *, src, type_='created'):
-        logger.debug(f'{self._item.file}: {src}({type_}): {timestamp}')
+        event('timestamp', '{file}: {source}({type}): {timestamp}', file=self._item.file, source=src, type=type_,
+              timestamp=timestamp)
 
     async def _get_timestamp_from_file_system(self, attr: Enum) -> datetime:
         result = getattr(self._item.file.lstat(), attr)
@@ -106,12 +111,11 @@ class WhatsappImageAnalyzer(SingleFileAnalyzer):
         exif_data = await self._adapter.get_exif_data()
 
         if timestamps_found := await _find_exif_timestamps(exif_data):
-            [
-                self._log_timestamp_results(timestamp=f"{val}", src='EXIF', type_=attr)
-                for attr, val in timestamps_found.items()
-            ]
+            if events_enabled():
+                for attr, val in timestamps_found.items():
+                    self._log_timestamp_results(timestamp=val, src='EXIF', type_=attr)
             return timestamps_found
-        logger.info(error_msg)
+        event('no_exif_timestamp', 'No EXIF timestamps found in {file}', 'INFO', file=self._item.file)
         raise NoExifDataFoundError(error_msg)
 
 
@@ -119,5 +123,9 @@ async def _find_exif_timestamps(exif_data: MutableMapping) -> MutableMapping[str
     found = defaultdict(datetime)
     for attr in ExifTimestampAttribute.list():
         if raw := exif_data.get(attr):
-            found[attr] = datetime.strptime(raw, EXIF_TIMESTAMP_FORMAT)
+            try:
+                found[attr] = datetime.strptime(raw, EXIF_TIMESTAMP_FORMAT)
+            except ValueError:
+                event('invalid_exif_timestamp', 'Ignoring invalid EXIF timestamp {attribute}: "{raw}"', 'INFO',
+                      attribute=attr, raw=raw)
     return found
@@ -0,0 +1,217 @@
+"""Columnar storage of the metadata collected for many files
+
+Every attribute of MetadataRecord is kept in a NumPy array, so analyses over
+all files run as vectorized operations. Paths are split into an interned
+directory table and the file names. A store is saved as a directory of .npy
+files, which can be loaded as memory maps.
+"""
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional
+
+import numpy as np
+
+from exify.records import MetadataRecord
+
+MISSING = -1
+
+COLUMNS = {
+    'directory': np.int32,
+    'size': np.int64,
+    'width': np.int32,
+    'height': np.int32,
+    'timestamp_name': 'datetime64[us]',
+    'timestamp_created': 'datetime64[us]',
+    'timestamp_modified': 'datetime64[us]',
+    'image_hash': np.uint64,
+    'has_hash': np.bool_,
+}
+INITIAL_CAPACITY = 1024
+
+
+class StringTable:
+    """Strings appended one by one, saved as one UTF-8 buffer and the offsets into it"""
+
+    def __init__(self, *, buffer: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self._strings: Optional[List[str]] = None if buffer is not None else []
+        self._buffer = buffer
+        self._offsets = offsets
+
+    def append(self, value: str) -> int:
+        self._materialize()
+        self._strings.append(value)
+        return len(self._strings) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if self._strings is not None:
+            return self._strings[index]
+        return bytes(self._buffer[self._offsets[index]:self._offsets[index + 1]]).decode('utf-8')
+
+    def __len__(self) -> int:
+        return len(self._strings) if self._strings is not None else len(self._offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[index] for index in range(len(self)))
+
+    def save(self, directory: Path, name: str) -> None:
+        encoded = [value.encode('utf-8') for value in self]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.array([len(value) for value in encoded], dtype=np.int64), out=offsets[1:])
+        np.save(directory / f'{name}.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(directory / f'{name}_offsets.npy', offsets)
+
+    @classmethod
+    def load(cls, directory: Path, name: str, *, mmap_mode: Optional[str] = 'r') -> 'StringTable':
+        return cls(
+            buffer=_load_array(directory / f'{name}.npy', mmap_mode),
+            offsets=_load_array(directory / f'{name}_offsets.npy', mmap_mode),
+        )
+
+    def _materialize(self):
+        if self._strings is None:
+            self._strings = list(self)
+            self._buffer = self._offsets = None
+
+
+class MetadataStore(Mapping):
+    """Metadata of many files in columns, readable as a mapping of path to MetadataRecord"""
+
+    def __init__(self):
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.empty(INITIAL_CAPACITY, dtype=dtype) for name, dtype in COLUMNS.items()
+        }
+        self._length = 0
+        self._directories = StringTable()
+        self._names = StringTable()
+        self._directory_ids: Optional[Dict[str, int]] = {}
+        self._rows: Optional[Dict[str, int]] = {}
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        """The columns of all files, row i belongs to path(i)"""
+        return {name: column[:self._length] for name, column in self._columns.items()}
+
+    def add(self, record: MetadataRecord) -> int:
+        """Add or replace the metadata of record.path, return its row"""
+        if (row := self._row_ids().get(record.path)) is None:
+            self._reserve(self._length + 1)
+            directory, name = os.path.split(record.path)
+            row = self._length
+            self._columns['directory'][row] = self._directory_id(directory)
+            self._names.append(name)
+            self._rows[record.path] = row
+            self._length += 1
+        else:
+            self._reserve(self._length)
+
+        columns = self._columns
+        columns['size'][row] = _or_missing(record.size)
+        columns['width'][row] = _or_missing(record.width)
+        columns['height'][row] = _or_missing(record.height)
+        columns['timestamp_name'][row] = _to_datetime64(record.timestamp_name)
+        columns['timestamp_created'][row] = _to_datetime64(record.timestamp_created)
+        columns['timestamp_modified'][row] = _to_datetime64(record.timestamp_modified)
+        columns['has_hash'][row] = has_hash = bool(record.image_hash)
+        columns['image_hash'][row] = int(record.image_hash, 16) if has_hash else 0
+        return row
+
+    def path(self, row: int) -> str:
+        return os.path.join(self._directories[self._columns['directory'][row]], self._names[row])
+
+    def record(self, row: int) -> MetadataRecord:
+        columns = self._columns
+        return MetadataRecord(
+            self.path(row),
+            _from_datetime64(columns['timestamp_name'][row]),
+            _from_datetime64(columns['timestamp_created'][row]),
+            _from_datetime64(columns['timestamp_modified'][row]),
+            f'{int(columns["image_hash"][row]):016x}' if columns['has_hash'][row] else None,
+            _from_missing(columns['size'][row]),
+            _from_missing(columns['width'][row]),
+            _from_missing(columns['height'][row]),
+        )
+
+    def __getitem__(self, path: str) -> MetadataRecord:
+        return self.record(self._row_ids()[str(path)])
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.path(row) for row in range(self._length))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def duplicate_groups(self) -> List[np.ndarray]:
+        """Rows of files with identical hashes, one array per group"""
+        rows = np.flatnonzero(self._columns['has_hash'][:self._length])
+        order = np.argsort(self._columns['image_hash'][rows], kind='stable')
+        rows = rows[order]
+        hashes = self._columns['image_hash'][rows]
+        groups = np.split(rows, np.flatnonzero(np.diff(hashes)) + 1)
+        return [group for group in groups if len(group) > 1]
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, column in self.columns.items():
+            np.save(directory / f'{name}.npy', column)
+        self._directories.save(directory, 'directories')
+        self._names.save(directory, 'names')
+
+    @classmethod
+    def load(cls, directory: Path, *, mmap_mode: Optional[str] = 'r') -> 'MetadataStore':
+        """Load a saved store, by default as read-only memory maps that are copied on the first change"""
+        store = cls()
+        store._columns = {name: _load_array(directory / f'{name}.npy', mmap_mode) for name in COLUMNS}
+        store._length = len(store._columns['directory'])
+        store._directories = StringTable.load(directory, 'directories', mmap_mode=mmap_mode)
+        store._names = StringTable.load(directory, 'names', mmap_mode=mmap_mode)
+        store._directory_ids = store._rows = None
+        return store
+
+    def _reserve(self, length: int) -> None:
+        column = self._columns['directory']
+        if length <= len(column) and column.flags.writeable:
+            return
+        capacity = max(len(column), INITIAL_CAPACITY)
+        while capacity < length:
+            capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._length] = column[:self._length]
+            self._columns[name] = grown
+
+    def _row_ids(self) -> Dict[str, int]:
+        if self._rows is None:
+            self._rows = {path: row for row, path in enumerate(self)}
+        return self._rows
+
+    def _directory_id(self, directory: str) -> int:
+        if self._directory_ids is None:
+            self._directory_ids = {value: index for index, value in enumerate(self._directories)}
+        if (index := self._directory_ids.get(directory)) is None:
+            index = self._directory_ids[directory] = self._directories.append(directory)
+        return index
+
+
+def _load_array(file: Path, mmap_mode: Optional[str]) -> np.ndarray:
+    try:
+        return np.load(file, mmap_mode=mmap_mode)
+    except ValueError:
+        # empty arrays cannot be memory mapped
+        return np.load(file)
+
+
+def _or_missing(value: Optional[int]) -> int:
+    return MISSING if value is None else value
+
+
+def _from_missing(value) -> Optional[int]:
+    return None if value == MISSING else int(value)
+
+
+def _to_datetime64(value: Optional[datetime]) -> np.datetime64:
+    return np.datetime64(value, 'us') if value is not None else np.datetime64('NaT', 'us')
+
+
+def _from_datetime64(value: np.datetime64) -> Optional[datetime]:
+    return None if np.isnat(value) else value.astype(datetime)
@@ -0,0 +1,182 @@
+"""Persistent cache for analysis results
+
+Entries are keyed by path and stored together with the identity of the file
+(device, inode, size, mtime_ns) they were computed from. A lookup only returns
+a value if the file on disk still has the same identity.
+
+All methods block on the database and on stat calls, the event loop calls
+them through call_blocking. A lock serializes the threads of the executor.
+
+Several processes, e.g. workers of a work queue, may share a cache. Writes are
+collected in memory and written in one short transaction, so the database is
+never locked while files are processed. The rollback journal is used, WAL
+does not work on network file systems.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional, Any, Tuple, Dict, Iterable, Mapping, List
+
+from loguru import logger
+
+from exify.events import event
+from exify.utils import file_identity
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT NOT NULL,
+    key TEXT NOT NULL,
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (path, key)
+)
+'''
+
+
+class AnalysisCache:
+    """SQLite backed cache; a cache without a database file is disabled and never returns anything"""
+
+    def __init__(self, db_file: Optional[Path] = None, *, commit_every: int = 100):
+        self._db_file = db_file
+        self._commit_every = commit_every
+        # rows not written yet by (path, key)
+        self._pending: Dict[Tuple[str, str], tuple] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        # get invalidates outdated entries while it holds the lock
+        self._lock = threading.RLock()
+
+        if db_file:
+            db_file.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(db_file), check_same_thread=False)
+            # the journal mode is stored in the database, caches created with WAL are switched back
+            self._connection.execute('PRAGMA journal_mode=DELETE')
+            self._connection.execute(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def enabled(self) -> bool:
+        return self._connection is not None
+
+    def get(self, path: Path, key: str, *, stat: os.stat_result = None) -> Optional[Any]:
+        """Return the cached value or None if it is missing or the file has changed"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if pending := self._pending.get((str(path), key)):
+                row = pending[2:]
+            else:
+                row = self._connection.execute(
+                    'SELECT device, inode, size, mtime_ns, value FROM entries WHERE path = ? AND key = ?',
+                    (str(path), key)
+                ).fetchone()
+            if not row:
+                return None
+
+            if tuple(row[:4]) != self._identity(path, stat):
+                event('cache_outdated', '{file}: Cache entry is outdated', file=path)
+                self.invalidate(path)
+                return None
+        return json.loads(row[4])
+
+    def get_many(self, paths: Iterable[Path], key: str) -> Dict[Path, Any]:
+        """Return the cached values of the paths that have one, see get"""
+        if not self.enabled:
+            return {}
+        return {path: value for path in paths if (value := self.get(path, key)) is not None}
+
+    def set(self, path: Path, key: str, value: Any, *, stat: os.stat_result = None) -> None:
+        if not self.enabled:
+            return
+
+        row = (str(path), key, *self._identity(path, stat), json.dumps(value))
+        with self._lock:
+            self._pending[(str(path), key)] = row
+            if len(self._pending) >= self._commit_every:
+                self._flush()
+
+    def set_many(self, key: str, values: Mapping[Path, Any]) -> None:
+        for path, value in values.items():
+            self.set(path, key, value)
+
+    def invalidate(self, path: Path) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._pending = {entry: row for entry, row in self._pending.items() if entry[0] != str(path)}
+            self._write('DELETE FROM entries WHERE path = ?', [(str(path),)])
+
+    def evict_missing(self) -> int:
+        """Remove entries of files that do not exist anymore
+
+        Every cached path is checked, which takes long for large caches on slow
+        storage. Runs only evict if settings.cache_evict_missing is set.
+        """
+        if not self.enabled:
+            return 0
+
+        with self._lock:
+            self._flush()
+            paths = [row[0] for row in self._connection.execute('SELECT DISTINCT path FROM entries')]
+        missing = [(path,) for path in paths if not os.path.exists(path)]
+        with self._lock:
+            self._write('DELETE FROM entries WHERE path = ?', missing)
+        logger.debug(f'Evicted {len(missing)} cache entries')
+        return len(missing)
+
+    def close(self) -> None:
+        if self.enabled:
+            with self._lock:
+                self._flush()
+                self._connection.close()
+                self._connection = None
+
+    def _flush(self) -> None:
+        rows = list(self._pending.values())
+        self._pending.clear()
+        self._write(
+            'INSERT OR REPLACE INTO entries (path, key, device, inode, size, mtime_ns, value) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+
+    def _write(self, sql: str, rows: List[tuple]) -> None:
+        """Run sql for all rows in one transaction, rows are dropped if the database stays locked"""
+        if not rows:
+            return
+        try:
+            with self._connection:
+                self._connection.executemany(sql, rows)
+        except sqlite3.OperationalError as err:
+            # the cache only saves work, a busy database must not fail the files
+            logger.warning(f'Cannot write {len(rows)} cache entries: {err}')
+
+    @staticmethod
+    def _identity(path: Path, stat: Optional[os.stat_result]) -> Tuple[int, int, int, int]:
+        return file_identity(stat or os.stat(path))
+
+
+def open_cache(settings, *, per_host: bool = False) -> AnalysisCache:
+    """Open the cache configured in the settings, or a disabled one
+
+    With per_host, every host uses a cache file of its own next to the
+    configured one, for workers whose cache directory is on shared storage.
+    """
+    if not settings.cache_enabled:
+        return AnalysisCache()
+    cache_file = settings.cache_file
+    if per_host:
+        cache_file = cache_file.with_name(f'{cache_file.stem}.{socket.gethostname()}{cache_file.suffix}')
+    return AnalysisCache(cache_file)
@@ -7,3 +7,15 @@ class ExifyError(Exception):
 
 class NoExifDataFoundError(ExifyError):
     """NoExifDataFoundError"""
+
+
+class InvalidImageError(ExifyError):
+    """InvalidImageError"""
+
+
+class FileChangedError(ExifyError):
+    """FileChangedError"""
+
+
+class NoTimestampFoundError(ExifyError):
+    """NoTimestampFoundError"""
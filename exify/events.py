@@ -0,0 +1,114 @@
+"""Structured events for the code that runs once per file
+
+An event has a name and fields, its message is a template that is only
+formatted if the event is logged, so the strings and reprs of the fields are
+not built otherwise. The fields are passed to loguru, which adds them to the
+extra dict of the record, so sinks can process them without parsing the
+message.
+
+Events below the configured level return after one comparison. Loops that
+emit events for every element should check enabled() once before the loop.
+In the sample mode only every n-th event of a name is logged, in the
+aggregate mode no event is logged, but the number of events by name is logged
+periodically at INFO level.
+"""
+import logging
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Union
+
+from loguru import logger
+
+ALL = 'all'
+SAMPLE = 'sample'
+AGGREGATE = 'aggregate'
+MODES = (ALL, SAMPLE, AGGREGATE)
+
+Level = Union[int, str]
+
+
+class Events:
+    def __init__(
+            self,
+            *,
+            level: int = logging.DEBUG,
+            mode: str = ALL,
+            sample_every: int = 100,
+            summary_interval: float = 10,
+    ):
+        if mode not in MODES:
+            raise ValueError(f'Invalid event mode: {mode}')
+        self._level = level
+        self._mode = mode
+        self._sample_every = sample_every
+        self._summary_interval = summary_interval
+        self._counts = Counter()
+        self._summarized = time.monotonic()
+
+    def enabled(self, level: Level = logging.DEBUG) -> bool:
+        return (level if level.__class__ is int else _level_no(level)) >= self._level
+
+    def emit(self, name: str, template: str, level: Level = logging.DEBUG, *, depth: int = 0, **fields) -> None:
+        """Log the event name, template is formatted with the fields
+
+        depth is the number of frames between the code the event belongs to
+        and the caller of emit.
+        """
+        if (level if level.__class__ is int else _level_no(level)) < self._level:
+            return
+        if self._mode != ALL:
+            count = self._counts[name] = self._counts[name] + 1
+            if self._mode == AGGREGATE:
+                if time.monotonic() - self._summarized >= self._summary_interval:
+                    self.flush()
+                return
+            if (count - 1) % self._sample_every:
+                return
+        logger.opt(depth=depth + 1).bind(event=name).log(_level_name(level), template, **fields)
+
+    def flush(self) -> None:
+        """Log the number of events since the last summary, in the aggregate mode"""
+        if self._mode == AGGREGATE and self._counts:
+            counts = ', '.join(f'{name}: {count}' for name, count in sorted(self._counts.items()))
+            logger.bind(event='summary', counts=dict(self._counts)).info(f'Events: {counts}')
+            self._counts.clear()
+        self._summarized = time.monotonic()
+
+
+@lru_cache(maxsize=None)
+def _level_no(level: str) -> int:
+    return logger.level(level).no
+
+
+@lru_cache(maxsize=None)
+def _level_name(level: Level) -> str:
+    return logging.getLevelName(level) if isinstance(level, int) else level
+
+
+_events = Events()
+
+
+def get_events() -> Events:
+    return _events
+
+
+def configure_events(settings) -> Events:
+    global _events
+    _events = Events(
+        level=settings.log_level,
+        mode=settings.log_events,
+        sample_every=settings.log_sample_every,
+        summary_interval=settings.log_summary_interval,
+    )
+    return _events
+
+
+def event(name: str, template: str, level: Level = logging.DEBUG, **fields) -> None:
+    # the level is checked here as well, a disabled event costs one call
+    if _events.enabled(level):
+        _events.emit(name, template, level, depth=1, **fields)
+
+
+def events_enabled(level: Level = logging.DEBUG) -> bool:
+    return _events.enabled(level)
@@ -0,0 +1,136 @@
+"""Journal of the files completed by a run, to resume it after an interruption
+
+Every processed file is appended as one JSON object per line with its outcome
+and the identity of the file after processing. Lines are collected in memory
+and written and synced to the disk in batches, in the WRITER executor. After a
+crash at most the files of the last batch are processed again, a line cut off
+by the crash is ignored.
+
+A resumed run skips every journaled file that still has the journaled identity
+and takes its outcome from the journal.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Iterator, NamedTuple, List
+
+from loguru import logger
+
+from exify.errors import ExifyError
+from exify.records import FileRecord
+from exify.utils import file_identity, call_blocking, WRITER
+
+
+class JournalEntry(NamedTuple):
+    path: str
+    identity: Optional[Tuple[int, int, int, int]]
+    outcome: str
+    errors: Tuple[str, ...] = ()
+
+    def to_record(self) -> FileRecord:
+        return FileRecord(self.path, tuple(ExifyError(err) for err in self.errors))
+
+
+class Journal:
+    def __init__(self, journal_file: Path, *, resume: bool = False, sync_every: int = 256, sync_interval: float = 1):
+        self._journal_file = journal_file
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._entries: Dict[str, JournalEntry] = read_journal(journal_file) if resume else {}
+        self._file = open(journal_file, 'a' if resume else 'w')
+        # completed files not written yet, with their outcome
+        self._pending: List[Tuple[FileRecord, str]] = []
+        self._synced = time.monotonic()
+        # batches are written by the threads of the executor one at a time
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def completed(self, path: Path) -> Optional[JournalEntry]:
+        """Journal entry of a file completed by an earlier run, if the file has not changed since"""
+        if (entry := self._entries.get(str(path))) is None:
+            return None
+        identity = await call_blocking(functools.partial(_identity, path))
+        return entry if entry.identity == identity else None
+
+    async def add(self, record: FileRecord, outcome: str) -> None:
+        """Record a completed file, the batch is written once it is full or sync_interval has passed"""
+        self._pending.append((record, outcome))
+        if len(self._pending) >= self._sync_every or time.monotonic() - self._synced >= self._sync_interval:
+            await self.sync()
+
+    async def sync(self) -> None:
+        """Write the pending entries and sync them to the disk in the WRITER executor"""
+        pending, self._pending = self._pending, []
+        self._synced = time.monotonic()
+        if pending:
+            await call_blocking(functools.partial(self._write, pending), executor=WRITER)
+
+    def close(self) -> None:
+        if not self._file.closed:
+            pending, self._pending = self._pending, []
+            self._write(pending)
+            self._file.close()
+
+    def _write(self, pending: List[Tuple[FileRecord, str]]) -> None:
+        if not pending:
+            return
+        # the files are done, the identity after processing is taken while the batch is written
+        lines = [
+            json.dumps({
+                'path': record.path,
+                'identity': _identity(record.path),
+                'outcome': outcome,
+                'errors': [str(err) for err in record.errors],
+            }) + '\n'
+            for record, outcome in pending
+        ]
+        with self._lock:
+            self._file.writelines(lines)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+
+def open_journal(settings, *, resume: bool = False) -> Journal:
+    return Journal(settings.journal_file, resume=resume)
+
+
+def _identity(path) -> Optional[Tuple[int, int, int, int]]:
+    try:
+        return file_identity(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+def read_journal(journal_file: Path) -> Dict[str, JournalEntry]:
+    """Latest entry of every journaled file"""
+    entries = {}
+    if not journal_file.exists():
+        return entries
+    for entry in _iter_entries(journal_file):
+        entries[entry.path] = entry
+    logger.info(f'Read {len(entries)} entries from {journal_file}')
+    return entries
+
+
+def _iter_entries(journal_file: Path) -> Iterator[JournalEntry]:
+    with open(journal_file) as f:
+        for number, line in enumerate(f, start=1):
+            try:
+                data = json.loads(line)
+            except ValueError:
+                logger.warning(f'{journal_file}:{number}: Ignoring incomplete entry')
+                continue
+            yield JournalEntry(
+                data['path'],
+                tuple(data['identity']) if data['identity'] else None,
+                data['outcome'],
+                tuple(data['errors']),
+            )
@@ -0,0 +1,165 @@
+"""Counters, gauges and latency histograms for the processing stages
+
+Metrics are collected in a process wide registry. They can be exported as JSON
+or in the Prometheus text format, e.g. for the textfile collector of the node
+exporter.
+"""
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Tuple, List, Iterator, Optional
+
+from loguru import logger
+
+PREFIX = 'exify'
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        total = 0
+        for bound, count in zip([*map(str, self.buckets), '+Inf'], self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._gauges: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        self._gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        series = self._histograms.setdefault(name, {})
+        if (histogram := series.get(key := _labels(labels))) is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """Record the duration of a stage, failed attempts included"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_duration_seconds', time.perf_counter() - start, stage=stage)
+
+    def counter(self, name: str, **labels: str) -> float:
+        return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def gauge(self, name: str, **labels: str) -> Optional[float]:
+        return self._gauges.get(name, {}).get(_labels(labels))
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        return self._histograms.get(name, {}).get(_labels(labels))
+
+    def to_dict(self) -> Dict:
+        return {
+            'counters': {name: _series(values) for name, values in self._counters.items()},
+            'gauges': {name: _series(values) for name, values in self._gauges.items()},
+            'histograms': {
+                name: [
+                    {
+                        'labels': dict(labels),
+                        'count': histogram.count,
+                        'sum': histogram.sum,
+                        'buckets': dict(histogram.cumulative()),
+                    }
+                    for labels, histogram in values.items()
+                ]
+                for name, values in self._histograms.items()
+            },
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for kind, metrics in (('counter', self._counters), ('gauge', self._gauges)):
+            for name, values in sorted(metrics.items()):
+                lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+                lines.extend(f'{PREFIX}_{name}{_format_labels(labels)} {value}' for labels, value in values.items())
+
+        for name, values in sorted(self._histograms.items()):
+            lines.append(f'# TYPE {PREFIX}_{name} histogram')
+            for labels, histogram in values.items():
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{PREFIX}_{name}_bucket{_format_labels((*labels, ("le", bound)))} {count}')
+                lines.append(f'{PREFIX}_{name}_sum{_format_labels(labels)} {histogram.sum}')
+                lines.append(f'{PREFIX}_{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path: Path) -> None:
+        _write_atomic(path, self.to_json())
+
+    def write_textfile(self, path: Path) -> None:
+        _write_atomic(path, self.to_prometheus())
+
+    async def write_textfile_periodically(self, path: Path, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.write_textfile(path)
+            except OSError as err:
+                logger.warning(f'Could not write metrics to {path}: {err}')
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+def reset_metrics() -> Metrics:
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def _labels(labels: Dict[str, str]) -> LabelSet:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _series(values: Dict[LabelSet, float]) -> List[Dict]:
+    return [{'labels': dict(labels), 'value': value} for labels, value in values.items()]
+
+
+def _format_labels(labels: LabelSet) -> str:
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    """Write to a temporary file first, so readers never see partial content"""
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_text(content)
+    os.replace(tmp, path)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Union, Optional, MutableMapping, List
+from typing import Union, Optional, MutableMapping, List, Tuple, Dict
 
 from pydantic import BaseModel, Extra
 
@@ -91,3 +91,11 @@ class FileMetadata(ExifyBaseModel):
     image_hash: Optional[str]
     size: Optional[int]
     dimensions: Optional[Dimensions]
+
+
+class PlanEntry(ExifyBaseModel):
+    """Changes planned for a file, valid as long as the file keeps its identity"""
+    file: Path
+    identity: Tuple[int, int, int, int]
+    exif: Dict[str, str] = {}
+    file_modified: Optional[datetime]
@@ -0,0 +1,107 @@
+"""Plan changes on one machine and apply them later, possibly on another one
+
+A plan is a file with one JSON encoded PlanEntry per line. Every entry holds
+the identity of the analyzed file, the changes are only applied if the file
+still has this identity.
+"""
+import asyncio
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+
+from exify.errors import ExifyError, FileChangedError
+from exify.metrics import get_metrics
+from exify.models import FileItem, PlanEntry
+from exify.records import FileRecord, RunSummary
+from exify.settings import ExifySettings
+from exify.utils import file_identity, configure_executors
+from exify.writer.combined_writer import CombinedTimestampWriter
+
+
+class PlanWriter:
+    def __init__(self, plan_file: Path):
+        self._plan_file = plan_file
+        self._file = open(plan_file, 'w')
+
+    def add(self, entry: PlanEntry) -> None:
+        self._file.write(entry.json(exclude_defaults=True) + '\n')
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+async def plan_changes(item: FileItem, settings: ExifySettings) -> PlanEntry:
+    """Determine the changes CombinedTimestampWriter would write for an analyzed item"""
+    writer = CombinedTimestampWriter(item, settings=settings)
+    await writer.generate_timestamp()
+    exif, file_modified = writer.changes()
+    return PlanEntry(file=item.file, identity=file_identity(item.file.stat()), exif=exif, file_modified=file_modified)
+
+
+def read_plan(plan_file: Path) -> Iterator[PlanEntry]:
+    with open(plan_file) as f:
+        for line in f:
+            if line.strip():
+                yield PlanEntry.parse_raw(line)
+
+
+async def apply_plan(plan_file: Path, settings: ExifySettings) -> RunSummary:
+    """Apply the changes of a plan, writing up to settings.concurrency files at a time"""
+    logger.info(f'Applying {plan_file}')
+
+    summary = RunSummary()
+    queue = asyncio.Queue(maxsize=settings.concurrency * 2)
+    # applying only writes, the writer threads must not limit the concurrency
+    with configure_executors(settings, writer_workers=max(settings.concurrency, settings.writer_workers)):
+        tasks = [
+            asyncio.ensure_future(_enqueue_entries(queue, plan_file, settings)),
+            *[asyncio.ensure_future(_apply_queue(queue, summary, settings)) for _ in range(settings.concurrency)]
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    logger.info(f'UPDATED: {len(summary.updated)}, ERRORS: {len(summary.errors)}')
+    for failed in summary.errors:
+        logger.warning(f'Apply failed for {failed.file}: {failed.errors}')
+
+    return summary
+
+
+async def _enqueue_entries(queue: asyncio.Queue, plan_file: Path, settings: ExifySettings):
+    for entry in read_plan(plan_file):
+        await queue.put(entry)
+
+    for _ in range(settings.concurrency):
+        await queue.put(None)
+
+
+async def _apply_queue(queue: asyncio.Queue, summary: RunSummary, settings: ExifySettings):
+    while (entry := await queue.get()) is not None:
+        await _apply_entry(entry, summary, settings)
+
+
+async def _apply_entry(entry: PlanEntry, summary: RunSummary, settings: ExifySettings):
+    item = FileItem(file=entry.file)
+    writer = CombinedTimestampWriter(item, settings=settings)
+    try:
+        try:
+            await writer.write_changes(entry.exif, entry.file_modified, identity=entry.identity)
+        except FileNotFoundError as err:
+            raise FileChangedError(f'{entry.file} has been removed since it was analyzed') from err
+    except ExifyError as err:
+        item.errors.append(err)
+        summary.errors.append(FileRecord.from_item(item))
+        get_metrics().inc('files_applied_total', outcome='error')
+    else:
+        summary.updated.append(FileRecord.from_item(item))
+        get_metrics().inc('files_applied_total', outcome='updated')
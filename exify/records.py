@@ -0,0 +1,140 @@
+"""Compact records for data kept per file over a whole run
+
+The pydantic models in exify.models validate their input and keep a __dict__
+and the set of assigned fields per instance. That is fine for the state of
+the file being processed, but adds up for data retained for every file of a
+large tree. The records here use __slots__, store paths as strings and are
+converted to and from the models only at the API boundaries.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Tuple, Optional, Dict, Any, List
+
+from exify.errors import ExifyError
+from exify.models import FileItem, FileMetadata, Dimensions
+
+_NO_ERRORS: Tuple[ExifyError, ...] = ()
+
+# attributes of RunSummary
+OUTCOMES = ('ok', 'updated', 'planned', 'errors')
+
+
+class FileRecord:
+    """Outcome of processing a file, as kept in RunSummary"""
+    __slots__ = ('path', 'errors')
+
+    def __init__(self, path: str, errors: Tuple[ExifyError, ...] = _NO_ERRORS):
+        self.path = path
+        self.errors = errors
+
+    @classmethod
+    def from_item(cls, item: FileItem) -> 'FileRecord':
+        return cls(str(item.file), tuple(item.errors) or _NO_ERRORS)
+
+    @property
+    def file(self) -> Path:
+        return Path(self.path)
+
+    def __repr__(self):
+        return f'FileRecord({self.path!r}, errors={self.errors!r})'
+
+
+class RunSummary:
+    __slots__ = ('ok', 'updated', 'planned', 'errors')
+
+    def __init__(self):
+        self.ok: List[FileRecord] = []
+        self.updated: List[FileRecord] = []
+        # files whose updates have been written to a plan
+        self.planned: List[FileRecord] = []
+        self.errors: List[FileRecord] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, record: FileRecord, outcome: str, item: Optional[FileItem] = None) -> None:
+        """Add the record of a completed file, item is the processed file if it has not been skipped"""
+        getattr(self, outcome).append(record)
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {outcome: len(getattr(self, outcome)) for outcome in OUTCOMES}
+
+    def close(self) -> None:
+        pass
+
+
+class MetadataRecord:
+    """File metadata as collected by DataCollector"""
+    __slots__ = (
+        'path', 'timestamp_name', 'timestamp_created', 'timestamp_modified', 'image_hash', 'size', 'width', 'height',
+    )
+
+    def __init__(
+            self,
+            path: str,
+            timestamp_name: Optional[datetime] = None,
+            timestamp_created: Optional[datetime] = None,
+            timestamp_modified: Optional[datetime] = None,
+            image_hash: Optional[str] = None,
+            size: Optional[int] = None,
+            width: Optional[int] = None,
+            height: Optional[int] = None,
+    ):
+        self.path = path
+        self.timestamp_name = timestamp_name
+        self.timestamp_created = timestamp_created
+        self.timestamp_modified = timestamp_modified
+        self.image_hash = image_hash
+        self.size = size
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MetadataRecord':
+        """Read the JSON representation of FileMetadata without validating it"""
+        dimensions = data.get('dimensions') or {}
+        return cls(
+            data['image'],
+            _parse_datetime(data.get('timestamp_name')),
+            _parse_datetime(data.get('timestamp_created')),
+            _parse_datetime(data.get('timestamp_modified')),
+            data.get('image_hash'),
+            data.get('size'),
+            dimensions.get('width'),
+            dimensions.get('height'),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same JSON representation as FileMetadata"""
+        return {
+            'image': self.path,
+            'timestamp_name': _format_datetime(self.timestamp_name),
+            'timestamp_created': _format_datetime(self.timestamp_created),
+            'timestamp_modified': _format_datetime(self.timestamp_modified),
+            'image_hash': self.image_hash,
+            'size': self.size,
+            'dimensions': {'width': self.width, 'height': self.height} if self.width is not None else None,
+        }
+
+    def to_model(self) -> FileMetadata:
+        return FileMetadata(
+            image=Path(self.path),
+            timestamp_name=self.timestamp_name,
+            timestamp_created=self.timestamp_created,
+            timestamp_modified=self.timestamp_modified,
+            image_hash=self.image_hash,
+            size=self.size,
+            dimensions=Dimensions(width=self.width, height=self.height) if self.width is not None else None,
+        )
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _format_datetime(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
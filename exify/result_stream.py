@@ -0,0 +1,66 @@
+"""Results of a run written as they are completed
+
+A ResultStream takes the place of the RunSummary of a run. Instead of keeping
+a record of every file, it writes one JSON object per line and only counts the
+outcomes, so its memory does not grow with the number of files. Every line is
+flushed right away and the file can be followed while the run is in progress,
+e.g. with tail -f.
+"""
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from loguru import logger
+
+from exify.models import FileItem
+from exify.records import RunSummary, FileRecord, OUTCOMES
+
+
+class ResultStream(RunSummary):
+    """RunSummary that writes the completed files to an NDJSON file, its lists stay empty"""
+    __slots__ = ('_file', '_counts')
+
+    def __init__(self, result_file: Path):
+        super().__init__()
+        # line buffered
+        self._file = open(result_file, 'w', buffering=1)
+        self._counts = dict.fromkeys(OUTCOMES, 0)
+
+    def add(self, record: FileRecord, outcome: str, item: Optional[FileItem] = None) -> None:
+        self._counts[outcome] += 1
+        self._file.write(json.dumps(to_result(record, outcome, item)) + '\n')
+        if outcome == 'errors':
+            logger.warning(f'Process failed for {record.file}: {record.errors}')
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return dict(self._counts)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def to_result(record: FileRecord, outcome: str, item: Optional[FileItem] = None) -> Dict[str, Any]:
+    """JSON representation of a completed file, without analysis results if it has been skipped"""
+    result = {'path': record.path, 'outcome': outcome}
+    if item is not None:
+        timestamps = item.timestamps
+        result['results'] = {
+            'deviation_ok': item.results.deviation_ok,
+            'exif_timestamp_exists': item.results.exif_timestamp_exists,
+        }
+        result['timestamps'] = {
+            'file_name': _isoformat(timestamps.file_name),
+            'file_created': _isoformat(timestamps.file_created),
+            'file_modified': _isoformat(timestamps.file_modified),
+            'exif': {getattr(key, 'value', key): _isoformat(value) for key, value in (timestamps.exif or {}).items()},
+        }
+    else:
+        result['skipped'] = True
+    result['errors'] = [str(err) for err in record.errors]
+    return result
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
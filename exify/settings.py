@@ -1,15 +1,17 @@
 import logging
+import os
 import platform
 import sys
 
 from loguru import logger
 from functools import lru_cache
 from pathlib import Path
-from typing import Union
+from typing import Union, Optional
 
 from pydantic import BaseSettings, Field, root_validator, validator
 
 from exify import PROJECT_ROOT
+from exify.events import configure_events, MODES
 from exify.models import MacFileAttribute, WindowsFileAttribute, LinuxFileAttribute, FileAttributeMap
 
 
@@ -18,14 +20,51 @@ def get_settings():
     return ExifySettings()
 
 
+def user_cache_dir(system: str = platform.system()) -> Path:
+    """Directory for the caches of exify in the conventional location of the platform"""
+    if system == 'Windows':
+        root = Path(os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local')
+    elif system == 'Darwin':
+        root = Path.home() / 'Library' / 'Caches'
+    else:
+        root = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+    return root / 'exify'
+
+
 def configure_logging():
     logger.remove()
     logger.add(sys.stdout, level=get_settings().log_level)
+    configure_events(get_settings())
 
 
 class ExifySettings(BaseSettings):
     base_dir: Path = Field(..., env='BASE_DIR')
     log_level: int = Field(logging.INFO, env='LOG_LEVEL')
+    log_events: str = Field('all', env='LOG_EVENTS', regex=f'^({"|".join(MODES)})$')
+    log_sample_every: int = Field(100, env='LOG_SAMPLE_EVERY', ge=1)
+    log_summary_interval: float = Field(10, env='LOG_SUMMARY_INTERVAL', gt=0)
+    concurrency: int = Field(1, env='CONCURRENCY', ge=1)
+    header_only_reads: bool = Field(True, env='HEADER_ONLY_READS')
+    hash_workers: int = Field(1, env='HASH_WORKERS', ge=1)
+    io_workers: int = Field(32, env='IO_WORKERS', ge=1)
+    writer_workers: int = Field(2, env='WRITER_WORKERS', ge=1)
+    hash_chunk_size: int = Field(16, env='HASH_CHUNK_SIZE', ge=1)
+    fast_decode: bool = Field(False, env='FAST_DECODE')
+    thumbnail_hashing: bool = Field(False, env='THUMBNAIL_HASHING')
+    duplicate_distance: int = Field(0, env='DUPLICATE_DISTANCE', ge=0, le=64)
+    metrics_file: Optional[Path] = Field(None, env='METRICS_FILE')
+    metrics_textfile: Optional[Path] = Field(None, env='METRICS_TEXTFILE')
+    metrics_interval: float = Field(15, env='METRICS_INTERVAL', gt=0)
+    results_file: Optional[Path] = Field(None, env='RESULTS_FILE')
+    cache_enabled: bool = Field(True, env='CACHE_ENABLED')
+    cache_file: Optional[Path] = Field(None, env='CACHE_FILE')
+    cache_evict_missing: bool = Field(False, env='CACHE_EVICT_MISSING')
+    journal_enabled: bool = Field(True, env='JOURNAL_ENABLED')
+    journal_file: Optional[Path] = Field(None, env='JOURNAL_FILE')
+    queue_batch_size: int = Field(50, env='QUEUE_BATCH_SIZE', ge=1)
+    queue_lease_seconds: float = Field(300, env='QUEUE_LEASE_SECONDS', gt=0)
+    queue_max_attempts: int = Field(3, env='QUEUE_MAX_ATTEMPTS', ge=1)
+    queue_poll_interval: float = Field(5, env='QUEUE_POLL_INTERVAL', gt=0)
     system: str = platform.system()
     file_attribute = Union[MacFileAttribute, WindowsFileAttribute, LinuxFileAttribute]
 
@@ -45,5 +84,17 @@ class ExifySettings(BaseSettings):
             values['base_dir'] = (PROJECT_ROOT / base_dir).expanduser().absolute()
         return values
 
+    @root_validator
+    def set_cache_file(cls, values):
+        if not values.get('cache_file'):
+            values['cache_file'] = user_cache_dir(values['system']) / 'cache.sqlite3'
+        return values
+
+    @root_validator
+    def set_journal_file(cls, values):
+        if not values.get('journal_file') and values.get('base_dir'):
+            values['journal_file'] = values['base_dir'] / '.exify-journal.ndjson'
+        return values
+
     class Config:
         env_file = PROJECT_ROOT / '.env'
@@ -1,5 +1,16 @@
 import asyncio
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Tuple, Dict, Optional, Iterator
+
+from exify.metrics import get_metrics
+
+# kinds of blocking work, each runs in an executor of its own
+IO = 'io'
+CPU = 'cpu'
+WRITER = 'writer'
 
 
 def datetime_from_timestamp(ts):
@@ -14,6 +25,82 @@ def utcnow() -> datetime:
     return datetime.utcnow()
 
 
-async def call_blocking(fn, *, loop=None):
+def file_identity(stat: os.stat_result) -> Tuple[int, int, int, int]:
+    """Identify a file version by device, inode, size and modification time"""
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class Executors:
+    """Thread pools for the kinds of blocking work, created on first use
+
+    IO is a large pool for reads, which mostly wait on the storage. CPU is a
+    thread per CPU for light CPU work, such as hashing a single image; it is
+    still bound by the GIL. Hashing many files in parallel is done in processes
+    by ProcessPoolHashEngine, sized by HASH_WORKERS. WRITER is a small pool, so
+    writes do not compete with reads for the disks and are not starved by them.
+    """
+
+    def __init__(self, *, io_workers: int = 32, cpu_workers: Optional[int] = None, writer_workers: int = 2):
+        self._workers = {IO: io_workers, CPU: cpu_workers or os.cpu_count() or 1, WRITER: writer_workers}
+        self._executors: Dict[str, Executor] = {}
+        self._pending = dict.fromkeys(self._workers, 0)
+
+    def get(self, kind: str) -> Executor:
+        if (executor := self._executors.get(kind)) is None:
+            executor = ThreadPoolExecutor(max_workers=self._workers[kind], thread_name_prefix=f'exify-{kind}')
+            self._executors[kind] = executor
+        return executor
+
+    def track(self, kind: str, change: int) -> None:
+        """Update the number of submitted calls and the queue depth metrics of an executor"""
+        self._pending[kind] += change
+        metrics = get_metrics()
+        metrics.set_gauge('executor_pending', self._pending[kind], executor=kind)
+        metrics.set_gauge('executor_queue_depth', max(0, self._pending[kind] - self._workers[kind]), executor=kind)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down all executors, they are created again if they are needed afterwards"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+        self._executors.clear()
+
+
+_executors = Executors()
+
+
+def get_executors() -> Executors:
+    return _executors
+
+
+@contextmanager
+def configure_executors(settings, *, writer_workers: Optional[int] = None) -> Iterator[Executors]:
+    """Use executors sized as configured in the settings until the block is left
+
+    writer_workers overrides settings.writer_workers. The executors are shut
+    down on exit and the previous ones are used again.
+    """
+    global _executors
+    previous = _executors
+    _executors = Executors(io_workers=settings.io_workers, writer_workers=writer_workers or settings.writer_workers)
+    try:
+        yield _executors
+    finally:
+        _executors.shutdown()
+        _executors = previous
+
+
+async def call_blocking(fn, *, loop=None, executor: str = IO):
+    """Run fn in the executor for the given kind of work"""
     loop = loop or asyncio.get_event_loop()
-    return await loop.run_in_executor(None, fn)
+    executors = get_executors()
+    executors.track(executor, 1)
+    try:
+        return await loop.run_in_executor(executors.get(executor), fn)
+    finally:
+        executors.track(executor, -1)
@@ -0,0 +1,209 @@
+"""Work queue shared by the workers of a distributed run
+
+The queue is an SQLite database, typically on the same mount as the images.
+Files are stored relative to BASE_DIR, so every host can mount the tree at a
+different location. Workers claim batches of files with a lease and report
+the outcome of every file. The files of a worker that crashed are claimed
+again by another worker once the lease has expired.
+
+A file whose lease has expired max_attempts times is not claimed again but
+marked as failed, since it is likely to crash every worker that processes it.
+Failed files are reported as errors in the summary.
+
+Leases are compared with the wall clock of the hosts, their clocks should be
+synchronized to well below the lease duration. The database uses the default
+rollback journal, since WAL does not work on network file systems.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Dict
+
+from loguru import logger
+
+from exify.errors import ExifyError
+from exify.records import FileRecord, RunSummary, OUTCOMES
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    path TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT,
+    errors TEXT
+)
+'''
+
+
+class WorkQueue:
+    """Leased queue of files in an SQLite database
+
+    The methods block while another process holds the lock of the database,
+    for up to timeout seconds. They may be called from any thread, e.g. with
+    call_blocking, but only one at a time is executed.
+    """
+
+    def __init__(self, db_file: Path, *, lease_seconds: float = 300, max_attempts: int = 3, timeout: float = 60):
+        self._db_file = db_file
+        self._lease_seconds = lease_seconds
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # autocommit, transactions are started explicitly
+        self._connection = sqlite3.connect(
+            str(db_file), timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def lease_seconds(self) -> float:
+        return self._lease_seconds
+
+    def add(self, paths: Iterable[str]) -> int:
+        """Add files that are not queued yet, return the number of added files"""
+        with self._transaction():
+            before = self._connection.total_changes
+            self._connection.executemany('INSERT OR IGNORE INTO tasks (path) VALUES (?)', ((p,) for p in paths))
+            return self._connection.total_changes - before
+
+    def claim(self, worker: str, count: int) -> List[str]:
+        """Lease up to count pending files, or files whose lease has expired, to a worker
+
+        Files whose lease has expired max_attempts times are marked as failed instead.
+        """
+        now = time.time()
+        with self._transaction():
+            self._fail_abandoned(now)
+            rows = self._connection.execute(
+                'SELECT path, state, worker FROM tasks '
+                'WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY path LIMIT ?',
+                (PENDING, LEASED, now, count)
+            ).fetchall()
+            for path, state, previous in rows:
+                if state == LEASED:
+                    logger.warning(f'{path}: Lease of {previous} has expired')
+            self._connection.executemany(
+                'UPDATE tasks SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE path = ?',
+                [(LEASED, worker, now + self._lease_seconds, path) for path, _, _ in rows]
+            )
+        return [path for path, _, _ in rows]
+
+    def _fail_abandoned(self, now: float) -> None:
+        abandoned = self._connection.execute(
+            'SELECT path, worker FROM tasks WHERE state = ? AND lease_expires < ? AND attempts >= ?',
+            (LEASED, now, self._max_attempts)
+        ).fetchall()
+        for path, previous in abandoned:
+            logger.error(f'{path}: Lease of {previous} has expired, giving up after {self._max_attempts} attempts')
+        errors = json.dumps([f'Abandoned after {self._max_attempts} attempts with expired leases'])
+        self._connection.executemany(
+            'UPDATE tasks SET state = ?, outcome = ?, errors = ?, lease_expires = NULL WHERE path = ?',
+            [(FAILED, 'errors', errors, path) for path, _ in abandoned]
+        )
+
+    def renew(self, worker: str, paths: Iterable[str]) -> None:
+        """Extend the lease of files the worker is still processing"""
+        with self._transaction():
+            self._connection.executemany(
+                'UPDATE tasks SET lease_expires = ? WHERE path = ? AND worker = ? AND state = ?',
+                [(time.time() + self._lease_seconds, path, worker, LEASED) for path in paths]
+            )
+
+    def complete(self, worker: str, summary: RunSummary, base_dir: Path) -> int:
+        """Record the outcome of files processed by a worker
+
+        Files that have been claimed by another worker in the meantime are
+        skipped, returns the number of recorded files.
+        """
+        with self._transaction():
+            before = self._connection.total_changes
+            self._connection.executemany(
+                'UPDATE tasks SET state = ?, outcome = ?, errors = ?, lease_expires = NULL '
+                'WHERE path = ? AND worker = ? AND state = ?',
+                [
+                    (DONE, outcome, json.dumps([str(err) for err in record.errors]),
+                     record.file.relative_to(base_dir).as_posix(), worker, LEASED)
+                    for outcome in OUTCOMES for record in getattr(summary, outcome)
+                ]
+            )
+            return self._connection.total_changes - before
+
+    def counts(self) -> Dict[str, int]:
+        """Number of files by state"""
+        counts = dict.fromkeys((PENDING, LEASED, DONE, FAILED), 0)
+        with self._lock:
+            counts.update(self._connection.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state'))
+        return counts
+
+    def outstanding(self) -> int:
+        """Number of files that are pending or leased"""
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)', (PENDING, LEASED)
+            ).fetchone()[0]
+
+    def summary(self, base_dir: Path) -> RunSummary:
+        """Merged outcome of all processed files, failed files are reported as errors"""
+        summary = RunSummary()
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT path, outcome, errors FROM tasks WHERE state IN (?, ?) ORDER BY path', (DONE, FAILED)
+            ).fetchall()
+        for path, outcome, errors in rows:
+            getattr(summary, outcome).append(
+                FileRecord(str(base_dir / path), tuple(ExifyError(err) for err in json.loads(errors)))
+            )
+        return summary
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _transaction(self) -> '_Transaction':
+        return _Transaction(self._connection, self._lock)
+
+
+class _Transaction:
+    """Holds the write lock of the database from the start, so concurrent claims cannot lease the same files
+
+    The lock keeps other threads from using the connection during the transaction.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, lock: threading.Lock):
+        self._connection = connection
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._connection.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def __exit__(self, exc_type, *args):
+        try:
+            self._connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self._lock.release()
+
+
+def open_work_queue(db_file: Path, settings) -> WorkQueue:
+    return WorkQueue(
+        db_file, lease_seconds=settings.queue_lease_seconds, max_attempts=settings.queue_max_attempts
+    )
@@ -0,0 +1,86 @@
+import os
+import time
+from datetime import datetime
+from functools import partial
+from typing import Optional, Dict, Tuple
+
+from exify.adapter.piexif_adapter import PiexifAdapter
+from exify.constants import DEFAULT_EXIF_TIMESTAMP_ATTRIBUTE
+from exify.errors import FileChangedError
+from exify.events import event
+from exify.metrics import get_metrics
+from exify.models import FileItem, WindowsFileAttribute
+from exify.utils import call_blocking, file_identity, WRITER
+from exify.writer._base import BaseWriter
+from exify.writer.file_metadata_writer import FileTimestampWriter
+from exify.writer.utils import create_timestamp_from_exif_attribute, _format_datetime_for_exif
+
+
+class CombinedTimestampWriter(BaseWriter):
+    """Write the EXIF timestamp and the file timestamp in one pass
+
+    Pass the adapter of the analyzer to reuse the EXIF data it has parsed
+    already. The file is opened once: the EXIF data is patched or rewritten
+    and the modification time is set on the open file, so updating a file
+    costs at most one read and one write.
+    """
+
+    def __init__(self, item: FileItem, *, settings=None, adapter: Optional[PiexifAdapter] = None):
+        super().__init__(item, settings=settings, adapter=adapter)
+        self._adapter = adapter or PiexifAdapter(file_name=self._item.file)
+
+    async def generate_timestamp(self) -> None:
+        self._generated_timestamp = create_timestamp_from_exif_attribute(self._item)
+        if not self.item.results.exif_timestamp_exists and not any(self.item.timestamps.exif.values()):
+            self.item.timestamps.exif[DEFAULT_EXIF_TIMESTAMP_ATTRIBUTE] = self.generated_timestamp
+        if not self.item.results.deviation_ok:
+            self.item.timestamps.file_modified = self.generated_timestamp
+        event('timestamp_generated', 'Using timestamp: "{timestamp}"', timestamp=self.generated_timestamp)
+
+    async def write(self):
+        await self.generate_timestamp()
+        await self.write_changes(*self.changes())
+
+    def changes(self) -> Tuple[Dict[str, str], Optional[datetime]]:
+        """EXIF attributes and file timestamp to write, available after generate_timestamp()"""
+        exif_data = {}
+        if not self.item.results.exif_timestamp_exists:
+            exif_data[DEFAULT_EXIF_TIMESTAMP_ATTRIBUTE.value] = \
+                _format_datetime_for_exif(self._item.timestamps.exif[DEFAULT_EXIF_TIMESTAMP_ATTRIBUTE])
+        file_modified = None if self.item.results.deviation_ok else self.item.timestamps.file_modified
+        return exif_data, file_modified
+
+    async def write_changes(
+            self,
+            exif_data: Dict[str, str],
+            file_modified: Optional[datetime],
+            *,
+            identity: Optional[Tuple[int, int, int, int]] = None,
+    ):
+        """Write the given changes, if the file still has the expected identity"""
+        event('write', '{file}: Updating EXIF data and file metadata...', file=self._item.file)
+        if file_modified:
+            self.item.timestamps.file_modified = file_modified
+
+        # Windows file times can only be set through a separate handle
+        on_open_file = os.utime in os.supports_fd and self._settings.file_attribute != WindowsFileAttribute
+        with get_metrics().timer('combined_write'):
+            await call_blocking(
+                partial(self._write, exif_data, bool(file_modified) and on_open_file, identity), executor=WRITER
+            )
+            if file_modified and not on_open_file:
+                FileTimestampWriter(self._item, settings=self._settings)._set_metadata()
+        if exif_data:
+            await self._adapter.invalidate_cache()
+
+    def _write(self, exif_data: Dict[str, str], set_timestamp: bool, identity: Optional[Tuple]) -> None:
+        with open(self._item.file, 'r+b') as f:
+            if identity and file_identity(os.fstat(f.fileno())) != tuple(identity):
+                raise FileChangedError(f'{self._item.file} has changed since it was analyzed')
+            if exif_data:
+                self._adapter.write_exif_data(f, exif_data)
+                f.flush()
+            if set_timestamp:
+                raw_ts = time.mktime(self.item.timestamps.file_modified.utctimetuple())
+                event('file_timestamp', 'Setting file timestamp to "{timestamp}"', timestamp=raw_ts)
+                os.utime(f.fileno(), (raw_ts,) * 2)
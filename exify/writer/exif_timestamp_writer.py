@@ -1,9 +1,9 @@
 from typing import Optional
 
-from loguru import logger
-
 from exify.constants import DEFAULT_EXIF_TIMESTAMP_ATTRIBUTE
 from exify.adapter.piexif_adapter import PiexifAdapter
+from exify.events import event
+from exify.metrics import get_metrics
 from exify.models import FileItem
 from exify.writer._base import BaseWriter
 from exify.writer.utils import create_timestamp_from_exif_attribute, _format_datetime_for_exif
@@ -16,7 +16,7 @@ class ExifTimestampWriter(BaseWriter):
         self._adapter = adapter or PiexifAdapter(file_name=self._item.file)
 
     async def write(self):
-        logger.debug(f'{self._item.file}: Updating EXIF data...')
+        event('write', '{file}: Updating EXIF data...', file=self._item.file)
         if not any([self._item.timestamps.exif.values()]):
             await self.generate_timestamp()
 
@@ -25,9 +25,10 @@ class ExifTimestampWriter(BaseWriter):
                 _format_datetime_for_exif(self._item.timestamps.exif[DEFAULT_EXIF_TIMESTAMP_ATTRIBUTE])
         }
 
-        await self._adapter.update_exif_data(updated)
+        with get_metrics().timer('exif_write'):
+            await self._adapter.update_exif_data(updated)
 
     async def generate_timestamp(self) -> None:
         self._generated_timestamp = create_timestamp_from_exif_attribute(self._item)
         self.item.timestamps.exif[DEFAULT_EXIF_TIMESTAMP_ATTRIBUTE] = self.generated_timestamp
-        logger.debug(f'Using timestamp: "{self.generated_timestamp}"')
+        event('timestamp_generated', 'Using timestamp: "{timestamp}"', timestamp=self.generated_timestamp)
@@ -2,8 +2,8 @@ import os
 import time
 from typing import Optional
 
-from loguru import logger
-
+from exify.events import event
+from exify.metrics import get_metrics
 from exify.models import FileItem, WindowsFileAttribute
 from exify.writer._base import BaseWriter
 from exify.writer.utils import create_timestamp_from_exif_attribute
@@ -22,18 +22,19 @@ class FileTimestampWriter(BaseWriter):
     async def generate_timestamp(self):
         self._generated_timestamp = create_timestamp_from_exif_attribute(self._item)
         self.item.timestamps.file_modified = self.generated_timestamp
-        logger.debug(f'Using timestamp: "{self.generated_timestamp}"')
+        event('timestamp_generated', 'Using timestamp: "{timestamp}"', timestamp=self.generated_timestamp)
 
     async def write(self):
         await self.generate_timestamp()
-        logger.debug(f'{self._item.file}: Updating file metadata...')
-        self._set_metadata()
+        event('write', '{file}: Updating file metadata...', file=self._item.file)
+        with get_metrics().timer('file_timestamp_write'):
+            self._set_metadata()
 
     def _set_metadata(self):
         ts = self.item.timestamps.file_modified
 
         raw_ts = time.mktime(ts.utctimetuple())
-        logger.debug(f'Setting file timestamp to "{raw_ts}"')
+        event('file_timestamp', 'Setting file timestamp to "{timestamp}"', timestamp=raw_ts)
 
         if self._settings.file_attribute == WindowsFileAttribute:
             handle = win32file.CreateFile(
@@ -1,7 +1,11 @@
+import io
+import shutil
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
+import piexif
 import pytest
+from PIL import Image
 from pydantic.main import BaseModel
 
 from exify.models import FileItem
@@ -30,6 +34,17 @@ class FakeItem(FileItem):
     file: Path = Path()
 
 
+def copy_with_thumbnail(source: Path, dest: Path, thumbnail_of: Optional[Path] = None) -> Path:
+    """Copy a JPEG and embed a thumbnail of thumbnail_of, or of the image itself, in its EXIF data"""
+    with Image.open(thumbnail_of or source) as image:
+        image.thumbnail((160, 120))
+        thumbnail = io.BytesIO()
+        image.save(thumbnail, 'JPEG')
+    dest.write_bytes(source.read_bytes())
+    piexif.insert(piexif.dump({'0th': {}, 'Exif': {}, '1st': {}, 'thumbnail': thumbnail.getvalue()}), str(dest))
+    return dest
+
+
 @pytest.fixture(scope='session')
 def monkeypatch_session():
     from _pytest.monkeypatch import MonkeyPatch
@@ -41,6 +56,16 @@ def monkeypatch_session():
 @pytest.fixture(scope='session', autouse=True)
 def env(monkeypatch_session):
     monkeypatch_session.setenv('BASE_DIR', str(TESTS_ROOT))
+    monkeypatch_session.setenv('CACHE_ENABLED', 'false')
+    monkeypatch_session.setenv('JOURNAL_ENABLED', 'false')
+
+
+@pytest.fixture
+def base_dir(tmp_path):
+    """A copy of the WhatsApp examples, for tests that modify the files"""
+    base_dir = tmp_path / 'images'
+    shutil.copytree(WHATSAPP_DIR, base_dir)
+    return base_dir
 
 
 @pytest.fixture
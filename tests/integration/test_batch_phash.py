@@ -0,0 +1,34 @@
+import imagehash
+import numpy as np
+import pytest
+from PIL import Image
+
+from exify.adapter.batch_phash import batch_phash, phash_images, to_image_hash
+from tests.integration.conftest import EXAMPLES_DIR
+
+IMAGE_FILES = sorted([*EXAMPLES_DIR.rglob('*.jpg'), *EXAMPLES_DIR.rglob('*.png')])
+
+
+class TestBatchPhash:
+    def test_matches_imagehash_on_examples(self):
+        images = [Image.open(file) for file in IMAGE_FILES]
+
+        hashes = phash_images(images)
+
+        assert [f'{value:016x}' for value in hashes] == [str(imagehash.phash(image)) for image in images]
+
+    def test_matches_imagehash_on_random_thumbnails(self):
+        thumbnails = np.random.default_rng(42).integers(0, 256, (500, 32, 32), dtype=np.uint8)
+
+        hashes = batch_phash(thumbnails)
+
+        assert hashes.dtype == np.uint64
+        assert [to_image_hash(int(value)) for value in hashes] == \
+               [imagehash.phash(Image.fromarray(thumbnail)) for thumbnail in thumbnails]
+
+    def test_rejects_wrong_shape(self):
+        with pytest.raises(ValueError):
+            batch_phash(np.zeros((2, 16, 16)))
+
+    def test_no_images(self):
+        assert not len(phash_images([]))
@@ -0,0 +1,79 @@
+import re
+
+from PIL import Image
+
+from benchmarks.__main__ import _compare
+from benchmarks.corpus import CorpusSpec, generate_corpus
+from benchmarks.harness import run_benchmark, BenchmarkResult, StageLatency
+from exify.adapter.jpeg import read_jpeg_header
+
+SPEC = CorpusSpec(count=20, resolution=(64, 48), duplicate_ratio=0.3, screenshot_ratio=0.2, seed=7)
+
+
+class TestGenerateCorpus:
+    def test_is_reproducible(self, tmp_path):
+        first = generate_corpus(tmp_path / 'first', SPEC)
+        second = generate_corpus(tmp_path / 'second', SPEC)
+
+        assert [file.name for file in first] == [file.name for file in second]
+        assert [file.read_bytes() for file in first] == [file.read_bytes() for file in second]
+        assert [file.stat().st_mtime for file in first] == [file.stat().st_mtime for file in second]
+
+    def test_file_names(self, tmp_path):
+        files = generate_corpus(tmp_path, SPEC)
+
+        assert len(files) == SPEC.count
+        assert all(
+            re.fullmatch(r'IMG-\d{8}-WA\d{4}\.jpg', file.name)
+            or re.fullmatch(r'Screenshot \d{4}-\d{2}-\d{2} \d{2}\.\d{2}\.\d{2}\.png', file.name)
+            for file in files
+        )
+
+    def test_images(self, tmp_path):
+        files = generate_corpus(tmp_path, SPEC)
+        jpegs = [file for file in files if file.suffix == '.jpg']
+
+        with Image.open(files[0]) as image:
+            assert image.size == SPEC.resolution
+        assert any(read_jpeg_header(file).exif for file in jpegs)
+        assert any(not read_jpeg_header(file).exif for file in jpegs)
+
+
+class TestRunBenchmark:
+    def test_benchmark_process_exits(self, tmp_path):
+        # arrange
+        generate_corpus(tmp_path, SPEC)
+
+        # act
+        result = run_benchmark('duplicate_finder', tmp_path)
+
+        # assert
+        assert result.files == SPEC.count
+
+
+def _result(files_per_second, *stages):
+    latency = StageLatency(count=1, p50=0.1, p90=0.1, p99=0.1)
+    return BenchmarkResult(
+        name='run', files=10, seconds=1, files_per_second=files_per_second, bytes_read=None, peak_rss_kb=1,
+        stages={stage: latency for stage in stages},
+    )
+
+
+def _baseline(*results):
+    return {'results': {result.name: result.dict() for result in results}}
+
+
+class TestCompare:
+    def test_throughput_within_tolerance(self):
+        baseline = _baseline(_result(100, '_analyze_file'))
+
+        assert _compare([_result(90, '_analyze_file')], baseline, 0.2) == []
+        assert _compare([_result(70, '_analyze_file')], baseline, 0.2) == ['run']
+
+    def test_changed_stages_fail(self):
+        baseline = _baseline(_result(100, '_analyze_file', '_write_exif_data'))
+
+        assert _compare([_result(100, '_analyze_file', '_write_updates')], baseline, 0.2) == ['run']
+
+    def test_unknown_benchmark_fails(self):
+        assert _compare([_result(100, '_analyze_file')], {'results': {}}, 0.2) == ['run']
@@ -0,0 +1,139 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from exify.__main__ import run
+from exify.adapter.piexif_adapter import PiexifAdapter
+from exify.analyzer.data_collector import DataCollector
+from exify.cache import AnalysisCache
+from exify.settings import get_settings, ExifySettings, user_cache_dir
+from tests.integration.conftest import WHATSAPP_DIR
+
+
+@pytest.fixture
+def image(tmp_path):
+    source = WHATSAPP_DIR / 'IMG-20140510-WA0000.jpg'
+    dest = tmp_path / source.name
+    shutil.copy(source, dest)
+    return dest
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with AnalysisCache(tmp_path / 'cache.sqlite3') as cache:
+        yield cache
+
+
+class TestAnalysisCache:
+    def test_returns_stored_value(self, cache, image):
+        cache.set(image, 'key', {'a': 1})
+
+        assert cache.get(image, 'key') == {'a': 1}
+
+    def test_invalidates_changed_file(self, cache, image):
+        cache.set(image, 'key', {'a': 1})
+        stat = image.stat()
+        os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        assert cache.get(image, 'key') is None
+
+    def test_evicts_missing_files(self, cache, image):
+        cache.set(image, 'key', {'a': 1})
+        image.unlink()
+
+        assert cache.evict_missing() == 1
+
+    def test_returns_values_of_cached_paths(self, cache, image, tmp_path):
+        cache.set(image, 'key', {'a': 1})
+
+        assert cache.get_many([image, tmp_path / 'other.jpg'], 'key') == {image: {'a': 1}}
+
+    def test_caches_share_a_database(self, image, tmp_path):
+        db_file = tmp_path / 'shared.sqlite3'
+        with AnalysisCache(db_file) as first, AnalysisCache(db_file) as second:
+            first.set(image, 'first', {'a': 1})
+            second.set(image, 'second', {'b': 2})
+            second.close()
+            first.close()
+
+        with AnalysisCache(db_file) as cache:
+            assert cache.get_many([image], 'first') == {image: {'a': 1}}
+            assert cache.get_many([image], 'second') == {image: {'b': 2}}
+
+    def test_default_file_is_in_the_user_cache_dir(self, tmp_path):
+        settings = ExifySettings(base_dir=tmp_path, cache_file=None)
+
+        assert settings.cache_file == user_cache_dir() / 'cache.sqlite3'
+
+    def test_disabled_cache(self, image):
+        cache = AnalysisCache()
+        cache.set(image, 'key', {'a': 1})
+
+        assert cache.get(image, 'key') is None
+
+
+@pytest.mark.asyncio
+class TestCachedAnalysis:
+    async def test_exif_data_is_read_from_cache(self, cache, image, mocker):
+        await PiexifAdapter(image, cache=cache).get_exif_data()
+        adapter = PiexifAdapter(image, cache=cache)
+        load = mocker.spy(adapter, '_load_image')
+
+        data = await adapter.get_exif_data()
+
+        assert data['DateTimeOriginal'] == '2014:05:10 10:30:00'
+        load.assert_not_called()
+
+    async def test_data_collector_reuses_metadata(self, cache, image, mocker):
+        settings = get_settings()
+        first = DataCollector(settings=settings, cache=cache)
+        await first.run([image])
+        second = DataCollector(settings=settings, cache=cache)
+        dimensions = mocker.patch('exify.analyzer.data_collector.dimensions')
+
+        await second.run([image])
+
+        assert second.items[image] == first.items[image]
+        dimensions.assert_not_called()
+
+    async def test_cache_is_used_in_executor_threads(self, cache, image, mocker):
+        threads = set()
+        get = cache.get
+
+        def record_thread(*args, **kwargs):
+            threads.add(threading.current_thread())
+            return get(*args, **kwargs)
+
+        mocker.patch.object(cache, 'get', side_effect=record_thread)
+
+        await PiexifAdapter(image, cache=cache).get_exif_data()
+
+        assert threads and threading.main_thread() not in threads
+
+
+@pytest.mark.asyncio
+class TestEviction:
+    @pytest.fixture
+    def cache_settings(self, base_dir, tmp_path):
+        return ExifySettings(base_dir=base_dir, cache_enabled=True, cache_file=tmp_path / 'cache.sqlite3')
+
+    @pytest.fixture
+    def removed(self, cache_settings, image):
+        with AnalysisCache(cache_settings.cache_file) as cache:
+            cache.set(image, 'key', {'a': 1})
+        image.unlink()
+        return image
+
+    async def test_run_keeps_entries_by_default(self, cache_settings, removed):
+        await run(cache_settings)
+
+        with AnalysisCache(cache_settings.cache_file) as cache:
+            assert cache.evict_missing() == 1
+
+    async def test_run_evicts_missing_files_if_enabled(self, cache_settings, removed):
+        await run(cache_settings.copy(update={'cache_evict_missing': True}))
+
+        with AnalysisCache(cache_settings.cache_file) as cache:
+            assert cache.evict_missing() == 0
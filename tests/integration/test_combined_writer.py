@@ -0,0 +1,54 @@
+import builtins
+
+import piexif
+import pytest
+
+from exify.analyzer.image_analyzer import WhatsappImageAnalyzer
+from exify.models import FileItem
+from exify.writer.combined_writer import CombinedTimestampWriter
+from exify.writer.utils import create_timestamp_from_exif_attribute
+from tests.integration.conftest import WhatsappExamples
+
+
+@pytest.mark.asyncio
+class TestCombinedTimestampWriter:
+    @pytest.fixture
+    def item(self, tmp_path):
+        file = tmp_path / WhatsappExamples().no_exif.name
+        file.write_bytes(WhatsappExamples().no_exif.read_bytes())
+        return FileItem(file=file)
+
+    @pytest.fixture
+    async def analyzer(self, item) -> WhatsappImageAnalyzer:
+        analyzer = await WhatsappImageAnalyzer.create(item)
+        await analyzer.run()
+        return analyzer
+
+    async def test_exif_and_file_timestamp_are_written(self, analyzer: WhatsappImageAnalyzer):
+        # arrange
+        item = analyzer.item
+        assert not item.results.exif_timestamp_exists and not item.results.deviation_ok
+        expected = create_timestamp_from_exif_attribute(item)
+
+        # act
+        await CombinedTimestampWriter(item, adapter=analyzer.adapter).write()
+
+        # assert
+        analyzer = await WhatsappImageAnalyzer.create(FileItem(file=item.file))
+        await analyzer.run()
+        assert analyzer.item.results.exif_timestamp_exists
+        assert analyzer.item.results.deviation_ok
+        assert analyzer.item.timestamps.exif['DateTimeOriginal'] == expected
+        assert analyzer.item.timestamps.file_modified == expected
+
+    async def test_file_is_opened_once_and_exif_not_parsed_again(self, analyzer: WhatsappImageAnalyzer, mocker):
+        # arrange
+        load = mocker.spy(piexif, 'load')
+        opened = mocker.spy(builtins, 'open')
+
+        # act
+        await CombinedTimestampWriter(analyzer.item, adapter=analyzer.adapter).write()
+
+        # assert
+        load.assert_not_called()
+        assert [call.args[0] for call in opened.call_args_list] == [analyzer.item.file]
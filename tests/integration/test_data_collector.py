@@ -1,9 +1,13 @@
+from pathlib import Path
+
 import pytest
 
-from exify.analyzer.data_collector import DataCollector
-from exify.models import FileMetadata
+from exify.adapter import image_hash_adapter
+from exify.adapter.image_hash_adapter import ImageHashAdapter
+from exify.analyzer.data_collector import DataCollector, generate_hashes
+from exify.models import FileMetadata, Dimensions
 from exify.settings import get_settings
-from tests.integration.conftest import ScreenshotExamples
+from tests.integration.conftest import ScreenshotExamples, WhatsappExamples
 
 
 def assert_all_data_extracted(metadata: FileMetadata):
@@ -45,3 +49,41 @@ class TestDataCollector:
 
         assert len(c.items) == 1
         assert all([item.timestamp_modified for item in c.items.values()])
+
+    async def test_process_pool_hashes_match(self, settings):
+        files = ScreenshotExamples().dict()['timestamp_in_filename']
+        sequential = DataCollector(settings=settings)
+        pooled = DataCollector(settings=settings.copy(update={'hash_workers': 2, 'hash_chunk_size': 1}))
+
+        await sequential.run(files)
+        await pooled.run(files)
+
+        assert [item.image_hash for item in sequential.items.values()] == \
+               [item.image_hash for item in pooled.items.values()]
+
+    async def test_file_is_stat_once(self, settings, mocker):
+        c = DataCollector(settings=settings)
+        file = WhatsappExamples().no_exif
+        lstat = mocker.spy(Path, 'lstat')
+
+        await c.run([file])
+
+        assert lstat.call_count == 1
+        assert c.items[file].dimensions.width
+
+    async def test_fast_decode_keeps_dimensions(self, settings):
+        c = DataCollector(settings=settings.copy(update={'fast_decode': True}))
+        file = WhatsappExamples().no_exif
+
+        await c.run([file])
+
+        assert c.items[file].dimensions == Dimensions(width=480, height=640)
+
+    async def test_fast_decode_without_engine(self, mocker):
+        file = WhatsappExamples().no_exif
+        prepare_image = mocker.spy(image_hash_adapter, 'prepare_image')
+
+        hashes = await generate_hashes([file], fast_decode=True)
+
+        assert prepare_image.call_args.kwargs == {'fast_decode': True}
+        assert str(hashes[file]) == str(await ImageHashAdapter(file, fast_decode=True).calculate_hash())
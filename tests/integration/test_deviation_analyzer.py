@@ -0,0 +1,97 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from exify.analyzer.deviation_analyzer import BatchDeviationAnalyzer, deviation_ok, store_deviation_ok
+from exify.analyzer.image_analyzer import WhatsappImageAnalyzer
+from exify.analyzer.metadata_store import MetadataStore
+from exify.constants import ACCEPTABLE_TIME_DELTA
+from exify.models import FileItem, Timestamps
+from exify.records import MetadataRecord
+from tests.integration.conftest import WHATSAPP_DIR
+
+START = datetime(2014, 4, 30)
+
+
+def _item(index: int, file_modified: datetime, exif=None) -> FileItem:
+    return FileItem(
+        file=WHATSAPP_DIR / f'IMG-20140430-WA{index:04d}.jpg',
+        timestamps=Timestamps(file_name=START, file_created=START, file_modified=file_modified, exif=exif or {}),
+    )
+
+
+def _single_file_results(items):
+    analyzers = [WhatsappImageAnalyzer(item) for item in items]
+    return (
+        [analyzer.deviation_is_ok() for analyzer in analyzers],
+        [bool(item.timestamps.exif) for item in items],
+    )
+
+
+@pytest.mark.asyncio
+class TestBatchDeviationAnalyzer:
+    async def test_boundaries_match_single_file_analyzer(self):
+        # arrange
+        items = [
+            _item(0, START + ACCEPTABLE_TIME_DELTA - timedelta(microseconds=1)),
+            _item(1, START + ACCEPTABLE_TIME_DELTA),
+            _item(2, START - ACCEPTABLE_TIME_DELTA),
+            _item(3, START, exif={'DateTimeOriginal': START + ACCEPTABLE_TIME_DELTA}),
+            _item(4, START, exif={'DateTime': START - timedelta(seconds=1)}),
+        ]
+        expected = _single_file_results(items)
+
+        # act
+        analyzer = BatchDeviationAnalyzer(items)
+        await analyzer.run()
+
+        # assert
+        assert analyzer.deviation_ok.tolist() == expected[0] == [True, False, False, False, True]
+        assert analyzer.exif_timestamp_exists.tolist() == expected[1]
+        assert [item.results.deviation_ok for item in items] == expected[0]
+
+    async def test_random_items_match_single_file_analyzer(self):
+        # arrange
+        rnd = random.Random(0)
+        offsets = [timedelta(microseconds=rnd.randrange(-2 * 30 * 86400 * 10 ** 6, 2 * 30 * 86400 * 10 ** 6))
+                   for _ in range(2000)]
+        items = [
+            _item(index, START + offset, exif={'DateTimeDigitized': START - offset / 2} if index % 3 else None)
+            for index, offset in enumerate(offsets)
+        ]
+        expected = _single_file_results(items)
+
+        # act
+        analyzer = BatchDeviationAnalyzer(items)
+        await analyzer.run(update_items=False)
+
+        # assert
+        assert analyzer.deviation_ok.tolist() == expected[0]
+        assert analyzer.exif_timestamp_exists.tolist() == expected[1]
+
+    async def test_no_items(self):
+        analyzer = BatchDeviationAnalyzer([])
+
+        await analyzer.run()
+
+        assert analyzer.deviation_ok.shape == analyzer.exif_timestamp_exists.shape == (0,)
+
+
+class TestDeviationOk:
+    def test_missing_timestamps_are_ignored(self):
+        timestamps = np.array([
+            ['2014-04-30T00:00', 'NaT', '2014-05-01T00:00'],
+            ['NaT', 'NaT', 'NaT'],
+        ], dtype='datetime64[us]')
+
+        assert deviation_ok(timestamps).tolist() == [True, False]
+
+    def test_store_columns(self):
+        store = MetadataStore()
+        store.add(MetadataRecord('/a/IMG-20140430-WA0001.jpg', START, START, START + timedelta(days=1)))
+        store.add(MetadataRecord('/a/IMG-20140430-WA0002.jpg', START, START, START + ACCEPTABLE_TIME_DELTA))
+        store.add(MetadataRecord('/a/IMG-20140430-WA0003.jpg', None, START, START))
+
+        assert store_deviation_ok(store).tolist() == [True, False, True]
@@ -1,12 +1,16 @@
 from pathlib import Path
 
 import pytest
+from PIL import Image
 from pydantic.main import BaseModel
 
 from exify.__main__ import expand_to_absolute_path
+from exify.adapter.image_hash_adapter import ProcessPoolHashEngine, THUMBNAIL, IMAGE
 from exify.analyzer.duplicate_finder import DuplicateFinder
+from exify.metrics import reset_metrics
 from exify.models import FileItem
-from tests.integration.conftest import WHATSAPP_DIR, EXAMPLES_DIR
+from exify.settings import get_settings
+from tests.integration.conftest import WHATSAPP_DIR, EXAMPLES_DIR, copy_with_thumbnail
 
 DUPLICATES_DIR = EXAMPLES_DIR / 'duplicates'
 
@@ -96,3 +100,161 @@ class TestDuplicateFinder:
 
         # assert
         assert len(finder._images_by_hash) == 2
+
+    async def test_duplicates_with_process_pool(self):
+        # arrange
+        items = [
+            FileItem(
+                file=expand_to_absolute_path(DuplicatesExample().first)
+            ),
+            FileItem(
+                file=expand_to_absolute_path(DuplicatesExample().second)
+            ),
+            FileItem(
+                file=expand_to_absolute_path(NoDuplicatesExample().first)
+            ),
+        ]
+
+        # act
+        async with ProcessPoolHashEngine(2, chunk_size=1) as engine:
+            finder = DuplicateFinder(items=items, engine=engine)
+            await finder.run()
+
+        # assert
+        assert len(finder._images_by_hash) == 2
+
+    async def test_corrupt_file_does_not_fail_its_chunk(self, tmp_path):
+        # arrange
+        corrupt = tmp_path / 'corrupt.jpg'
+        corrupt.write_bytes(b'not an image')
+        files = [DuplicatesExample().first, corrupt, DuplicatesExample().second]
+
+        # act
+        async with ProcessPoolHashEngine(2, chunk_size=3) as engine:
+            hashes = await engine.hash_files(files)
+            finder = DuplicateFinder(items=[FileItem(file=file) for file in files], engine=engine)
+            await finder.run()
+
+        # assert
+        assert list(hashes) == [files[0], files[2]]
+        assert finder.duplicates == [[files[0], files[2]]]
+
+    @pytest.fixture
+    def recompressed(self, tmp_path):
+        dest = tmp_path / 'IMG-20140430-WA0005.jpg'
+        with Image.open(NoDuplicatesExample().first) as image:
+            image.resize((image.width // 2, image.height // 2)).save(dest, quality=20)
+        return dest
+
+    @pytest.mark.parametrize('distance, expected', [(0, 2), (10, 1)])
+    async def test_near_duplicates(self, recompressed, distance, expected):
+        # arrange
+        items = [
+            FileItem(
+                file=expand_to_absolute_path(NoDuplicatesExample().first)
+            ),
+            FileItem(
+                file=recompressed
+            ),
+        ]
+        settings = get_settings().copy(update={'duplicate_distance': distance})
+        finder = DuplicateFinder(items=items, settings=settings)
+
+        # act
+        await finder.run()
+
+        # assert
+        assert len(finder._images_by_hash) == expected
+
+
+@pytest.fixture
+def thumbnail_settings():
+    return get_settings().copy(update={'thumbnail_hashing': True})
+
+
+@pytest.mark.asyncio
+class TestThumbnailHashing:
+    async def test_candidates_are_verified(self, tmp_path, thumbnail_settings):
+        # arrange
+        metrics = reset_metrics()
+        files = [
+            copy_with_thumbnail(file, tmp_path / file.name)
+            for file in (DuplicatesExample().first, DuplicatesExample().second, NoDuplicatesExample().first)
+        ]
+        finder = DuplicateFinder(items=[FileItem(file=file) for file in files], settings=thumbnail_settings)
+
+        # act
+        await finder.run()
+
+        # assert
+        assert finder.duplicates == [files[:2]]
+        assert finder.hash_sources == {files[0]: IMAGE, files[1]: IMAGE, files[2]: THUMBNAIL}
+        assert metrics.counter('hashes_total', source=THUMBNAIL) == 3
+        assert metrics.counter('hashes_verified_total') == 2
+
+    async def test_matching_thumbnails_of_different_images(self, tmp_path, thumbnail_settings):
+        # arrange
+        first, second = NoDuplicatesExample().first, NoDuplicatesExample().second
+        files = [
+            copy_with_thumbnail(first, tmp_path / first.name),
+            copy_with_thumbnail(second, tmp_path / second.name, thumbnail_of=first),
+        ]
+        finder = DuplicateFinder(items=[FileItem(file=file) for file in files], settings=thumbnail_settings)
+
+        # act
+        await finder.run()
+
+        # assert
+        assert not finder.duplicates
+        assert set(finder.hash_sources.values()) == {IMAGE}
+
+    async def test_images_without_thumbnail(self, thumbnail_settings):
+        # arrange
+        files = [expand_to_absolute_path(file) for file in (DuplicatesExample().first, DuplicatesExample().second)]
+        finder = DuplicateFinder(items=[FileItem(file=file) for file in files], settings=thumbnail_settings)
+
+        # act
+        await finder.run()
+
+        # assert
+        assert finder.duplicates == [files]
+        assert finder.hash_sources == {files[0]: IMAGE, files[1]: IMAGE}
+
+    async def test_thumbnails_are_hashed_in_chunks_by_the_engine(self, tmp_path, thumbnail_settings, mocker):
+        # arrange
+        hash_thumbnails = mocker.spy(ProcessPoolHashEngine, 'hash_thumbnails')
+        files = [
+            copy_with_thumbnail(file, tmp_path / file.name)
+            for file in (DuplicatesExample().first, DuplicatesExample().second, NoDuplicatesExample().first)
+        ]
+        settings = thumbnail_settings.copy(update={'hash_workers': 2, 'hash_chunk_size': 2})
+        finder = DuplicateFinder(items=[FileItem(file=file) for file in files], settings=settings)
+
+        # act
+        await finder.run()
+
+        # assert
+        assert hash_thumbnails.call_count == 1
+        assert finder.duplicates == [files[:2]]
+        assert finder.hash_sources[files[2]] == THUMBNAIL
+
+    async def test_unverified_thumbnails_are_not_grouped(self, tmp_path, thumbnail_settings):
+        # arrange
+        first, second = NoDuplicatesExample().first, NoDuplicatesExample().second
+        other = DUPLICATES_DIR / 'set2' / 'IMG-20140611-WA0000.jpg'
+        files = [
+            # same thumbnails, different images
+            copy_with_thumbnail(second, tmp_path / 'IMG-20140101-WA0001.jpg', thumbnail_of=first),
+            copy_with_thumbnail(other, tmp_path / 'IMG-20140101-WA0002.jpg', thumbnail_of=first),
+            # the thumbnail shows the image of the first file
+            copy_with_thumbnail(DuplicatesExample().first, tmp_path / 'IMG-20140101-WA0003.jpg', thumbnail_of=second),
+        ]
+        settings = thumbnail_settings.copy(update={'duplicate_distance': 10})
+        finder = DuplicateFinder(items=[FileItem(file=file) for file in files], settings=settings)
+
+        # act
+        await finder.run()
+
+        # assert
+        assert not finder.duplicates
+        assert finder.hash_sources == {files[0]: IMAGE, files[1]: IMAGE, files[2]: THUMBNAIL}
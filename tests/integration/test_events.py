@@ -0,0 +1,91 @@
+import logging
+
+import pytest
+from loguru import logger
+
+import exify.events
+from exify.events import Events, event, configure_events, get_events, SAMPLE, AGGREGATE
+from exify.settings import ExifySettings
+
+
+class Unformattable:
+    def __format__(self, format_spec):
+        raise AssertionError('formatted although the event is disabled')
+
+
+@pytest.fixture
+def records():
+    records = []
+    handler = logger.add(lambda message: records.append(message.record), level='DEBUG')
+    yield records
+    logger.remove(handler)
+
+
+@pytest.fixture
+def restore_events():
+    events = get_events()
+    yield
+    exify.events._events = events
+
+
+class TestEvents:
+    def test_disabled_events_are_not_formatted(self, records):
+        # arrange
+        events = Events(level=logging.INFO)
+
+        # act
+        events.emit('timestamp', '{file}: {timestamp}', file='/images/a.jpg', timestamp=Unformattable())
+
+        # assert
+        assert not records
+        assert not events.enabled()
+        assert events.enabled('WARNING')
+
+    def test_fields_are_structured(self, records):
+        # act
+        Events().emit('hash', '{file}: Created hash: {hash}', file='/images/a.jpg', hash='8f373714acfcf4d0')
+
+        # assert
+        assert records[0]['message'] == '/images/a.jpg: Created hash: 8f373714acfcf4d0'
+        assert records[0]['extra'] == {'event': 'hash', 'file': '/images/a.jpg', 'hash': '8f373714acfcf4d0'}
+
+    def test_record_belongs_to_the_caller(self, records, restore_events):
+        # arrange
+        configure_events(ExifySettings(base_dir='.', log_level='DEBUG'))
+
+        # act
+        event('analyze', 'Analyzing {file}', file='/images/a.jpg')
+
+        # assert
+        assert records[0]['function'] == 'test_record_belongs_to_the_caller'
+
+    def test_every_nth_event_is_sampled(self, records):
+        # arrange
+        events = Events(mode=SAMPLE, sample_every=10)
+
+        # act
+        for index in range(25):
+            events.emit('timestamp', '{index}', index=index)
+
+        # assert
+        assert [record['extra']['index'] for record in records] == [0, 10, 20]
+
+    def test_aggregated_events_are_summarized(self, records):
+        # arrange
+        events = Events(mode=AGGREGATE, summary_interval=3600)
+
+        # act
+        for index in range(25):
+            events.emit('timestamp', '{index}', index=index)
+        events.emit('hash', 'hash')
+        logged = len(records)
+        events.flush()
+
+        # assert
+        assert logged == 0
+        assert records[0]['message'] == 'Events: hash: 1, timestamp: 25'
+        assert records[0]['extra']['counts'] == {'timestamp': 25, 'hash': 1}
+
+    def test_invalid_mode_is_rejected(self):
+        with pytest.raises(ValueError):
+            Events(mode='verbose')
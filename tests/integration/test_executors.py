@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+import pytest
+
+from exify.metrics import reset_metrics
+from exify.settings import ExifySettings
+from exify.utils import call_blocking, configure_executors, get_executors, Executors, IO, CPU, WRITER
+
+
+def _thread_name():
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+class TestCallBlocking:
+    async def test_threads_of_the_selected_executor_are_used(self):
+        # act
+        io_thread = await call_blocking(_thread_name)
+        writer_thread = await call_blocking(_thread_name, executor=WRITER)
+
+        # assert
+        assert io_thread.startswith('exify-io')
+        assert writer_thread.startswith('exify-writer')
+
+    async def test_cpu_work_runs_in_threads(self):
+        # act
+        cpu_thread = await call_blocking(_thread_name, executor=CPU)
+
+        # assert
+        assert cpu_thread.startswith('exify-cpu')
+
+    async def test_queue_depth_metrics(self, tmp_path):
+        # arrange
+        metrics = reset_metrics()
+        release = threading.Event()
+
+        # act
+        with configure_executors(ExifySettings(base_dir=tmp_path, io_workers=1)):
+            tasks = [asyncio.ensure_future(call_blocking(release.wait)) for _ in range(3)]
+            await asyncio.sleep(0)
+            queued = metrics.gauge('executor_queue_depth', executor=IO)
+            release.set()
+            await asyncio.gather(*tasks)
+
+        # assert
+        assert queued == 2
+        assert metrics.gauge('executor_pending', executor=IO) == 0
+        assert metrics.gauge('executor_queue_depth', executor=IO) == 0
+
+
+class TestExecutors:
+    def test_executors_are_created_again_after_shutdown(self):
+        # arrange
+        executors = Executors(io_workers=1)
+        first = executors.get(IO)
+
+        # act
+        executors.shutdown()
+
+        # assert
+        assert executors.get(IO) is not first
+        executors.shutdown()
+
+    def test_configured_executors_replace_the_current_ones(self, tmp_path):
+        # act
+        with configure_executors(ExifySettings(base_dir=tmp_path, io_workers=3)) as executors:
+            # assert
+            assert get_executors() is executors
+            assert executors.get(IO)._max_workers == 3
+
+    def test_configured_executors_are_shut_down_on_exit(self, tmp_path):
+        # arrange
+        previous = get_executors()
+
+        # act
+        with configure_executors(ExifySettings(base_dir=tmp_path)) as executors:
+            executor = executors.get(IO)
+            executor.submit(lambda: None).result()
+
+        # assert
+        assert get_executors() is previous
+        assert executor._shutdown
+
@@ -2,7 +2,7 @@ import re
 
 import pytest
 
-from exify.analyzer.file_finder import find_files
+from exify.analyzer.file_finder import find_files, iter_files
 from exify.settings import get_settings
 
 
@@ -22,3 +22,36 @@ class TestFindFiles:
     async def test_returns_images_without_pattern(self, start_dir):
         results = await find_files(start_dir=start_dir)
         assert all([item for item in results if item.suffix in ('.jpg', '.jpeg')]), 'Return files without jpg extension'
+
+    async def test_pattern_is_applied(self, start_dir):
+        whatsapp_pattern = re.compile(r'IMG-\d{8}-WA(.*)')
+
+        results = await find_files(start_dir, pattern=whatsapp_pattern)
+
+        assert all(whatsapp_pattern.search(item.name) for item in results)
+
+
+@pytest.mark.asyncio
+class TestIterFiles:
+    async def test_yields_files_while_walking(self, start_dir):
+        files = iter_files(start_dir)
+
+        first = await files.__anext__()
+        await files.aclose()
+
+        assert first.is_absolute() and first.is_file()
+
+    async def test_predicate_is_checked_on_names(self, start_dir):
+        names = []
+
+        def predicate(name):
+            names.append(name)
+            return name.endswith('.png')
+
+        results = [file async for file in iter_files(start_dir, predicate=predicate)]
+
+        assert {file.name for file in results} == {name for name in names if name.endswith('.png')}
+        assert all(isinstance(name, str) for name in names)
+
+    async def test_missing_directory(self, tmp_path):
+        assert not [file async for file in iter_files(tmp_path / 'missing')]
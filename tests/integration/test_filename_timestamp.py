@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from benchmarks.filename_timestamps import generate_names, legacy_timestamp
+from exify.analyzer.filename_timestamp import (
+    FilenameTimestampParser, FilenameTimestampStrategy, get_filename_timestamp_parser,
+)
+
+
+class TestFilenameTimestampParser:
+    @pytest.mark.parametrize('name,expected,strategy', [
+        ('IMG-20140430-WA0004', datetime(2014, 4, 30), 'whatsapp'),
+        ('IMG_20200716_192540', datetime(2020, 7, 16, 19, 25, 40), 'camera'),
+        ('PXL_20200716_192540123', datetime(2020, 7, 16, 19, 25, 40), 'camera'),
+        ('signal-2020-07-16-192540', datetime(2020, 7, 16, 19, 25, 40), 'signal'),
+        ('signal-2020-07-16-19-25-40-123', datetime(2020, 7, 16, 19, 25, 40), 'signal'),
+        ('photo_2020-07-16_19-25-40', datetime(2020, 7, 16, 19, 25, 40), 'telegram'),
+        ('Screenshot 2020-07-16 19.25.40', datetime(2020, 7, 16, 19, 25, 40), 'screenshot'),
+        ('Bildschirmfoto 2020-07-16 um 19.25.40', datetime(2020, 7, 16, 19, 25, 40), 'screenshot'),
+        ('Scan 2020-07-16', datetime(2020, 7, 16), 'screenshot'),
+        ('holiday-20200716', datetime(2020, 7, 16), 'date'),
+    ])
+    def test_strategies(self, name, expected, strategy):
+        result = get_filename_timestamp_parser().match(name)
+
+        assert result.timestamp == expected
+        assert result.strategy == strategy
+
+    @pytest.mark.parametrize('name', ['IMG_4134', 'IMG-20141331-WA0001', ''])
+    def test_no_timestamp(self, name):
+        assert get_filename_timestamp_parser().parse(name) is None
+
+    def test_matches_legacy_strategies(self):
+        names = [name for name in generate_names(500) if not name.startswith(('IMG_', 'signal', 'photo'))]
+
+        assert [get_filename_timestamp_parser().parse(name) for name in names] == \
+               [legacy_timestamp(name) for name in names]
+
+    def test_parse_many_matches_parse(self):
+        parser = get_filename_timestamp_parser()
+        names = generate_names(500) + ['IMG-20141331-WA0001', 'line\nbreak 20200716']
+
+        assert parser.parse_many(names) == [parser.parse(name) for name in names]
+
+    def test_register_with_priority(self):
+        parser = FilenameTimestampParser()
+        parser.register(
+            FilenameTimestampStrategy('dmy', r'(?P<day>\d{2})\.(?P<month>\d{2})\.(?P<year>\d{4})'),
+            before='screenshot',
+        )
+
+        assert parser.match('Scan 16.07.2020').timestamp == datetime(2020, 7, 16)
+        assert [strategy.name for strategy in parser.strategies].index('dmy') == 4
+        with pytest.raises(ValueError):
+            parser.register(FilenameTimestampStrategy('dmy', r'(?P<year>\d{4})'))
@@ -0,0 +1,30 @@
+import random
+
+from exify.analyzer.hash_index import BKTree, hamming_distance
+
+
+class TestBKTree:
+    def test_search_matches_brute_force(self):
+        rnd = random.Random(42)
+        values = [rnd.getrandbits(64) for _ in range(500)]
+        values += [value ^ (1 << rnd.randrange(64)) for value in values[:50]]
+        tree = BKTree()
+        for idx, value in enumerate(values):
+            tree.add(value, idx)
+
+        for query in values[:20]:
+            expected = sorted(idx for idx, value in enumerate(values) if hamming_distance(query, value) <= 6)
+            assert sorted(idx for _, idx in tree.search(query, 6)) == expected
+
+    def test_closest_match_first(self):
+        tree = BKTree()
+        tree.add(0b1111, 'far')
+        tree.add(0b0001, 'near')
+
+        assert [item for _, item in tree.search(0b0000, 4)] == ['near', 'far']
+
+    def test_empty(self):
+        tree = BKTree()
+
+        assert not tree.search(0, 64)
+        assert len(tree) == 0
@@ -0,0 +1,27 @@
+import pytest
+from PIL import Image
+
+from exify.adapter.image_hash_adapter import ImageHashAdapter
+from tests.integration.conftest import EXAMPLES_DIR
+
+JPEG_FILES = sorted(EXAMPLES_DIR.rglob('*.jpg'))
+MAX_DISTANCE = 2
+
+
+@pytest.mark.asyncio
+class TestFastDecode:
+    @pytest.mark.parametrize('file', JPEG_FILES, ids=lambda f: f.name)
+    async def test_hash_agrees_with_full_decode(self, file):
+        full = await ImageHashAdapter(file).calculate_hash()
+        fast = await ImageHashAdapter(file, fast_decode=True).calculate_hash()
+
+        assert full - fast <= MAX_DISTANCE
+
+    async def test_decodes_scaled_down_image(self):
+        file = EXAMPLES_DIR / 'duplicates' / 'set1' / 'IMG-20140831-WA0001.jpg'
+        image = Image.open(file)
+
+        await ImageHashAdapter(file, fast_decode=True).calculate_hash(image)
+
+        assert image.mode == 'L'
+        assert image.size == (3264 // 8, 2448 // 8)
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from exify.__main__ import run
+from exify.errors import ExifyError
+from exify.journal import Journal, read_journal
+from exify.metrics import get_metrics
+from exify.records import FileRecord
+from exify.settings import ExifySettings
+from exify.utils import file_identity
+from tests.integration.conftest import WHATSAPP_DIR
+
+
+@pytest.fixture
+def journal_file(tmp_path):
+    return tmp_path / 'journal.ndjson'
+
+
+@pytest.fixture
+def image(tmp_path):
+    image = tmp_path / 'IMG-20140430-WA0004.jpg'
+    shutil.copy(WHATSAPP_DIR / image.name, image)
+    return image
+
+
+@pytest.fixture
+def settings(base_dir, journal_file):
+    return ExifySettings(base_dir=base_dir, journal_enabled=True, journal_file=journal_file)
+
+
+@pytest.mark.asyncio
+class TestJournal:
+    async def test_latest_entry_of_a_file_is_read(self, journal_file, image):
+        # arrange
+        with Journal(journal_file) as journal:
+            await journal.add(FileRecord(str(image), (ExifyError('broken'),)), 'errors')
+            await journal.add(FileRecord(str(image)), 'updated')
+
+        # act
+        entries = read_journal(journal_file)
+
+        # assert
+        assert list(entries) == [str(image)]
+        assert entries[str(image)].outcome == 'updated'
+        assert entries[str(image)].identity == file_identity(image.stat())
+
+    async def test_incomplete_entry_is_ignored(self, journal_file, image):
+        # arrange
+        with Journal(journal_file) as journal:
+            await journal.add(FileRecord(str(image)), 'ok')
+        with open(journal_file, 'a') as f:
+            f.write('{"path": "/images/IMG-2014')
+
+        # act
+        entries = read_journal(journal_file)
+
+        # assert
+        assert list(entries) == [str(image)]
+
+    async def test_changed_files_are_not_completed(self, journal_file, image):
+        # arrange
+        with Journal(journal_file) as journal:
+            await journal.add(FileRecord(str(image)), 'ok')
+        os.utime(image, (0, 0))
+
+        # act
+        with Journal(journal_file, resume=True) as journal:
+            entry = await journal.completed(image)
+
+        # assert
+        assert entry is None
+
+    async def test_entries_are_synced_in_batches(self, journal_file, image, monkeypatch):
+        # arrange
+        synced = []
+        monkeypatch.setattr('exify.journal.os.fsync', synced.append)
+
+        # act
+        with Journal(journal_file, sync_every=3, sync_interval=3600) as journal:
+            for _ in range(7):
+                await journal.add(FileRecord(str(image)), 'ok')
+
+        # assert
+        assert len(synced) == 3
+
+    async def test_sync_does_not_block_the_event_loop(self, journal_file, image, monkeypatch):
+        # arrange
+        threads = []
+
+        def slow_fsync(fd):
+            threads.append(threading.current_thread())
+            time.sleep(0.2)
+
+        monkeypatch.setattr('exify.journal.os.fsync', slow_fsync)
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.ensure_future(tick())
+
+        # act
+        with Journal(journal_file, sync_every=1) as journal:
+            await journal.add(FileRecord(str(image)), 'ok')
+        ticker.cancel()
+
+        # assert
+        assert threads and threading.main_thread() not in threads
+        assert len(ticks) >= 5
+
+    async def test_new_run_starts_a_new_journal(self, journal_file, image):
+        # arrange
+        with Journal(journal_file) as journal:
+            await journal.add(FileRecord(str(image)), 'ok')
+
+        # act
+        Journal(journal_file).close()
+
+        # assert
+        assert read_journal(journal_file) == {}
+
+
+@pytest.mark.asyncio
+class TestResume:
+    async def test_resumed_run_skips_completed_files(self, settings):
+        # arrange
+        first = await run(settings)
+
+        # act
+        resumed = await run(settings, resume=True)
+
+        # assert
+        assert get_metrics().counter('files_processed_total', outcome='ok') == 0
+        assert sorted(record.path for record in resumed.updated) == sorted(record.path for record in first.updated)
+        assert get_metrics().counter('files_resumed_total', outcome='updated') == len(first.updated)
+
+    async def test_interrupted_run_processes_the_remaining_files(self, settings, journal_file):
+        # arrange
+        await run(settings)
+        first_line = journal_file.read_text().splitlines()[0]
+        journal_file.write_text(first_line + '\n')
+
+        # act
+        resumed = await run(settings, resume=True)
+
+        # assert
+        assert len(resumed.ok) + len(resumed.updated) == 2
+        assert get_metrics().counter('files_processed_total', outcome='ok') == 1
+        assert len(read_journal(journal_file)) == 2
@@ -0,0 +1,197 @@
+import io
+
+import piexif
+import pytest
+from PIL import Image
+
+from exify.adapter.jpeg import read_jpeg_header, patch_ascii_tags, read_exif_thumbnail
+from exify.adapter.jpeg_header_adapter import JpegHeaderAdapter
+from exify.adapter.piexif_adapter import PiexifAdapter
+from exify.errors import InvalidImageError
+from tests.integration.conftest import EXAMPLES_DIR, WHATSAPP_DIR, ScreenshotExamples, copy_with_thumbnail
+
+JPEG_FILES = sorted(EXAMPLES_DIR.rglob('*.jpg'))
+
+
+class TestReadJpegHeader:
+    @pytest.mark.parametrize('file', JPEG_FILES, ids=lambda f: f.name)
+    def test_dimensions_match_pillow(self, file):
+        header = read_jpeg_header(file)
+
+        with Image.open(file) as image:
+            assert (header.width, header.height) == image.size
+
+    def test_exif_segment_is_located(self):
+        file = EXAMPLES_DIR / 'duplicates' / 'set1' / 'IMG-20140831-WA0001.jpg'
+
+        header = read_jpeg_header(file)
+
+        assert file.read_bytes()[header.exif_offset:header.exif_offset + len(header.exif)] == header.exif
+
+    def test_not_a_jpeg(self):
+        with pytest.raises(InvalidImageError):
+            read_jpeg_header(ScreenshotExamples().modified[0])
+
+    def test_truncated_file(self, tmp_path):
+        file = tmp_path / 'truncated.jpg'
+        file.write_bytes(JPEG_FILES[0].read_bytes()[:3])
+
+        with pytest.raises(InvalidImageError):
+            read_jpeg_header(file)
+
+
+class TestReadExifThumbnail:
+    @pytest.mark.parametrize('file', JPEG_FILES, ids=lambda f: f.name)
+    def test_thumbnail_matches_piexif(self, file):
+        thumbnail = read_exif_thumbnail(file)
+
+        assert thumbnail == (piexif.load(str(file))['thumbnail'] or None)
+
+    def test_embedded_thumbnail(self, tmp_path):
+        file = copy_with_thumbnail(WHATSAPP_DIR / 'IMG-20140430-WA0004.jpg', tmp_path / 'IMG-20140430-WA0004.jpg')
+
+        thumbnail = read_exif_thumbnail(file)
+
+        assert thumbnail == piexif.load(str(file))['thumbnail']
+
+
+@pytest.mark.asyncio
+class TestJpegHeaderAdapter:
+    @pytest.mark.parametrize('file', JPEG_FILES, ids=lambda f: f.name)
+    async def test_timestamps_match_piexif(self, file):
+        expected = await PiexifAdapter(file).get_exif_data()
+
+        actual = await JpegHeaderAdapter(file).get_exif_data()
+
+        assert {key: actual[key] for key in expected} == dict(expected)
+        assert actual['ImageWidth'] and actual['ImageLength']
+
+
+def _jpeg_with_exif(file, exif, padding: int = 0) -> None:
+    Image.new('RGB', (64, 48)).save(file, exif=piexif.dump(exif) + b'\x00' * padding)
+
+
+class TestPatchAsciiTags:
+    def test_existing_slot_is_overwritten(self, tmp_path):
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        _jpeg_with_exif(file, {'Exif': {piexif.ExifIFD.DateTimeOriginal: b'0000:00:00 00:00:00'}})
+        size = file.stat().st_size
+
+        patched = patch_ascii_tags(file, {('Exif', piexif.ExifIFD.DateTimeOriginal): b'2014:08:31 00:00:00'})
+
+        assert patched
+        assert file.stat().st_size == size
+        assert piexif.load(str(file))['Exif'][piexif.ExifIFD.DateTimeOriginal] == b'2014:08:31 00:00:00'
+
+    def test_missing_slot_is_not_written(self, tmp_path):
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        _jpeg_with_exif(file, {'0th': {piexif.ImageIFD.DateTime: b'2014:08:31 00:00:00'}})
+        content = file.read_bytes()
+
+        patched = patch_ascii_tags(file, {('Exif', piexif.ExifIFD.DateTimeOriginal): b'2014:08:31 00:00:00'})
+
+        assert not patched
+        assert file.read_bytes() == content
+
+    def test_value_too_long_is_not_written(self, tmp_path):
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        _jpeg_with_exif(file, {'Exif': {piexif.ExifIFD.DateTimeOriginal: b'2014'}})
+        content = file.read_bytes()
+
+        patched = patch_ascii_tags(file, {('Exif', piexif.ExifIFD.DateTimeOriginal): b'2014:08:31 00:00:00'})
+
+        assert not patched
+        assert file.read_bytes() == content
+
+    def test_missing_slot_is_added_to_the_padding(self, tmp_path):
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        thumbnail = io.BytesIO()
+        Image.new('RGB', (16, 12)).save(thumbnail, 'JPEG')
+        exif = {
+            '0th': {piexif.ImageIFD.Make: b'Camera maker'},
+            'GPS': {piexif.GPSIFD.GPSVersionID: (2, 2, 0, 0)},
+            '1st': {piexif.ImageIFD.XResolution: (72, 1)},
+            'thumbnail': thumbnail.getvalue(),
+        }
+        _jpeg_with_exif(file, exif, padding=512)
+        size = file.stat().st_size
+        before = piexif.load(str(file))
+
+        patched = patch_ascii_tags(file, {
+            ('Exif', piexif.ExifIFD.DateTimeOriginal): b'2014:08:31 00:00:00',
+            ('0th', piexif.ImageIFD.DateTime): b'2014:08:31 00:00:00',
+        })
+
+        assert patched
+        assert file.stat().st_size == size
+        loaded = piexif.load(str(file))
+        assert loaded['Exif'][piexif.ExifIFD.DateTimeOriginal] == b'2014:08:31 00:00:00'
+        assert loaded['0th'][piexif.ImageIFD.DateTime] == b'2014:08:31 00:00:00'
+        assert loaded['0th'][piexif.ImageIFD.Make] == b'Camera maker'
+        assert loaded['GPS'][piexif.GPSIFD.GPSVersionID] == (2, 2, 0, 0)
+        assert loaded['thumbnail'] == before['thumbnail']
+
+    def test_value_too_long_is_moved_to_the_padding(self, tmp_path):
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        _jpeg_with_exif(file, {'Exif': {piexif.ExifIFD.DateTimeOriginal: b'2014'}}, padding=512)
+
+        patched = patch_ascii_tags(file, {('Exif', piexif.ExifIFD.DateTimeOriginal): b'2014:08:31 00:00:00'})
+
+        assert patched
+        assert piexif.load(str(file))['Exif'][piexif.ExifIFD.DateTimeOriginal] == b'2014:08:31 00:00:00'
+
+    def test_unknown_data_after_the_exif_data_is_not_overwritten(self, tmp_path):
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        Image.new('RGB', (64, 48)).save(file, exif=piexif.dump({'0th': {}}) + b'\x01' * 512)
+        content = file.read_bytes()
+
+        patched = patch_ascii_tags(file, {('Exif', piexif.ExifIFD.DateTimeOriginal): b'2014:08:31 00:00:00'})
+
+        assert not patched
+        assert file.read_bytes() == content
+
+
+@pytest.mark.asyncio
+class TestUpdateExifData:
+    async def test_existing_timestamp_is_patched_in_place(self, tmp_path, mocker):
+        # arrange
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        _jpeg_with_exif(file, {'Exif': {piexif.ExifIFD.DateTimeOriginal: b'0000:00:00 00:00:00'}})
+        size = file.stat().st_size
+        insert = mocker.spy(piexif, 'insert')
+
+        # act
+        await PiexifAdapter(file).update_exif_data({'DateTimeOriginal': '2014:08:31 00:00:00'})
+
+        # assert
+        insert.assert_not_called()
+        assert file.stat().st_size == size
+        assert (await PiexifAdapter(file).get_exif_data())['DateTimeOriginal'] == '2014:08:31 00:00:00'
+
+    async def test_missing_timestamp_is_added_in_place(self, tmp_path, mocker):
+        # arrange
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        _jpeg_with_exif(file, {'0th': {piexif.ImageIFD.DateTime: b'2014:08:31 00:00:00'}}, padding=256)
+        size = file.stat().st_size
+        insert = mocker.spy(piexif, 'insert')
+
+        # act
+        await PiexifAdapter(file).update_exif_data({'DateTimeOriginal': '2014:08:31 00:00:00'})
+
+        # assert
+        insert.assert_not_called()
+        assert file.stat().st_size == size
+        assert (await PiexifAdapter(file).get_exif_data())['DateTimeOriginal'] == '2014:08:31 00:00:00'
+
+    async def test_missing_timestamp_without_padding_rewrites_file(self, tmp_path, mocker):
+        # arrange
+        file = tmp_path / 'IMG-20140831-WA0001.jpg'
+        _jpeg_with_exif(file, {'0th': {piexif.ImageIFD.DateTime: b'2014:08:31 00:00:00'}})
+        insert = mocker.spy(piexif, 'insert')
+
+        # act
+        await PiexifAdapter(file).update_exif_data({'DateTimeOriginal': '2014:08:31 00:00:00'})
+
+        # assert
+        insert.assert_called_once()
+        assert (await PiexifAdapter(file).get_exif_data())['DateTimeOriginal'] == '2014:08:31 00:00:00'
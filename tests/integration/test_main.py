@@ -0,0 +1,131 @@
+import json
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from exify.__main__ import run
+from exify.errors import InvalidImageError, NoTimestampFoundError
+from exify.metrics import get_metrics
+from exify.settings import ExifySettings
+from tests.conftest import TESTS_ROOT
+from tests.integration.conftest import WHATSAPP_DIR
+
+# seconds for importing the CLI, the fastest of a few attempts counts
+IMPORT_TIME_BUDGET = 0.5
+# only needed for hashing images, never for checking timestamps
+HEAVY_MODULES = ('PIL', 'imagehash', 'scipy', 'numpy')
+
+_MEASURE_STARTUP = '''
+import json, sys, time
+start = time.perf_counter()
+import exify.__main__
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'modules': sorted(sys.modules)}))
+'''
+
+_RUN_CHECKS = '''
+import asyncio, json, sys
+from exify.__main__ import run
+from exify.settings import ExifySettings
+asyncio.run(run(ExifySettings(base_dir=sys.argv[1], log_level='WARNING')))
+print(json.dumps({'modules': sorted(sys.modules)}))
+'''
+
+
+def _python(code: str, *args: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', code, *args], cwd=TESTS_ROOT.parent, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def _heavy_modules(modules) -> set:
+    return set(HEAVY_MODULES) & {name.split('.')[0] for name in modules}
+
+
+@pytest.mark.asyncio
+class TestRun:
+    async def test_sequential(self, base_dir):
+        # arrange
+        settings = ExifySettings(base_dir=base_dir, concurrency=1)
+
+        # act
+        summary = await run(settings)
+
+        # assert
+        assert len(summary.ok) + len(summary.updated) == 2
+        assert not summary.errors
+
+    async def test_concurrent_matches_sequential(self, base_dir, tmp_path_factory):
+        # arrange
+        other_dir = tmp_path_factory.mktemp('concurrent')
+        for file in base_dir.iterdir():
+            shutil.copy(file, other_dir / file.name)
+
+        # act
+        sequential = await run(ExifySettings(base_dir=base_dir, concurrency=1))
+        concurrent = await run(ExifySettings(base_dir=other_dir, concurrency=4))
+
+        # assert
+        assert sorted(item.file.name for item in sequential.ok) == sorted(item.file.name for item in concurrent.ok)
+        assert sorted(item.file.name for item in sequential.updated) == \
+               sorted(item.file.name for item in concurrent.updated)
+        assert len(sequential.errors) == len(concurrent.errors)
+
+    async def test_failed_files_do_not_stop_the_run(self, base_dir):
+        # arrange
+        shutil.copy(WHATSAPP_DIR / 'IMG-20140430-WA0004.jpg', base_dir / 'WA-nodate.jpg')
+        (base_dir / 'IMG-20140101-WA0001.jpg').write_bytes(b'\xff\xd8garbage')
+
+        # act
+        summary = await run(ExifySettings(base_dir=base_dir, concurrency=2))
+
+        # assert
+        errors = {record.file.name: type(record.errors[0]) for record in summary.errors}
+        assert errors == {'WA-nodate.jpg': NoTimestampFoundError, 'IMG-20140101-WA0001.jpg': InvalidImageError}
+        assert len(summary.ok) + len(summary.updated) == 2
+        assert get_metrics().counter('files_processed_total', outcome='error') == 2
+
+    async def test_unexpected_errors_are_recorded(self, base_dir, mocker):
+        # arrange
+        mocker.patch('exify.__main__._write_updates', side_effect=RuntimeError('bug'))
+
+        # act
+        summary = await run(ExifySettings(base_dir=base_dir, concurrency=2))
+
+        # assert
+        assert not summary.updated and len(summary.errors) == 2
+        assert all('RuntimeError' in str(record.errors[0]) for record in summary.errors)
+
+
+class TestStartup:
+    def test_import_is_within_budget(self):
+        # act
+        seconds = min(_python(_MEASURE_STARTUP)['seconds'] for _ in range(3))
+
+        # assert
+        assert seconds < IMPORT_TIME_BUDGET
+
+    def test_import_does_not_load_image_libraries(self):
+        # act
+        modules = _python(_MEASURE_STARTUP)['modules']
+
+        # assert
+        assert not _heavy_modules(modules)
+
+    def test_run_does_not_load_image_libraries(self, base_dir):
+        # act
+        modules = _python(_RUN_CHECKS, str(base_dir))['modules']
+
+        # assert
+        assert not _heavy_modules(modules)
+
+    def test_writers_are_loaded_on_first_use(self):
+        # act
+        modules = _python(_MEASURE_STARTUP)['modules']
+
+        # assert
+        assert 'exify.plan' not in modules
+        assert 'exify.writer.combined_writer' not in modules
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from exify.analyzer.data_collector import DataCollector
+from exify.analyzer.metadata_store import MetadataStore
+from exify.records import MetadataRecord
+from exify.settings import get_settings
+from tests.integration.conftest import WHATSAPP_DIR
+
+
+def _record(path: str, image_hash='8f373714acfcf4d0', size=1000) -> MetadataRecord:
+    return MetadataRecord(
+        path,
+        datetime(2014, 4, 30),
+        datetime(2014, 4, 30, 10, 30),
+        datetime(2021, 9, 8, 5, 53, 55, 123456),
+        image_hash,
+        size,
+        1280,
+        960,
+    )
+
+
+def _as_tuple(record: MetadataRecord):
+    return tuple(getattr(record, name) for name in MetadataRecord.__slots__)
+
+
+@pytest.fixture
+def store():
+    store = MetadataStore()
+    store.add(_record('/images/a/IMG-20140430-WA0001.jpg'))
+    store.add(_record('/images/a/IMG-20140430-WA0002.jpg', image_hash='ffffffffffffffff'))
+    store.add(_record('/images/b/IMG-20140430-WA0003.jpg'))
+    store.add(MetadataRecord('/images/b/IMG-20140430-WA0004.jpg'))
+    return store
+
+
+class TestMetadataStore:
+    def test_records_round_trip(self, store):
+        record = _record('/images/a/IMG-20140430-WA0001.jpg')
+
+        assert _as_tuple(store[record.path]) == _as_tuple(record)
+        assert _as_tuple(store['/images/b/IMG-20140430-WA0004.jpg']) == \
+               _as_tuple(MetadataRecord('/images/b/IMG-20140430-WA0004.jpg'))
+
+    def test_directories_are_interned(self, store):
+        assert len(store._directories) == 2
+        assert list(store.columns['directory']) == [0, 0, 1, 1]
+
+    def test_add_replaces_existing_path(self, store):
+        store.add(_record('/images/a/IMG-20140430-WA0001.jpg', size=42))
+
+        assert len(store) == 4
+        assert store['/images/a/IMG-20140430-WA0001.jpg'].size == 42
+
+    def test_grows_beyond_initial_capacity(self):
+        store = MetadataStore()
+
+        for index in range(3000):
+            store.add(_record(f'/images/IMG-20140430-WA{index:04d}.jpg', size=index))
+
+        assert len(store) == 3000
+        assert list(store.columns['size']) == list(range(3000))
+
+    def test_duplicate_groups(self, store):
+        groups = store.duplicate_groups()
+
+        assert [list(group) for group in groups] == [[0, 2]]
+
+    def test_saved_store_is_memory_mapped(self, store, tmp_path):
+        store.save(tmp_path / 'store')
+
+        loaded = MetadataStore.load(tmp_path / 'store')
+
+        assert isinstance(loaded.columns['size'], np.memmap)
+        assert list(loaded) == list(store)
+        assert [_as_tuple(record) for record in loaded.values()] == [_as_tuple(record) for record in store.values()]
+
+    def test_loaded_store_can_be_extended(self, store, tmp_path):
+        store.save(tmp_path / 'store')
+        loaded = MetadataStore.load(tmp_path / 'store')
+
+        loaded.add(_record('/images/a/IMG-20140430-WA0001.jpg', size=42))
+        loaded.add(_record('/images/c/IMG-20140430-WA0005.jpg'))
+
+        assert len(loaded) == 5
+        assert loaded['/images/a/IMG-20140430-WA0001.jpg'].size == 42
+        assert MetadataStore.load(tmp_path / 'store')['/images/a/IMG-20140430-WA0001.jpg'].size == 1000
+
+    def test_empty_store_can_be_saved_and_loaded(self, tmp_path):
+        MetadataStore().save(tmp_path / 'store')
+
+        assert len(MetadataStore.load(tmp_path / 'store')) == 0
+
+
+@pytest.mark.asyncio
+class TestDataCollectorStore:
+    async def test_store_matches_items(self):
+        collector = DataCollector(settings=get_settings())
+
+        await collector.run(sorted(WHATSAPP_DIR.iterdir()))
+
+        assert len(collector.store) == 2
+        assert list(collector.store.columns['width']) == [item.dimensions.width for item in collector.items.values()]
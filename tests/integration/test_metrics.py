@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from exify.__main__ import run
+from exify.metrics import Metrics
+from exify.settings import ExifySettings
+
+
+class TestMetrics:
+    def test_counters_with_labels(self):
+        metrics = Metrics()
+
+        metrics.inc('files_total', outcome='ok')
+        metrics.inc('files_total', 2, outcome='ok')
+        metrics.inc('files_total', outcome='error')
+
+        assert metrics.counter('files_total', outcome='ok') == 3
+        assert metrics.counter('files_total', outcome='error') == 1
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = Metrics()
+
+        for value in (0.0001, 0.003, 0.003, 20):
+            metrics.observe('stage_duration_seconds', value, stage='hash')
+
+        buckets = dict(metrics.histogram('stage_duration_seconds', stage='hash').cumulative())
+        assert buckets['0.0005'] == 1
+        assert buckets['0.005'] == 3
+        assert buckets['10.0'] == 3
+        assert buckets['+Inf'] == 4
+
+    def test_prometheus_format(self):
+        metrics = Metrics()
+        metrics.inc('files_total', outcome='ok')
+        metrics.set_gauge('queue_depth', 4)
+        with metrics.timer('scan'):
+            pass
+
+        lines = metrics.to_prometheus().splitlines()
+
+        assert '# TYPE exify_files_total counter' in lines
+        assert 'exify_files_total{outcome="ok"} 1' in lines
+        assert 'exify_queue_depth 4' in lines
+        assert 'exify_stage_duration_seconds_bucket{stage="scan",le="+Inf"} 1' in lines
+        assert 'exify_stage_duration_seconds_count{stage="scan"} 1' in lines
+
+
+@pytest.mark.asyncio
+class TestRunMetrics:
+    async def test_metrics_are_exported(self, tmp_path, base_dir):
+        settings = ExifySettings(
+            base_dir=base_dir,
+            metrics_file=tmp_path / 'metrics.json',
+            metrics_textfile=tmp_path / 'exify.prom',
+        )
+
+        await run(settings)
+
+        exported = json.loads(settings.metrics_file.read_text())
+        processed = sum(series['value'] for series in exported['counters']['files_processed_total'])
+        stages = {series['labels']['stage'] for series in exported['histograms']['stage_duration_seconds']}
+        assert processed == 2
+        assert {'scan', 'analyze', 'exif_read', 'combined_write'} <= stages
+        assert 'exify_files_processed_total' in settings.metrics_textfile.read_text()
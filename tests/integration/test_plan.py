@@ -0,0 +1,96 @@
+import os
+import shutil
+
+import pytest
+
+from exify.__main__ import run
+from exify.errors import FileChangedError
+from exify.plan import PlanWriter, apply_plan, read_plan
+from exify.settings import ExifySettings
+from exify.utils import get_executors, WRITER
+from exify.writer.combined_writer import CombinedTimestampWriter
+
+
+@pytest.fixture
+def settings(base_dir):
+    return ExifySettings(base_dir=base_dir, concurrency=2)
+
+
+@pytest.fixture
+def plan_file(tmp_path):
+    return tmp_path / 'plan.ndjson'
+
+
+def _snapshot(base_dir):
+    return {file.name: (file.read_bytes(), file.stat().st_mtime_ns) for file in base_dir.iterdir()}
+
+
+@pytest.mark.asyncio
+class TestPlan:
+    async def test_plan_does_not_modify_files(self, settings, plan_file):
+        # arrange
+        before = _snapshot(settings.base_dir)
+
+        # act
+        with PlanWriter(plan_file) as writer:
+            summary = await run(settings, plan=writer)
+
+        # assert
+        assert _snapshot(settings.base_dir) == before
+        entries = list(read_plan(plan_file))
+        assert sorted(entry.file for entry in entries) == sorted(item.file for item in summary.planned)
+        assert not summary.updated
+        assert all(entry.exif or entry.file_modified for entry in entries)
+
+    async def test_applied_plan_matches_direct_run(self, settings, plan_file, tmp_path):
+        # arrange
+        direct_dir = tmp_path / 'direct'
+        shutil.copytree(settings.base_dir, direct_dir)
+        with PlanWriter(plan_file) as writer:
+            await run(settings, plan=writer)
+
+        # act
+        applied = await apply_plan(plan_file, settings)
+        await run(settings.copy(update={'base_dir': direct_dir}))
+
+        # assert
+        assert not applied.errors
+        assert _snapshot(settings.base_dir) == _snapshot(direct_dir)
+        rerun = await run(settings)
+        assert len(rerun.ok) == 2
+
+    async def test_writes_are_as_concurrent_as_configured(self, settings, plan_file, mocker):
+        # arrange
+        with PlanWriter(plan_file) as writer:
+            await run(settings, plan=writer)
+        workers = []
+        write_changes = CombinedTimestampWriter.write_changes
+
+        async def record_workers(*args, **kwargs):
+            workers.append(get_executors().get(WRITER)._max_workers)
+            return await write_changes(*args, **kwargs)
+
+        mocker.patch.object(CombinedTimestampWriter, 'write_changes', record_workers)
+
+        # act
+        await apply_plan(plan_file, settings.copy(update={'concurrency': 8}))
+
+        # assert
+        assert workers and set(workers) == {8}
+
+    async def test_changed_files_are_skipped(self, settings, plan_file):
+        # arrange
+        with PlanWriter(plan_file) as writer:
+            await run(settings, plan=writer)
+        changed = next(read_plan(plan_file)).file
+        os.utime(changed, (0, 0))
+        content = changed.read_bytes()
+
+        # act
+        summary = await apply_plan(plan_file, settings)
+
+        # assert
+        assert [item.file for item in summary.errors] == [changed]
+        assert isinstance(summary.errors[0].errors[0], FileChangedError)
+        assert changed.read_bytes() == content
+        assert changed.stat().st_mtime == 0
@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+from benchmarks.memory import REPRESENTATIONS, bytes_per_item
+from exify.errors import FileChangedError
+from exify.models import FileItem
+from exify.records import FileRecord, MetadataRecord
+
+
+class TestFileRecord:
+    def test_from_item(self):
+        item = FileItem(file=Path('/images/IMG-20140430-WA0004.jpg'))
+        item.errors.append(FileChangedError('changed'))
+
+        record = FileRecord.from_item(item)
+
+        assert record.file == item.file
+        assert record.errors == tuple(item.errors)
+
+
+class TestMetadataRecord:
+    def test_dict_matches_file_metadata_json(self):
+        record = REPRESENTATIONS['data collector']['after'](42)
+
+        assert record.to_dict() == json.loads(record.to_model().json())
+
+    def test_from_dict_round_trip(self):
+        record = REPRESENTATIONS['data collector']['after'](42)
+
+        parsed = MetadataRecord.from_dict(json.loads(record.to_model().json()))
+
+        assert parsed.to_model() == record.to_model()
+
+
+class TestMemoryBenchmark:
+    def test_records_have_no_instance_dict(self):
+        for factories in REPRESENTATIONS.values():
+            assert not hasattr(factories['after'](0), '__dict__')
+
+    def test_bytes_per_item(self):
+        assert bytes_per_item(REPRESENTATIONS['run summary']['after'], 100) > 0
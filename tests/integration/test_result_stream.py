@@ -0,0 +1,82 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from exify.__main__ import run
+from exify.errors import ExifyError
+from exify.models import FileItem, Timestamps, ExifTimestampAttribute, AnalysisResults
+from exify.records import FileRecord
+from exify.result_stream import ResultStream
+from exify.settings import ExifySettings
+
+
+@pytest.fixture
+def results_file(tmp_path):
+    return tmp_path / 'results.ndjson'
+
+
+def _read(results_file):
+    return [json.loads(line) for line in results_file.read_text().splitlines()]
+
+
+class TestResultStream:
+    def test_results_are_visible_before_the_stream_is_closed(self, results_file):
+        # arrange
+        item = FileItem(
+            file='/images/IMG-20140430-WA0004.jpg',
+            timestamps=Timestamps(
+                file_name=datetime(2014, 4, 30),
+                exif={ExifTimestampAttribute.original: datetime(2014, 4, 30, 10, 30)},
+            ),
+            results=AnalysisResults(deviation_ok=True, exif_timestamp_exists=True),
+        )
+
+        # act
+        with ResultStream(results_file) as stream:
+            stream.add(FileRecord.from_item(item), 'ok', item)
+            results = _read(results_file)
+
+        # assert
+        assert results == [{
+            'path': '/images/IMG-20140430-WA0004.jpg',
+            'outcome': 'ok',
+            'results': {'deviation_ok': True, 'exif_timestamp_exists': True},
+            'timestamps': {
+                'file_name': '2014-04-30T00:00:00',
+                'file_created': None,
+                'file_modified': None,
+                'exif': {'DateTimeOriginal': '2014-04-30T10:30:00'},
+            },
+            'errors': [],
+        }]
+
+    def test_only_counts_are_kept(self, results_file):
+        # act
+        with ResultStream(results_file) as stream:
+            for index in range(1000):
+                stream.add(FileRecord(f'/images/{index}.jpg'), 'ok')
+            stream.add(FileRecord('/images/broken.jpg', (ExifyError('broken'),)), 'errors')
+
+        # assert
+        assert stream.counts == {'ok': 1000, 'updated': 0, 'planned': 0, 'errors': 1}
+        assert not stream.ok and not stream.errors
+        assert _read(results_file)[-1] == {
+            'path': '/images/broken.jpg', 'outcome': 'errors', 'skipped': True, 'errors': ['broken']
+        }
+
+
+@pytest.mark.asyncio
+class TestRunWithResultStream:
+    async def test_every_file_is_written(self, base_dir, results_file):
+        # arrange
+        settings = ExifySettings(base_dir=base_dir, results_file=results_file)
+
+        # act
+        summary = await run(settings)
+
+        # assert
+        results = _read(results_file)
+        assert sorted(result['path'] for result in results) == sorted(str(file) for file in base_dir.glob('*.jpg'))
+        assert sum(summary.counts.values()) == 2
+        assert all(result['timestamps']['file_name'] for result in results)
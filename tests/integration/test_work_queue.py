@@ -0,0 +1,225 @@
+import asyncio
+import shutil
+import socket
+import threading
+
+import pytest
+
+from exify.__main__ import enqueue, work
+from exify.errors import ExifyError
+from exify.records import FileRecord, RunSummary
+from exify.settings import ExifySettings
+from exify.work_queue import WorkQueue
+
+
+def _record_thread(method, threads):
+    def wrapper(*args, **kwargs):
+        threads.append(threading.current_thread().name)
+        return method(*args, **kwargs)
+
+    return wrapper
+
+
+@pytest.fixture
+def queue_file(tmp_path):
+    return tmp_path / 'queue.sqlite3'
+
+
+class TestWorkQueue:
+    def test_add_ignores_queued_files(self, queue_file):
+        with WorkQueue(queue_file) as queue:
+            assert queue.add(['a.jpg', 'b.jpg']) == 2
+            assert queue.add(['b.jpg', 'c.jpg']) == 1
+            assert queue.counts() == {'pending': 3, 'leased': 0, 'done': 0, 'failed': 0}
+
+    def test_leased_files_are_not_claimed_again(self, queue_file):
+        # arrange
+        with WorkQueue(queue_file) as queue:
+            queue.add(['a.jpg', 'b.jpg', 'c.jpg'])
+
+            # act
+            first = queue.claim('first', 2)
+            second = queue.claim('second', 2)
+
+            # assert
+            assert first == ['a.jpg', 'b.jpg']
+            assert second == ['c.jpg']
+            assert queue.claim('third', 2) == []
+            assert queue.outstanding() == 3
+
+    def test_expired_leases_are_claimed_again(self, queue_file):
+        # arrange
+        with WorkQueue(queue_file, lease_seconds=0) as queue:
+            queue.add(['a.jpg'])
+            queue.claim('crashed', 1)
+
+            # act
+            claimed = queue.claim('second', 1)
+
+        # assert
+        assert claimed == ['a.jpg']
+
+    def test_files_with_repeatedly_expired_leases_fail(self, queue_file, tmp_path):
+        # arrange
+        with WorkQueue(queue_file, lease_seconds=0, max_attempts=2) as queue:
+            queue.add(['a.jpg', 'b.jpg'])
+            queue.claim('crashed', 1)
+            queue.claim('crashed-again', 1)
+
+            # act
+            claimed = queue.claim('third', 2)
+            summary = queue.summary(tmp_path)
+
+            # assert
+            assert claimed == ['b.jpg']
+            assert queue.counts()['failed'] == 1
+            assert [record.file for record in summary.errors] == [tmp_path / 'a.jpg']
+            assert 'Abandoned after 2 attempts' in str(summary.errors[0].errors[0])
+
+    def test_results_of_expired_leases_are_ignored(self, queue_file, tmp_path):
+        # arrange
+        summary = RunSummary()
+        summary.ok.append(FileRecord(str(tmp_path / 'a.jpg')))
+        with WorkQueue(queue_file, lease_seconds=0) as queue:
+            queue.add(['a.jpg'])
+            queue.claim('slow', 1)
+            queue.claim('second', 1)
+
+            # act
+            recorded = queue.complete('slow', summary, tmp_path)
+
+            # assert
+            assert recorded == 0
+            assert queue.counts()['leased'] == 1
+
+    def test_summary_merges_results(self, queue_file, tmp_path):
+        # arrange
+        first, second = RunSummary(), RunSummary()
+        first.ok.append(FileRecord(str(tmp_path / 'a.jpg')))
+        second.errors.append(FileRecord(str(tmp_path / 'b.jpg'), (ExifyError('broken'),)))
+        with WorkQueue(queue_file) as queue:
+            queue.add(['a.jpg', 'b.jpg'])
+            queue.claim('first', 1)
+            queue.claim('second', 1)
+
+            # act
+            queue.complete('first', first, tmp_path)
+            queue.complete('second', second, tmp_path)
+            summary = queue.summary(tmp_path)
+
+        # assert
+        assert [record.file for record in summary.ok] == [tmp_path / 'a.jpg']
+        assert [record.file for record in summary.errors] == [tmp_path / 'b.jpg']
+        assert [str(err) for err in summary.errors[0].errors] == ['broken']
+
+    def test_concurrent_claims_do_not_overlap(self, queue_file):
+        # arrange
+        with WorkQueue(queue_file) as queue:
+            queue.add([f'{index:03d}.jpg' for index in range(200)])
+        claimed = {}
+
+        def claim_all(worker):
+            with WorkQueue(queue_file) as queue:
+                claimed[worker] = []
+                while paths := queue.claim(worker, 3):
+                    claimed[worker].extend(paths)
+
+        # act
+        threads = [threading.Thread(target=claim_all, args=(f'worker-{index}',)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # assert
+        paths = [path for worker_paths in claimed.values() for path in worker_paths]
+        assert sorted(paths) == [f'{index:03d}.jpg' for index in range(200)]
+
+
+@pytest.mark.asyncio
+class TestWork:
+    async def test_workers_process_all_files(self, base_dir, queue_file):
+        # arrange
+        settings = ExifySettings(base_dir=base_dir, queue_batch_size=1)
+        with WorkQueue(queue_file) as queue:
+            await enqueue(settings, queue)
+
+            # act
+            first = await work(settings, queue, worker='first')
+            second = await work(settings, queue, worker='second')
+            summary = queue.summary(base_dir)
+
+        # assert
+        assert len(first.ok) + len(first.updated) == 2
+        assert not second.ok and not second.updated and not second.errors
+        assert sorted(record.file for record in summary.ok + summary.updated) == sorted(base_dir.glob('*.jpg'))
+
+    async def test_concurrent_workers_share_the_cache(self, base_dir, queue_file, tmp_path):
+        # arrange
+        for file in sorted(base_dir.glob('*.jpg')):
+            for idx in range(3):
+                shutil.copy(file, base_dir / f'{file.stem}-{idx}.jpg')
+        settings = ExifySettings(
+            base_dir=base_dir,
+            queue_batch_size=1,
+            queue_poll_interval=0.1,
+            cache_enabled=True,
+            cache_file=tmp_path / 'cache.sqlite3',
+        )
+        with WorkQueue(queue_file) as queue:
+            await enqueue(settings, queue)
+
+        # act
+        with WorkQueue(queue_file) as first_queue, WorkQueue(queue_file) as second_queue:
+            first, second = await asyncio.gather(
+                work(settings, first_queue, worker='first'), work(settings, second_queue, worker='second')
+            )
+
+        # assert
+        assert not first.errors and not second.errors
+        assert first.counts['ok'] + first.counts['updated'] and second.counts['ok'] + second.counts['updated']
+        assert [file.name for file in tmp_path.glob('cache*.sqlite3')] == [f'cache.{socket.gethostname()}.sqlite3']
+
+    async def test_workers_resolve_paths_against_their_base_dir(self, base_dir, queue_file, tmp_path):
+        # arrange
+        with WorkQueue(queue_file) as queue:
+            await enqueue(ExifySettings(base_dir=base_dir), queue)
+        mount = tmp_path / 'mount'
+        shutil.copytree(base_dir, mount)
+
+        # act
+        with WorkQueue(queue_file) as queue:
+            summary = await work(ExifySettings(base_dir=mount), queue, worker='other-host')
+
+        # assert
+        assert sorted(record.file for record in summary.ok + summary.updated) == sorted(mount.glob('*.jpg'))
+
+    async def test_queue_is_not_used_on_the_event_loop(self, base_dir, queue_file, mocker):
+        # arrange
+        settings = ExifySettings(base_dir=base_dir)
+        threads = []
+        with WorkQueue(queue_file) as queue:
+            await enqueue(settings, queue)
+            for method in ('claim', 'complete', 'outstanding'):
+                mocker.patch.object(queue, method, side_effect=_record_thread(getattr(queue, method), threads))
+
+            # act
+            await work(settings, queue, worker='first')
+
+        # assert
+        assert threads and threading.main_thread().name not in threads
+
+    async def test_removed_files_are_reported(self, base_dir, queue_file):
+        # arrange
+        settings = ExifySettings(base_dir=base_dir)
+        with WorkQueue(queue_file) as queue:
+            await enqueue(settings, queue)
+            removed = sorted(base_dir.glob('*.jpg'))[0]
+            removed.unlink()
+
+            # act
+            await work(settings, queue, worker='first')
+            summary = queue.summary(base_dir)
+
+        # assert
+        assert [record.file for record in summary.errors] == [removed]